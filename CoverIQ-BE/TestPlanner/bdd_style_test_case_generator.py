@@ -1,6 +1,22 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from typing import Dict, List, Optional
+from typing_extensions import TypedDict
 import json
-from google import genai
+try:
+    from .prompt_cache import PromptCache
+    from .model_router import default_router
+    from .checkpoints import Checkpoints, checkpointed, item_key
+    from .usage import BudgetExceeded
+    from .deadlines import DeadlineExceeded
+except ImportError:
+    # run as a script from inside TestPlanner
+    from prompt_cache import PromptCache
+    from model_router import default_router
+    from checkpoints import Checkpoints, checkpointed, item_key
+    from usage import BudgetExceeded
+    from deadlines import DeadlineExceeded
+
+TEST_CASE_INSTRUCTIONS = 'Generate BDD-style positive and negative test scenarios necessary to ensure coverage of the given test plan in Gherkin syntax.'
 
 #gemini output format
 class response_scheme_base(BaseModel) :
@@ -14,26 +30,65 @@ class response_scheme(BaseModel):
     feature : str
     bdd_style_descriptions : list[response_scheme_base]
 
-#input test plan in json format and call gemini api to generate bdd style test case    
-def generate_test_case(test_plan: dict,api_key:str) -> dict:
+# the same shape as plain dicts, validated once straight from the response bytes
+class BddStep(TypedDict):
+    Scenario : str
+    Given : str
+    And : str
+    When : str
+    Then : str
+
+class TestCase(TypedDict):
+    feature : str
+    bdd_style_descriptions : List[BddStep]
+
+TestCases = Dict[str, TestCase]
+
+test_case_adapter = TypeAdapter(TestCase)
+test_cases_adapter = TypeAdapter(TestCases)
+
+def test_case_prompt_cache(client) -> PromptCache:
+    # the instructions are shared by every objective, only the test plan item changes
+    return default_router.prompt_cache(client, 'test_cases', "", system_instruction=TEST_CASE_INSTRUCTIONS)
+
+#generate the bdd style test case of one test plan objective
+def generate_objective_test_case(cache: PromptCache, objective: dict) -> TestCase:
+    response = cache.generate_content(
+        f'''test plan :{objective}''',
+        config={
+            "response_mime_type": "application/json",     
+            "response_schema": response_scheme             
+        }
+    )
+    return test_case_adapter.validate_json(response.text)
+
+def objective_key(objective: dict) -> str:
+    # checkpoint of an objective's test case, a different model for the stage starts afresh
+    return item_key('test_cases', default_router.route('test_cases').model, objective)
+
+#input test plan in json format and call gemini api to generate bdd style test case
+#with checkpoints, objectives done by an earlier run are reused and new ones are stored as they finish.
+#with errors, a failed objective is recorded there under its feature name and the others still run
+def generate_test_case(test_plan: dict,api_key:str, checkpoints: Optional[Checkpoints] = None,
+                       errors: Optional[Dict[str, str]] = None) -> TestCases:
+    from google import genai
     output = {}
     case = 1
-    for t in test_plan['test_plan'] :
-        client = genai.Client(api_key=api_key)
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-preview-04-17',  
-            contents=f'''
-            test plan :{t},
-            Generate BDD-style positive and negative test scenarios necessary to ensure coverage of this test case in Gherkin syntax.
-            ''',
-            config={
-                "response_mime_type": "application/json",     
-                "response_schema": response_scheme             
-            }
-        )
-        # print("Objective ", case, " complete.")
-        output["Feature " + str(case)] = json.loads(response.text)
-        case += 1
+    client = genai.Client(api_key=api_key)
+    with test_case_prompt_cache(client) as cache:
+        for t in test_plan['test_plan'] :
+            # print("Objective ", case, " complete.")
+            feature = "Feature " + str(case)
+            case += 1
+            try:
+                output[feature] = checkpointed(checkpoints, objective_key(t), generate_objective_test_case, cache, t)
+            except (BudgetExceeded, DeadlineExceeded):
+                # the rest of the run would fail the same way
+                raise
+            except Exception as e:
+                if errors is None:
+                    raise
+                errors[feature] = str(e)
     return output
 
 if __name__ == "__main__":
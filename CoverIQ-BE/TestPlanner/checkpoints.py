@@ -0,0 +1,83 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# outputs of the single items of a long generation (the test case of one objective, the code of one
+# feature file), stored as soon as each item is done. They are keyed by the content hash of the item's
+# input, so a failed run that is submitted again only redoes the items that are missing.
+
+DEFAULT_MAX_ITEMS = 10000
+# seconds a checkpoint is kept in a shared store
+DEFAULT_TTL = 24 * 3600
+
+
+class IncompleteResult(Exception):
+    """Some items of a generation failed, result holds the others and errors a message per failed item"""
+
+    def __init__(self, result: Dict[str, Any], errors: Dict[str, str]):
+        super().__init__(f"{len(errors)} of {len(result) + len(errors)} items failed")
+        self.result = result
+        self.errors = errors
+
+
+def item_key(stage: str, model: str, item: Any) -> str:
+    """Checkpoint key of an item's output, from the stage, the model answering it and the item's input"""
+    digest = hashlib.sha256(json.dumps([model, item], sort_keys=True, default=str).encode()).hexdigest()
+    return f"checkpoint:{stage}:{digest}"
+
+
+class MemoryStore:
+    """Least recently used entries up to max_items and until their ttl runs out, for a replica without a shared cache"""
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS):
+        self.max_items = max_items
+        # key -> value and its time.monotonic() expiry, None when it does not expire
+        self._items: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._items:
+                return None
+            value, expires = self._items[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._items[key] = value, (time.monotonic() + ttl if ttl is not None else None)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class Checkpoints:
+    """Item outputs as JSON in a store with get(key) and set(key, value, ttl), such as the shared cache"""
+
+    def __init__(self, store=None, ttl: Optional[float] = DEFAULT_TTL):
+        self.store = store if store is not None else MemoryStore()
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.store.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def put(self, key: str, output: Any) -> None:
+        self.store.set(key, json.dumps(output).encode(), self.ttl)
+
+
+def checkpointed(checkpoints: Optional[Checkpoints], key: str, work: Callable[..., Any], *args) -> Any:
+    """work(*args), or the output an earlier run stored under key"""
+    if checkpoints is None:
+        return work(*args)
+    output = checkpoints.get(key)
+    if output is None:
+        output = work(*args)
+        checkpoints.put(key, output)
+    return output
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# the time by which the model calls of a request have to be answered. Like the usage meter it is
+# looked up from a context variable, so code that fans calls out to threads has to run them in a
+# copy of the caller's context. Deadlines are time.monotonic() values.
+
+
+class DeadlineExceeded(Exception):
+    """The deadline of the request passed before its model calls were answered"""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline, None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    """Raise DeadlineExceeded before a model call that could no longer be answered in time"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline passed before the {stage} call")
+
+
+@contextmanager
+def within(deadline: Optional[float]) -> Iterator[Optional[float]]:
+    """Model calls inside the block have to finish by deadline, an earlier enclosing deadline still applies"""
+    current = _deadline.get()
+    if deadline is not None and current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(current if deadline is None else deadline)
+    try:
+        yield _deadline.get()
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """Deadline seconds from now, None for no deadline"""
+    return None if seconds is None else time.monotonic() + seconds
@@ -1,41 +1,81 @@
-from typing import Dict, Any, List, Optional
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, Tuple, Union
 
 # to filter decorative component in json file and keep all necessary information
 
-def filter_component(figma_data: Dict[str, Any],feature_description: Optional[str] = None) -> List[Dict[str, Any]]:
+def _component(node: Dict[str, Any], parent_id: Any) -> Optional[Dict[str, Any]]:
+    interactions = node.get("interactions", [])
+    table = node.get("styleOverrideTable", [])
+    #keep element if not decorative
+    if not (interactions or table):
+        return None
+    return {
+        "parent_id": parent_id,
+        "id": node.get("id"),
+        "name": node.get("name"),
+        "type": node.get("type"),
+        "position": {
+            "x": node.get("absoluteBoundingBox", {}).get("x"),
+            "y": node.get("absoluteBoundingBox", {}).get("y")
+        },
+        "size": {
+            "width": node.get("absoluteBoundingBox", {}).get("width"),
+            "height": node.get("absoluteBoundingBox", {}).get("height")
+        },
+        "interactions": node.get("interactions"),
+        "styleOverrideTable": node.get("styleOverrideTable")
+    }
 
+def filter_subtree(node: Dict[str, Any], parent_id: Any = None) -> List[Dict[str, Any]]:
+    """Interactive components of node and everything below it, in document order"""
     results = []
     #Traverse frame node tree to extract interactive components
     def traverse(node: Dict[str, Any],parent_id : Any = None):
-        interactions = node.get("interactions", [])
-        table = node.get("styleOverrideTable", [])
-        #keep element if not decorative
-        if (interactions or table) :  
-            component = {
-                "parent_id": parent_id,
-                "id": node.get("id"),
-                "name": node.get("name"),
-                "type": node.get("type"),
-                "position": {
-                    "x": node.get("absoluteBoundingBox", {}).get("x"),
-                    "y": node.get("absoluteBoundingBox", {}).get("y")
-                },
-                "size": {
-                    "width": node.get("absoluteBoundingBox", {}).get("width"),
-                    "height": node.get("absoluteBoundingBox", {}).get("height")
-                },
-                "interactions": node.get("interactions"),
-                "styleOverrideTable": node.get("styleOverrideTable")
-            }
+        component = _component(node, parent_id)
+        if component is not None:
             results.append(component)
 
-
         for child in node.get("children", []):
             traverse(child,node.get("id"))
 
+    traverse(node, parent_id)
+    return results
+
+def document_shards(document: Dict[str, Any]) -> List[Union[List[Dict[str, Any]], Tuple[Dict[str, Any], Any]]]:
+    """
+    The document in independent pieces, in document order: lists of components of the nodes above
+    the shards and (node, parent_id) subtrees. Pages are the shards, or the top-level frames of a
+    single-page file.
+    """
+    pieces: List[Union[List[Dict[str, Any]], Tuple[Dict[str, Any], Any]]] = []
+    roots = [(document, None)]
+    pages = document.get("children", [])
+    if len(pages) == 1:
+        roots.append((pages[0], document.get("id")))
+    for node, parent_id in roots:
+        component = _component(node, parent_id)
+        pieces.append([component] if component is not None else [])
+    pieces.extend((child, roots[-1][0].get("id")) for child in roots[-1][0].get("children", []))
+    return pieces
+
+def filter_component(figma_data: Dict[str, Any],feature_description: Optional[str] = None,
+                     executor: Optional[Executor] = None) -> List[Dict[str, Any]]:
+    """
+    Interactive components of the document. With an executor the shards of document_shards are
+    filtered through executor.map, the result is the same as filtering them in one pass.
+    """
+    results = []
     # start from "document"
     if "document" in figma_data["figma_data"]:
-        traverse(figma_data["figma_data"]["document"])
+        document = figma_data["figma_data"]["document"]
+        if executor is None:
+            results = filter_subtree(document)
+        else:
+            pieces = document_shards(document)
+            shards = [piece for piece in pieces if isinstance(piece, tuple)]
+            filtered = iter(executor.map(filter_subtree, [node for node, _ in shards], [parent for _, parent in shards]))
+            for piece in pieces:
+                results.extend(next(filtered) if isinstance(piece, tuple) else piece)
     output = {
         "figma_data" : results,
         "feature_description" : feature_description
@@ -43,7 +83,6 @@ def filter_component(figma_data: Dict[str, Any],feature_description: Optional[st
     
     return output
 
-
 if __name__ == "__main__":
     import argparse
     import json
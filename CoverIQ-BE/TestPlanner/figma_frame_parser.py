@@ -1,8 +1,12 @@
-import requests
 import json
-from typing import Dict, Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
 import re
 
+# concurrent requests for node-scoped fetches
+DEFAULT_FETCH_WORKERS = 8
+
 ##input figma desing/file url to get file_key for using figma api
 def parse_figma_url(url: str) -> str:
     """
@@ -14,8 +18,19 @@ def parse_figma_url(url: str) -> str:
         raise ValueError("Invalid Figma URL format.")
     return match.group(2)
 
+##node ids selected in the url (?node-id=1-2), in the API's "1:2" form
+def parse_figma_node_ids(url: str) -> List[str]:
+    node_ids = []
+    for value in parse_qs(urlparse(url).query).get("node-id", []):
+        for node_id in value.split(","):
+            node_id = node_id.strip().replace("-", ":")
+            if node_id and node_id not in node_ids:
+                node_ids.append(node_id)
+    return node_ids
+
 ##input file key and access token to retrieve a specific frame
 def get_figma_file_data(file_key: str, token: str) -> Dict[str, Any]:
+    import requests
     headers = {
      'X-Figma-Token': token
     }
@@ -24,6 +39,50 @@ def get_figma_file_data(file_key: str, token: str) -> Dict[str, Any]:
     response.raise_for_status()
     return response.json()
 
+##same as get_figma_file_data, also returning the response body exactly as received so it can be served again without re-serializing
+def get_figma_file_response(file_key: str, token: str, depth: Optional[int] = None) -> Tuple[Dict[str, Any], bytes]:
+    import requests
+    headers = {
+     'X-Figma-Token': token
+    }
+    url = f"https://api.figma.com/v1/files/{file_key}"
+    response = requests.get(url, headers=headers, params={"depth": depth} if depth else None)
+    response.raise_for_status()
+    body = response.content
+    return json.loads(body), body
+
+def _get_figma_node(file_key: str, token: str, node_id: str, depth: Optional[int]) -> Dict[str, Any]:
+    import requests
+    params = {"ids": node_id}
+    if depth:
+        params["depth"] = depth
+    url = f"https://api.figma.com/v1/files/{file_key}/nodes"
+    response = requests.get(url, headers={'X-Figma-Token': token}, params=params)
+    response.raise_for_status()
+    return response.json()
+
+##fetch only the given nodes (pages or frames) concurrently and merge them into the shape of a full file response
+def get_figma_nodes_data(file_key: str, token: str, node_ids: List[str], depth: Optional[int] = None,
+                         max_workers: int = DEFAULT_FETCH_WORKERS) -> Dict[str, Any]:
+    if not node_ids:
+        raise ValueError("No node ids to fetch.")
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(node_ids)))) as executor:
+        responses = list(executor.map(lambda node_id: _get_figma_node(file_key, token, node_id, depth), node_ids))
+
+    merged = {key: value for key, value in responses[0].items() if key != "nodes"}
+    merged["document"] = {"id": "0:0", "name": "Document", "type": "DOCUMENT", "children": []}
+    for key in ("components", "componentSets", "styles"):
+        merged[key] = {}
+    for node_id, response in zip(node_ids, responses):
+        node = (response.get("nodes") or {}).get(node_id)
+        if not node:
+            raise ValueError(f"Node {node_id} not found in file {file_key}.")
+        # node order follows the url so the result is stable across runs
+        merged["document"]["children"].append(node["document"])
+        for key in ("components", "componentSets", "styles"):
+            merged[key].update(node.get(key, {}))
+    return merged
+
 
 if __name__ == "__main__":
     import argparse
@@ -35,6 +94,7 @@ if __name__ == "__main__":
     parser.add_argument("fig_url", help="Figma desing/file URL")
     args = parser.parse_args()
     file_key = parse_figma_url(args.fig_url)
-    result = get_figma_file_data(file_key,token)
+    node_ids = parse_figma_node_ids(args.fig_url)
+    result = get_figma_nodes_data(file_key,token,node_ids) if node_ids else get_figma_file_data(file_key,token)
     with open("figma_url_parsing_result.json", "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
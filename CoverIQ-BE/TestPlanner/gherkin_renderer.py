@@ -0,0 +1,141 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Tuple
+
+# single renderer for Gherkin feature text and the markdown exports, shared by the API and the code generator
+
+# compiled once, filled with str.format_map
+SCENARIO_TEMPLATE = (
+    "  Scenario: {index}. {Scenario}\n"
+    "    Given {Given}\n"
+    "    And {And}\n"
+    "    When {When}\n"
+    "    Then {Then}\n\n"
+)
+FEATURE_TEXT_HEADER_TEMPLATE = "Feature: {number}. {feature}\n\n"
+FEATURE_FILE_HEADER_TEMPLATE = "Feature:  {number}. {feature}\n\n"
+FEATURE_FILE_FOOTER = "# Generated by CoverIQ Test Planner\n"
+
+CASES_MARKDOWN_TITLE = "# Test Cases\n\n"
+CASES_MARKDOWN_FEATURE_TEMPLATE = "## {key}\n\n### Feature\n{feature}\n\n"
+CASES_MARKDOWN_SCENARIO_TEMPLATE = (
+    "### Scenario {index}\n\n"
+    "**Scenario:** {Scenario}\n\n"
+    "```gherkin\n"
+    "Given {Given}\n"
+    "And {And}\n"
+    "When {When}\n"
+    "Then {Then}\n"
+    "```\n\n"
+    "---\n\n"
+)
+MARKDOWN_FOOTER = "> Generated by CoverIQ Test Planner\n\n"
+
+PLAN_MARKDOWN_TITLE = "# Test Plan\n\n"
+PLAN_MARKDOWN_OBJECTIVE_TEMPLATE = (
+    "## Objective {index}\n\n"
+    "### Overview\n{Objective}\n\n"
+    "### Scope\n{Scope}\n\n"
+    "### Test Items\n\n"
+    "#### Types of Testing\n{Types_of_Testing}\n\n"
+    "#### Test Approach\n{Test_Approach}\n\n"
+    "#### Acceptance Criteria\n\n"
+    "{criteria}"
+    "\n---\n\n"
+)
+
+STEP_FIELDS = ("Scenario", "Given", "And", "When", "Then")
+SCENARIO_CACHE_SIZE = 1 << 16
+
+
+def _scenario_key(description: Dict[str, Any]) -> Tuple[Any, ...]:
+    # the content itself is the key, so identical scenarios in any plan share one rendering
+    return tuple(description[field] for field in STEP_FIELDS)
+
+
+def _format(template: str, index: int, content: Tuple[Any, ...]) -> str:
+    return template.format_map(dict(zip(STEP_FIELDS, content), index=index))
+
+
+_format_cached = lru_cache(maxsize=SCENARIO_CACHE_SIZE)(_format)
+
+
+def _render_scenario(template: str, index: int, description: Dict[str, Any]) -> str:
+    content = _scenario_key(description)
+    try:
+        return _format_cached(template, index, content)
+    except TypeError:
+        # unhashable step values (not produced by our schemas) are rendered without the cache
+        return _format(template, index, content)
+
+
+def render_scenario(description: Dict[str, Any], index: int) -> str:
+    """Gherkin Scenario block as used in feature texts and .feature files"""
+    return _render_scenario(SCENARIO_TEMPLATE, index, description)
+
+
+def iter_objective_feature_texts(objective: Dict[str, Any], number: int = 1) -> Iterator[Tuple[str, str]]:
+    """Feature texts of one objective whose first scenario is number `number` of the whole set"""
+    for index, description in enumerate(objective['bdd_style_descriptions'], 1):
+        header = FEATURE_TEXT_HEADER_TEMPLATE.format(number=number, feature=objective['feature'])
+        yield 'text' + str(number), header + render_scenario(description, index)
+        number += 1
+
+
+def iter_feature_texts(test_cases: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """One (name, single scenario feature text) pair per scenario, rendered as they are consumed"""
+    number = 1
+    for objective in test_cases.values():
+        yield from iter_objective_feature_texts(objective, number)
+        number += len(objective['bdd_style_descriptions'])
+
+
+def render_feature_texts(test_cases: Dict[str, Any]) -> Dict[str, str]:
+    return dict(iter_feature_texts(test_cases))
+
+
+def render_feature_file(objective: Dict[str, Any], number: int = 1) -> str:
+    """Complete .feature file for one objective"""
+    parts = [FEATURE_FILE_HEADER_TEMPLATE.format(number=number, feature=objective['feature'])]
+    for index, description in enumerate(objective['bdd_style_descriptions'], 1):
+        parts.append(render_scenario(description, index))
+    parts.append(FEATURE_FILE_FOOTER)
+    return "".join(parts)
+
+
+def feature_file_name(objective_key: str) -> str:
+    return f"{objective_key.lower().replace(' ', '_')}.feature"
+
+
+def iter_test_cases_markdown(test_cases: Dict[str, Any]) -> Iterator[str]:
+    """Test cases markdown, one chunk per feature"""
+    yield CASES_MARKDOWN_TITLE
+    for objective_key, objective in test_cases.items():
+        parts = [CASES_MARKDOWN_FEATURE_TEMPLATE.format(key=objective_key, feature=objective['feature'])]
+        for index, description in enumerate(objective['bdd_style_descriptions'], 1):
+            parts.append(_render_scenario(CASES_MARKDOWN_SCENARIO_TEMPLATE, index, description))
+        parts.append(MARKDOWN_FOOTER)
+        yield "".join(parts)
+
+
+def render_test_cases_markdown(test_cases: Dict[str, Any]) -> str:
+    return "".join(iter_test_cases_markdown(test_cases))
+
+
+def iter_test_plan_markdown(test_plan: Dict[str, Any]) -> Iterator[str]:
+    """Test plan markdown, one chunk per objective"""
+    yield PLAN_MARKDOWN_TITLE
+    for index, test_case in enumerate(test_plan['test_plan'], 1):
+        items = test_case['Test_Items']
+        criteria: List[str] = [f"{idx}. {criterion}\n" for idx, criterion in enumerate(items['Acceptance_Criteria'], 1)]
+        yield PLAN_MARKDOWN_OBJECTIVE_TEMPLATE.format(
+            index=index,
+            Objective=test_case['Objective'],
+            Scope=test_case['Scope'],
+            Types_of_Testing=items['Types_of_Testing'],
+            Test_Approach=items['Test_Approach'],
+            criteria="".join(criteria),
+        ) + MARKDOWN_FOOTER
+
+
+def render_test_plan_markdown(test_plan: Dict[str, Any]) -> str:
+    return "".join(iter_test_plan_markdown(test_plan))
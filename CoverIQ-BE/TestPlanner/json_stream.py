@@ -0,0 +1,49 @@
+from typing import Iterable, Iterator, List
+
+# incremental parsing of streamed structured output: {"key": [{...}, {...}]} arrives in arbitrary
+# text chunks and every object of the array is handed out as soon as its closing brace arrives
+
+
+def iter_array_objects(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    JSON text of every object inside the arrays of a streamed top-level object, in order.
+    Only brackets outside of strings count, so braces in string values are safe.
+    """
+    stack: List[str] = []
+    in_string = False
+    escaped = False
+    buffer: List[str] = []
+    for chunk in chunks:
+        if not chunk:
+            continue
+        start = 0
+        for position, char in enumerate(chunk):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+                continue
+            if char == '"':
+                in_string = True
+            elif char in "{[":
+                if char == "{" and stack == ["{", "["]:
+                    # an array item of the top-level object starts here
+                    buffer = []
+                    start = position
+                stack.append(char)
+            elif char in "}]":
+                if not stack or stack[-1] != ("{" if char == "}" else "["):
+                    raise ValueError(f"Unbalanced '{char}' in streamed JSON")
+                stack.pop()
+                if char == "}" and stack == ["{", "["]:
+                    buffer.append(chunk[start:position + 1])
+                    yield "".join(buffer)
+                    buffer = []
+        # keep the unfinished part of the current item for the next chunk
+        if len(stack) > 2:
+            buffer.append(chunk[start:])
+    if stack or in_string:
+        raise ValueError("Streamed JSON ended before it was complete")
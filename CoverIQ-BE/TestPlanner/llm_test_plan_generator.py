@@ -1,6 +1,15 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from typing import Iterator, List
+from typing_extensions import TypedDict
 import json
-from google import genai
+try:
+    from .json_stream import iter_array_objects
+    from .model_router import default_router
+except ImportError:
+    # run as a script from inside TestPlanner
+    from json_stream import iter_array_objects
+    from model_router import default_router
+
 
 #gemini output format
 class response_scheme_base1(BaseModel) :
@@ -16,24 +25,54 @@ class response_scheme2(BaseModel) :
 class response_scheme(BaseModel):
     test_plan : list[response_scheme2]
 
-#input figma data in json format and call gemini api to generate test plan   
-def generate_test_plan(figma_data: dict, api_key: str )->dict :
-    client = genai.Client(api_key=api_key)
+# the same shape as plain dicts, validated once straight from the response bytes
+class TestItems(TypedDict):
+    Types_of_Testing : str
+    Test_Approach : str
+    Acceptance_Criteria : List[str]
+
+class TestPlanItem(TypedDict):
+    Objective : str
+    Scope : str
+    Test_Items : TestItems
+
+class TestPlan(TypedDict):
+    test_plan : List[TestPlanItem]
+
+test_plan_adapter = TypeAdapter(TestPlan)
+test_plan_item_adapter = TypeAdapter(TestPlanItem)
 
-    response = client.models.generate_content(
-        model='gemini-2.5-flash-preview-04-17',  
-        contents=f"""
+def _test_plan_request(figma_data: dict) -> dict:
+    return {
+        "contents": f"""
         Given the following UI design, ignore decorative elements and generate a test plan including objective, scope, test items, test types, test approaches, and acceptance criteria. 
         please generate a test plan for each objective .
         UI design in json format :{figma_data}
 
         """,
-        config={
+        "config": {
             "response_mime_type": "application/json",     
             "response_schema": response_scheme             
         }
-    )
-    return  json.loads(response.text) 
+    }
+
+#input figma data in json format and call gemini api to generate test plan   
+def generate_test_plan(figma_data: dict, api_key: str )->TestPlan :
+    # imported on first use, the SDK is slow to import and most requests never need it
+    from google import genai
+    client = genai.Client(api_key=api_key)
+
+    response = default_router.generate_content(client, 'test_plan', **_test_plan_request(figma_data))
+    return test_plan_adapter.validate_json(response.text)
+
+#same test plan, streamed: every objective is yielded as soon as the model has finished writing it
+def generate_test_plan_stream(figma_data: dict, api_key: str) -> Iterator[TestPlanItem]:
+    from google import genai
+    client = genai.Client(api_key=api_key)
+
+    chunks = default_router.generate_content_stream(client, 'test_plan', **_test_plan_request(figma_data))
+    for item in iter_array_objects(chunk.text or "" for chunk in chunks):
+        yield test_plan_item_adapter.validate_json(item)
 
 
 if __name__ == "__main__":
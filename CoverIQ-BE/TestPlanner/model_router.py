@@ -0,0 +1,370 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import dataclass, asdict, replace
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+try:
+    from .prompt_cache import PromptCache, estimate_tokens
+    from .usage import check_budget, record_usage
+    from .deadlines import DeadlineExceeded, check_deadline, remaining
+except ImportError:
+    # run as a script from inside TestPlanner
+    from prompt_cache import PromptCache, estimate_tokens
+    from usage import check_budget, record_usage
+    from deadlines import DeadlineExceeded, check_deadline, remaining
+
+# which model answers each stage: a primary model, a cheaper or faster one for small prompts and a
+# fallback for calls that time out or hit an overloaded server. Every decision and its latency is kept.
+# Calls of hedged stages that take longer than the usual slow call get a duplicate, the first answer wins.
+
+DEFAULT_MODEL = 'gemini-2.5-flash-preview-04-17'
+FAST_MODEL = 'gemini-2.0-flash-lite'
+FALLBACK_MODEL = 'gemini-2.0-flash'
+# decisions kept for inspection, and latencies kept per stage and model for the percentiles
+DECISION_LOG_SIZE = 500
+LATENCY_WINDOW = 200
+# successful calls needed before their percentile is trusted as a hedge delay
+HEDGE_MIN_SAMPLES = 20
+# threads running duplicate requests, a hedge is skipped rather than queued while all of them are busy
+HEDGE_WORKERS = 32
+# seconds a call runs before it can be hedged, duplicating calls that are slow only by milliseconds costs tokens for nothing
+MIN_HEDGE_DELAY = 1.0
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    # prompts up to small_max_tokens (estimated) go to small_model
+    small_model: Optional[str] = None
+    small_max_tokens: int = 0
+    fallback: Optional[str] = None
+    # seconds before a call is abandoned for the fallback, None waits as long as the SDK does
+    timeout: Optional[float] = None
+    # a call still unanswered after this latency percentile (0-1) of its model gets a duplicate,
+    # at most max_hedge_rate of the recent calls of the stage are duplicated. None never hedges
+    hedge_quantile: Optional[float] = None
+    max_hedge_rate: float = 0.0
+
+
+DEFAULT_ROUTES = {
+    'test_plan': Route(DEFAULT_MODEL, fallback=FALLBACK_MODEL, timeout=180),
+    # one call per objective or file, a single slow one holds up the whole response. Hedging them
+    # (hedge_quantile 0.95, max_hedge_rate 0.05) is configured through COVERIQ_MODEL_ROUTES
+    'test_cases': Route(DEFAULT_MODEL, fallback=FALLBACK_MODEL, timeout=90),
+    'test_code': Route(DEFAULT_MODEL, fallback=FALLBACK_MODEL, timeout=120),
+    # picking one node id from a list, only large Figma files need the bigger model
+    'frame_selection': Route(DEFAULT_MODEL, small_model=FAST_MODEL, small_max_tokens=8000, fallback=FALLBACK_MODEL, timeout=60),
+    'locate_element': Route(DEFAULT_MODEL, fallback=FALLBACK_MODEL, timeout=60),
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts of the SDK's HTTP client and 5xx answers, the cases a different model can help with"""
+    if isinstance(error, TimeoutError):
+        return True
+    return any(name.endswith(("Timeout", "TimeoutError", "TimeoutException")) or name == "ServerError"
+               for name in (cls.__name__ for cls in type(error).__mro__))
+
+
+def prompt_tokens(contents: Any, config: Optional[Dict[str, Any]] = None) -> int:
+    """Estimated prompt size of the text parts of contents and the system instruction"""
+    parts = contents if isinstance(contents, list) else [contents]
+    text = [part for part in parts if isinstance(part, str)]
+    if config and isinstance(config.get("system_instruction"), str):
+        text.append(config["system_instruction"])
+    return sum(estimate_tokens(part) for part in text)
+
+
+class ModelRouter:
+    """Routes every model call of a stage and records what it decided and how long calls took"""
+
+    def __init__(self, routes: Optional[Dict[str, Route]] = None, log_size: int = DECISION_LOG_SIZE,
+                 latency_window: int = LATENCY_WINDOW, clock: Callable[[], float] = time.perf_counter,
+                 hedge_workers: int = HEDGE_WORKERS, min_hedge_delay: float = MIN_HEDGE_DELAY):
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.clock = clock
+        self.latency_window = latency_window
+        self.hedge_workers = hedge_workers
+        self.min_hedge_delay = min_hedge_delay
+        self._lock = threading.Lock()
+        self._decisions: Deque[Dict[str, Any]] = deque(maxlen=log_size)
+        self._latencies: Dict[Tuple[str, str], Deque[float]] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        # per hedged stage, whether each recent call got a duplicate
+        self._hedged: Dict[str, Deque[bool]] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._busy_hedges = 0
+        # primary calls of hedged stages running on their own threads
+        self._primaries: set = set()
+
+    def route(self, stage: str) -> Route:
+        return self.routes.get(stage) or Route(DEFAULT_MODEL)
+
+    def select(self, stage: str, tokens: int) -> Tuple[str, str]:
+        """(model, reason) for a prompt of about tokens tokens"""
+        route = self.route(stage)
+        if route.small_model and tokens <= route.small_max_tokens:
+            return route.small_model, "small_prompt"
+        return route.model, "primary"
+
+    def _attempts(self, stage: str, tokens: int) -> List[Tuple[str, str]]:
+        model, reason = self.select(stage, tokens)
+        fallback = self.route(stage).fallback
+        return [(model, reason)] + ([(fallback, "fallback")] if fallback and fallback != model else [])
+
+    def _with_timeout(self, stage: str, config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """config with the route's timeout, shortened to what is left of the deadline"""
+        check_deadline(stage)
+        timeout, left = self.route(stage).timeout, remaining()
+        if left is not None:
+            timeout = left if timeout is None else min(timeout, left)
+        if timeout is None:
+            return config
+        config = dict(config or {})
+        # the SDK takes the per-request timeout in milliseconds, rounded up so a call cut short by
+        # the deadline only gives up once the deadline has passed
+        config["http_options"] = {**config.get("http_options", {}), "timeout": max(1, math.ceil(timeout * 1000))}
+        return config
+
+    def _give_up(self, stage: str, error: Exception, last_attempt: bool) -> bool:
+        """Whether error ends the call instead of moving on to the fallback"""
+        if not is_retryable(error):
+            return True
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"Deadline passed during the {stage} call") from error
+        return last_attempt
+
+    def record(self, stage: str, model: str, reason: str, tokens: int, seconds: float, outcome: str) -> None:
+        with self._lock:
+            self._decisions.append({"stage": stage, "model": model, "reason": reason, "prompt_tokens": tokens,
+                                    "seconds": seconds, "outcome": outcome, "at": time.time()})
+            if outcome == "ok":
+                self._latencies.setdefault((stage, model), deque(maxlen=self.latency_window)).append(seconds)
+            else:
+                self._errors[(stage, model)] = self._errors.get((stage, model), 0) + 1
+
+    def _call(self, client, stage: str, model: str, reason: str, tokens: int, contents: Any,
+              config: Optional[Dict[str, Any]]) -> Any:
+        start = self.clock()
+        try:
+            response = client.models.generate_content(model=model, contents=contents, config=config)
+        except Exception as e:
+            self.record(stage, model, reason, tokens, self.clock() - start, "timeout" if is_retryable(e) else "error")
+            raise
+        self.record(stage, model, reason, tokens, self.clock() - start, "ok")
+        record_usage(stage, model, response)
+        return response
+
+    def hedge_delay(self, stage: str, model: str) -> Optional[float]:
+        """Seconds after which a call of stage to model gets a duplicate, None when it never does"""
+        route = self.route(stage)
+        if route.hedge_quantile is None or route.max_hedge_rate <= 0:
+            return None
+        with self._lock:
+            samples = len(self._latencies.get((stage, model), ()))
+        if samples < HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.min_hedge_delay, self.latency_quantile(stage, model, route.hedge_quantile))
+
+    def _hedge_allowed(self, stage: str, recent: Deque[bool]) -> bool:
+        return (sum(recent) + 1) / (len(recent) + 1) <= self.route(stage).max_hedge_rate
+
+    def _note_call(self, stage: str, hedge: bool) -> bool:
+        """
+        Count a call of a hedged stage. A wanted hedge is only granted while under the rate cap and
+        with a free hedge worker, which it then holds until _submit_hedge's call is done
+        """
+        with self._lock:
+            recent = self._hedged.setdefault(stage, deque(maxlen=self.latency_window))
+            hedge = hedge and self._hedge_allowed(stage, recent) and self._busy_hedges < self.hedge_workers
+            if hedge:
+                self._busy_hedges += 1
+            recent.append(hedge)
+        return hedge
+
+    def _could_hedge(self, stage: str) -> bool:
+        """Whether a call of stage starting now could still get a duplicate under the rate cap"""
+        with self._lock:
+            return self._hedge_allowed(stage, self._hedged.get(stage, ()))
+
+    def _start_primary(self, *args) -> Future:
+        """
+        The call on a thread of its own, so the caller can take a duplicate's answer while it runs.
+        Primaries are not drawn from a pool: they never queue behind other requests' calls.
+        """
+        future: Future = Future()
+        context = copy_context()
+
+        def run() -> None:
+            try:
+                future.set_result(context.run(self._call, *args))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._primaries.discard(thread)
+
+        thread = threading.Thread(target=run, name="hedge-primary", daemon=True)
+        with self._lock:
+            self._primaries.add(thread)
+        thread.start()
+        return future
+
+    def _submit_hedge(self, *args) -> Future:
+        """The duplicate call on the hedge pool, on the worker granted by _note_call"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.hedge_workers, thread_name_prefix="hedge")
+            pool = self._pool
+        # in a copy of the caller's context so the usage meter and deadline still apply
+        future = pool.submit(copy_context().run, self._call, *args)
+        future.add_done_callback(self._hedge_done)
+        return future
+
+    def _hedge_done(self, future: Future) -> None:
+        with self._lock:
+            self._busy_hedges -= 1
+
+    def _first_answer(self, client, stage: str, model: str, reason: str, tokens: int, contents: Any,
+                      config: Optional[Dict[str, Any]]) -> Any:
+        """
+        The answer of model, with a duplicate request once the call is slower than the hedge delay.
+        The slower of the two keeps running until it ends on its own and is still charged. Calls
+        that cannot be hedged run in the caller's thread.
+        """
+        delay = self.hedge_delay(stage, model)
+        if delay is None:
+            return self._call(client, stage, model, reason, tokens, contents, config)
+        if not self._could_hedge(stage):
+            self._note_call(stage, False)
+            return self._call(client, stage, model, reason, tokens, contents, config)
+        pending = {self._start_primary(client, stage, model, reason, tokens, contents, config)}
+        done, pending = wait(pending, timeout=delay)
+        if self._note_call(stage, not done):
+            pending.add(self._submit_hedge(client, stage, model, "hedge", tokens, contents, config))
+        error = None
+        while True:
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+            if not pending:
+                raise error
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the hedge pool, with wait once the calls still running in the background have ended"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            primaries = list(self._primaries)
+        if pool is not None:
+            pool.shutdown(wait=wait)
+        if wait:
+            for thread in primaries:
+                thread.join()
+
+    def generate(self, client, stage: str, request_for: Callable[[str], Tuple[Any, Optional[Dict[str, Any]]]],
+                 tokens: int) -> Any:
+        """
+        Response of the first model of the route that answers. request_for(model) gives the
+        (contents, config) to send to that model, so prompt caches tied to one model still work.
+        """
+        check_budget(stage)
+        attempts = self._attempts(stage, tokens)
+        for number, (model, reason) in enumerate(attempts, 1):
+            contents, config = request_for(model)
+            try:
+                return self._first_answer(client, stage, model, reason, tokens, contents, self._with_timeout(stage, config))
+            except Exception as e:
+                if self._give_up(stage, e, number == len(attempts)):
+                    raise
+
+    def generate_content(self, client, stage: str, contents: Any, config: Optional[Dict[str, Any]] = None) -> Any:
+        """generate_content for a stage, the same prompt is sent to whichever model is chosen"""
+        return self.generate(client, stage, lambda model: (contents, config), prompt_tokens(contents, config))
+
+    def generate_content_stream(self, client, stage: str, contents: Any, config: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Chunks of a streamed call, the fallback is only used when no chunk has arrived yet. Streams are not hedged"""
+        check_budget(stage)
+        tokens = prompt_tokens(contents, config)
+        attempts = self._attempts(stage, tokens)
+        for number, (model, reason) in enumerate(attempts, 1):
+            timed = self._with_timeout(stage, config)
+            start = self.clock()
+            last = None
+            started = False
+            try:
+                for chunk in client.models.generate_content_stream(model=model, contents=contents, config=timed):
+                    started = True
+                    if getattr(chunk, "usage_metadata", None) is not None:
+                        last = chunk
+                    yield chunk
+            except Exception as e:
+                self.record(stage, model, reason, tokens, self.clock() - start, "timeout" if is_retryable(e) else "error")
+                if started or self._give_up(stage, e, number == len(attempts)):
+                    raise
+                continue
+            self.record(stage, model, reason, tokens, self.clock() - start, "ok")
+            # the usage of the whole call comes with the last chunks
+            if last is not None:
+                record_usage(stage, model, last)
+            return
+
+    def prompt_cache(self, client, stage: str, prefix: str, system_instruction: Optional[str] = None) -> PromptCache:
+        """PromptCache whose calls go through the route of stage"""
+        return PromptCache(client, self.route(stage).model, prefix, system_instruction=system_instruction,
+                           stage=stage, router=self)
+
+    def latency_quantile(self, stage: str, model: str, quantile: float) -> Optional[float]:
+        """Latency of successful calls at quantile (0-1) over the recent window, None without data"""
+        with self._lock:
+            window = sorted(self._latencies.get((stage, model), ()))
+        if not window:
+            return None
+        return window[min(len(window) - 1, int(quantile * len(window)))]
+
+    def decisions(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent routing decisions, oldest first"""
+        with self._lock:
+            decisions = list(self._decisions)
+        return decisions[-limit:] if limit else decisions
+
+    def stats(self) -> Dict[str, Any]:
+        """Routes, the share of recent calls that were hedged and latency percentiles per stage and model"""
+        with self._lock:
+            keys = set(self._latencies) | set(self._errors)
+            counts = {key: (len(self._latencies.get(key, ())), self._errors.get(key, 0)) for key in keys}
+            hedge_rates = {stage: sum(recent) / len(recent) for stage, recent in self._hedged.items() if recent}
+        stats: Dict[str, Any] = {stage: {"route": asdict(self.route(stage)), "models": {}} for stage in self.routes}
+        for stage, rate in hedge_rates.items():
+            stats.setdefault(stage, {"route": asdict(self.route(stage)), "models": {}})["hedge_rate"] = rate
+        for (stage, model), (calls, errors) in sorted(counts.items()):
+            stats.setdefault(stage, {"route": asdict(self.route(stage)), "models": {}})["models"][model] = {
+                "calls": calls,
+                "errors": errors,
+                "p50": self.latency_quantile(stage, model, 0.5),
+                "p95": self.latency_quantile(stage, model, 0.95)
+            }
+        return stats
+
+
+def routes_from_env() -> Dict[str, Route]:
+    """
+    DEFAULT_ROUTES with the fields set in COVERIQ_MODEL_ROUTES, a JSON object like
+    {"test_cases": {"small_model": "gemini-2.0-flash-lite", "small_max_tokens": 1500}}
+    """
+    routes = dict(DEFAULT_ROUTES)
+    overrides = json.loads(os.getenv("COVERIQ_MODEL_ROUTES") or "{}")
+    for stage, fields in overrides.items():
+        routes[stage] = replace(routes.get(stage, Route(DEFAULT_MODEL)), **fields)
+    return routes
+
+
+# shared by every generator so decisions and latencies are seen in one place
+default_router = ModelRouter(routes_from_env())
@@ -0,0 +1,89 @@
+import logging
+from typing import Any, Dict, Optional
+
+# explicit Gemini context caching for prompt prefixes shared by every call of a pipeline run
+
+# Gemini refuses to cache prompts below a model-specific minimum size
+DEFAULT_MIN_TOKENS = 1024
+DEFAULT_TTL = "600s"
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class PromptCache:
+    """
+    Upload a shared prompt prefix once and send only the variable suffix per call.
+
+    Use it as a context manager around the fan-out of one run: the cached content is created
+    on entry and deleted on exit. Prefixes that are too small to cache, or a failed cache
+    creation, fall back to sending prefix + suffix inline, so callers never need to care.
+
+    With a router, calls go through the route of stage and the cache is created for the model
+    the route picks for the prefix. Calls answered by another model get the prompt inline.
+    """
+
+    def __init__(self, client, model: str, prefix: str, system_instruction: Optional[str] = None,
+                 ttl: str = DEFAULT_TTL, min_tokens: int = DEFAULT_MIN_TOKENS,
+                 stage: Optional[str] = None, router=None):
+        self.client = client
+        self.model = model
+        self.prefix = prefix
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.stage = stage
+        self.router = router
+        self.name: Optional[str] = None
+
+    def _prefix_tokens(self) -> int:
+        return estimate_tokens(self.prefix) + estimate_tokens(self.system_instruction or "")
+
+    def __enter__(self) -> "PromptCache":
+        size = self._prefix_tokens()
+        if self.router is not None:
+            self.model = self.router.select(self.stage, size)[0]
+        if size >= self.min_tokens:
+            config: Dict[str, Any] = {"ttl": self.ttl}
+            if self.prefix:
+                config["contents"] = [self.prefix]
+            if self.system_instruction:
+                config["system_instruction"] = self.system_instruction
+            try:
+                self.name = self.client.caches.create(model=self.model, config=config).name
+            except Exception as e:
+                logger.warning("Prompt caching unavailable, sending prompts inline: %s", e)
+                self.name = None
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.name:
+            try:
+                self.client.caches.delete(name=self.name)
+            except Exception:
+                # it expires on its own after ttl
+                pass
+            self.name = None
+
+    def _request(self, suffix: Any, config: Optional[Dict[str, Any]], model: str):
+        """(contents, config) of a call answered by model"""
+        config = dict(config or {})
+        if self.name and model == self.model:
+            config["cached_content"] = self.name
+            return suffix, config
+        if self.system_instruction:
+            config["system_instruction"] = self.system_instruction
+        contents = ([self.prefix] if self.prefix else []) + (suffix if isinstance(suffix, list) else [suffix])
+        return contents, config or None
+
+    def generate_content(self, suffix: Any, config: Optional[Dict[str, Any]] = None):
+        """generate_content with the cached prefix, suffix is the per-call part of the prompt"""
+        if self.router is None:
+            contents, config = self._request(suffix, config, self.model)
+            return self.client.models.generate_content(model=self.model, contents=contents, config=config)
+        parts = suffix if isinstance(suffix, list) else [suffix]
+        tokens = self._prefix_tokens() + sum(estimate_tokens(part) for part in parts if isinstance(part, str))
+        return self.router.generate(self.client, self.stage, lambda model: self._request(suffix, config, model), tokens)
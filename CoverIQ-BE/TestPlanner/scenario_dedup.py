@@ -0,0 +1,132 @@
+import re
+import hashlib
+from typing import Dict, List, Set, Tuple
+
+# group identical BDD scenarios so E2E code is generated once per group. Near-identical scenarios
+# are only merged with a threshold below 1.0: scenarios that differ in a single word ("correct" vs
+# "wrong" password) usually test different behaviour and need their own code.
+
+STEP_KEYWORDS = ("given", "and", "when", "then", "but")
+IGNORED_WORDS = {"a", "an", "the"}
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 64
+BAND_ROWS = 4
+DEFAULT_SIMILARITY_THRESHOLD = 1.0
+
+_MERSENNE_PRIME = (1 << 61) - 1
+# any letters or digits (not only ASCII, scenarios are often written in Chinese), with e-mails and dotted names kept whole
+_WORD_PATTERN = re.compile(r"\w[\w@.\-]*")
+
+
+def _permutation(seed: int) -> Tuple[int, int]:
+    digest = hashlib.blake2b(str(seed).encode("utf-8"), digest_size=16).digest()
+    a = int.from_bytes(digest[:8], "big") % _MERSENNE_PRIME
+    b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+    return a or 1, b
+
+
+_PERMUTATIONS = [_permutation(seed) for seed in range(NUM_PERMUTATIONS)]
+
+
+def _words(text: str) -> List[str]:
+    # keep e-mails and dotted names together but drop sentence punctuation
+    return [w for w in (word.strip(".-") for word in _WORD_PATTERN.findall(text.lower())) if w]
+
+
+def normalise_scenario(feature_text: str) -> str:
+    """Reduce a feature text to its Given/And/When/Then steps in a canonical form"""
+    steps = []
+    for line in feature_text.splitlines():
+        words = _words(line)
+        if words and words[0] in STEP_KEYWORDS:
+            if len(words) == 1:
+                # nothing but symbols after the keyword, they are all that tells steps apart
+                steps.append(" ".join(line.split()))
+                continue
+            steps.append(" ".join([words[0]] + [w for w in words[1:] if w not in IGNORED_WORDS]))
+    if not steps:
+        # not gherkin we understand, fall back to the whole text
+        return " ".join(_words(feature_text))
+    return "\n".join(steps)
+
+
+def scenario_key(feature_text: str) -> str:
+    """Feature texts with the same key get the same code, at the default threshold of cluster_feature_texts too"""
+    return normalise_scenario(feature_text)
+
+
+def _shingles(normalised: str) -> Set[str]:
+    words = normalised.split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _minhash(shingles: Set[str]) -> List[int]:
+    hashed = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+
+def _jaccard(left: Set[str], right: Set[str]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+def cluster_feature_texts(feature_text: Dict[str, str], threshold: float = DEFAULT_SIMILARITY_THRESHOLD) -> Dict[str, List[str]]:
+    """
+    Cluster feature texts whose normalised steps are equal, or near-equal when threshold is
+    below 1.0 (Jaccard similarity of their word shingles).
+
+    Returns a dict mapping the representative key of each cluster (its first member in
+    input order) to every key in that cluster, itself included.
+    """
+    # exact duplicates after normalisation
+    exact: Dict[str, List[str]] = {}
+    for key, text in feature_text.items():
+        exact.setdefault(scenario_key(text), []).append(key)
+
+    groups = list(exact.items())
+    parent = list(range(len(groups)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # near duplicates: minhash LSH for candidates, exact jaccard to confirm
+    if threshold < 1.0 and len(groups) > 1:
+        shingles = [_shingles(normalised) for normalised, _ in groups]
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        for index, shingle_set in enumerate(shingles):
+            signature = _minhash(shingle_set)
+            for band in range(0, NUM_PERMUTATIONS, BAND_ROWS):
+                buckets.setdefault((band, tuple(signature[band:band + BAND_ROWS])), []).append(index)
+
+        checked = set()
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pair = (members[i], members[j])
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    root_i, root_j = find(pair[0]), find(pair[1])
+                    if root_i != root_j and _jaccard(shingles[pair[0]], shingles[pair[1]]) >= threshold:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters: Dict[str, List[str]] = {}
+    roots: Dict[int, str] = {}
+    for index, (_, keys) in enumerate(groups):
+        root = find(index)
+        if root not in roots:
+            roots[root] = groups[root][1][0]
+            clusters[roots[root]] = []
+        clusters[roots[root]].extend(keys)
+
+    # members listed in input order
+    order = {key: position for position, key in enumerate(feature_text)}
+    for members in clusters.values():
+        members.sort(key=order.__getitem__)
+    return clusters
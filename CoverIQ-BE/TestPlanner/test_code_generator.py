@@ -1,50 +1,184 @@
-from google import genai
+import logging
+from pydantic import BaseModel, TypeAdapter
 from typing import Dict, Any, List, Optional, Tuple
+try:
+    from .scenario_dedup import cluster_feature_texts, DEFAULT_SIMILARITY_THRESHOLD
+    from .prompt_cache import PromptCache
+    from .gherkin_renderer import render_feature_texts
+    from .model_router import default_router
+    from .checkpoints import Checkpoints, item_key
+    from .usage import BudgetExceeded
+    from .deadlines import DeadlineExceeded
+except ImportError:
+    # run as a script from inside TestPlanner
+    from scenario_dedup import cluster_feature_texts, DEFAULT_SIMILARITY_THRESHOLD
+    from prompt_cache import PromptCache
+    from gherkin_renderer import render_feature_texts
+    from model_router import default_router
+    from checkpoints import Checkpoints, item_key
+    from usage import BudgetExceeded
+    from deadlines import DeadlineExceeded
 
-def generate_E2E_code(feature_text : Dict[str,Any] , api_key: str )->Dict[str,Any]:
-    result = {}
-    result_count = 1
-    for objective_key, objective in feature_text.items():
-        # print(result_count)
-        client = genai.Client(api_key=api_key)
-        prompt = f''' 
+logger = logging.getLogger(__name__)
+
+# rough prompt size budget for one batched call, counted as ~4 characters per token
+DEFAULT_MAX_BATCH_TOKENS = 8000
+
+CODE_INSTRUCTIONS = '''Note: This code is generated based on UI design only (from Figma). Since we do not have actual element IDs, class names, or selectors yet, please use descriptive placeholder selectors (e.g., driver.find_element(By.XPATH, "PLACEHOLDER_FOR_BUTTON")). Do not assume any implementation-specific selectors. The placeholders should reflect the purpose or label of the UI component.Once the user replaces the placeholders, the program should be able to run successfully.'''
+
+#gemini output format for batched generation
+class code_scheme_base(BaseModel) :
+    file_name : str
+    code : str
+
+class code_scheme(BaseModel):
+    test_code : list[code_scheme_base]
+
+code_adapter = TypeAdapter(code_scheme)
+# generated file name -> code, and feature text name -> feature text
+files_adapter = TypeAdapter(Dict[str, str])
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+SINGLE_FILE_INSTRUCTIONS = f''' 
 Help me generate automated E2E testing code (Please do not include markdown formatting or triple backticks. Only return plain Python code.) using Selenium WebDriver for the following Cucumber feature file.
 
-Note: This code is generated based on UI design only (from Figma). Since we do not have actual element IDs, class names, or selectors yet, please use descriptive placeholder selectors (e.g., driver.find_element(By.XPATH, "PLACEHOLDER_FOR_BUTTON")). Do not assume any implementation-specific selectors. The placeholders should reflect the purpose or label of the UI component.Once the user replaces the placeholders, the program should be able to run successfully.
+{CODE_INSTRUCTIONS}
+'''
+
+def code_prompt_cache(client) -> PromptCache:
+    # instructions are sent once per run, each call only carries its feature file
+    return default_router.prompt_cache(client, 'test_code', "", system_instruction=SINGLE_FILE_INSTRUCTIONS)
 
+def code_file_name(count: int) -> str:
+    return "test_code_for_case_"+str(count)+".py"
+
+def generate_feature_code(cache: PromptCache, objective: str) -> str:
+    """E2E code for a single feature text"""
+    response = cache.generate_content(f'''
 Cucumber feature file:
 {objective}
+''')
+    return response.text
+
+def _generate_code_batch(client, batch: Dict[str, str]) -> Dict[str, str]:
+    """Generate code for several feature files in one structured call, keyed like the batch"""
+    files = "\n".join(f"File name: {key}\n{objective}\n" for key, objective in batch.items())
+    prompt = f''' 
+Help me generate automated E2E testing code (Only return plain Python code for each file, without markdown formatting or triple backticks.) using Selenium WebDriver for each of the following Cucumber feature files. Return exactly one entry per file name, using the file name given.
+
+{CODE_INSTRUCTIONS}
+
+Cucumber feature files:
+{files}
 '''
 
-        response = client.models.generate_content(
-            model='gemini-2.5-flash-preview-04-17',
-            contents=[
-                prompt
-            ]    
-        )
-        file_name = "test_code_for_case_"+str(result_count)+".py"
-        result_count+=1
-        result[file_name] = response.text
-        # print(response.text)
+    response = default_router.generate_content(
+        client,
+        'test_code',
+        contents=prompt,
+        config={
+            "response_mime_type": "application/json",
+            "response_schema": code_scheme
+        }
+    )
+    output = {}
+    for item in code_adapter.validate_json(response.text).test_code:
+        if item.file_name in batch:
+            output[item.file_name] = item.code
+    return output
+
+def _make_batches(texts: Dict[str, str], batch_size: int, max_batch_tokens: int) -> List[Dict[str, str]]:
+    batches = []
+    current = {}
+    current_tokens = 0
+    for key, text in texts.items():
+        tokens = _estimate_tokens(text)
+        if current and (len(current) >= batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current)
+            current = {}
+            current_tokens = 0
+        current[key] = text
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def feature_code_key(text: str) -> str:
+    # checkpoint of the code of one feature text, a different model for the stage starts afresh
+    return item_key('test_code', default_router.route('test_code').model, text)
+
+def generate_E2E_code(feature_text : Dict[str,Any] , api_key: str, dedup: bool = True, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD, batch_size: int = 1, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+                      checkpoints: Optional[Checkpoints] = None, errors: Optional[Dict[str, str]] = None)->Dict[str,Any]:
+    """
+    Code file per feature text. With checkpoints, code generated by an earlier run for the same
+    text is reused and new code is stored as each file finishes. With errors, a file whose
+    generation failed is left out and its error recorded there under the file name.
+    """
+    # one file name per feature text, in input order
+    file_names = {key: code_file_name(count) for count, key in enumerate(feature_text, 1)}
+    # duplicated scenarios share a single code generation call
+    if dedup:
+        clusters = cluster_feature_texts(feature_text, similarity_threshold)
+    else:
+        clusters = {key: [key] for key in feature_text}
+
+    from google import genai
+    client = genai.Client(api_key=api_key)
+    representatives = {key: feature_text[key] for key in clusters}
+    codes = {}
+    failed = {}
+    if checkpoints is not None:
+        for key, objective in representatives.items():
+            code = checkpoints.get(feature_code_key(objective))
+            if code is not None:
+                codes[key] = code
+    todo = {key: objective for key, objective in representatives.items() if key not in codes}
+    if batch_size > 1:
+        for batch in _make_batches(todo, batch_size, max_batch_tokens):
+            if len(batch) == 1:
+                continue
+            try:
+                generated = _generate_code_batch(client, batch)
+            except (BudgetExceeded, DeadlineExceeded):
+                # the rest of the run would fail the same way
+                raise
+            except Exception:
+                # anything the batch did not return is generated one by one below
+                logger.warning("Batched code generation for %d files failed, generating them one by one", len(batch), exc_info=True)
+                continue
+            codes.update(generated)
+            if checkpoints is not None:
+                for key, code in generated.items():
+                    checkpoints.put(feature_code_key(batch[key]), code)
+    with code_prompt_cache(client) as cache:
+        for key, objective in todo.items():
+            if key in codes:
+                continue
+            try:
+                codes[key] = generate_feature_code(cache, objective)
+            except (BudgetExceeded, DeadlineExceeded):
+                # the rest of the run would fail the same way
+                raise
+            except Exception as e:
+                if errors is None:
+                    raise
+                failed[key] = str(e)
+                continue
+            if checkpoints is not None:
+                checkpoints.put(feature_code_key(objective), codes[key])
+
+    result = {}
+    member_of = {key: representative for representative, members in clusters.items() for key in members}
+    for key, file_name in file_names.items():
+        if member_of[key] in codes:
+            result[file_name] = codes[member_of[key]]
+        else:
+            errors[file_name] = failed[member_of[key]]
     return result
 
 
 def generate_feature_text(test_cases: Dict[str, Any]) -> Dict[str , Any]:
     """Generate feature file texts (no zip) and return as a list of strings"""
-    feature_texts = {}
-    feature_count = 1
-    for objective_key, objective in test_cases.items():
-        # 建立每個 feature 的文字內容
-        for idx, description in enumerate(objective['bdd_style_descriptions'], 1):
-            feature_content = f"Feature: {feature_count}. {objective['feature']}\n\n"
-            feature_content += f"  Scenario: {idx}. {description['Scenario']}\n"
-            feature_content += f"    Given {description['Given']}\n"
-            feature_content += f"    And {description['And']}\n"
-            feature_content += f"    When {description['When']}\n"
-            feature_content += f"    Then {description['Then']}\n\n"
-            name = 'text'+str(feature_count)
-            feature_texts[name] = feature_content
-            feature_count += 1
-        
-
-    return feature_texts
+    return render_feature_texts(test_cases)
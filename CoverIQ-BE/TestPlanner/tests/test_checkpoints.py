@@ -0,0 +1,140 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from ..checkpoints import Checkpoints, MemoryStore, checkpointed, item_key
+from ..bdd_style_test_case_generator import generate_test_case
+from ..test_code_generator import generate_E2E_code
+from ..usage import BudgetExceeded
+
+def objective(n: int) -> dict:
+    return {"Objective": f"Objective {n}", "Scope": "Scope", "Test_Items": {
+        "Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["Criteria"]}}
+
+TEST_PLAN = {"test_plan": [objective(n) for n in (1, 2, 3)]}
+
+class FlakyModels:
+    """Answers every prompt, except that prompts containing a word in failing raise while it is there"""
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.prompts = []
+
+    def generate_content(self, model, contents, config=None):
+        prompt = contents if isinstance(contents, str) else "".join(contents)
+        self.prompts.append(prompt)
+        for word in self.failing:
+            if word in prompt:
+                raise ValueError(f"bad answer for {word}")
+        response = MagicMock()
+        if "test plan :" in prompt:
+            name = next(f"Objective {n}" for n in (1, 2, 3) if f"Objective {n}" in prompt)
+            response.text = json.dumps({"feature": name, "bdd_style_descriptions": []})
+        else:
+            response.text = f"# code for {prompt.split('Feature: ')[1].splitlines()[0]}"
+        return response
+
+class TestCheckpoints(unittest.TestCase):
+    def test_item_key(self):
+        """Test keys depend on the stage, the model and the content of the item, not on key order"""
+        key = item_key("test_cases", "model", {"a": 1, "b": 2})
+        self.assertEqual(key, item_key("test_cases", "model", {"b": 2, "a": 1}))
+        self.assertNotEqual(key, item_key("test_cases", "other model", {"a": 1, "b": 2}))
+        self.assertNotEqual(key, item_key("test_code", "model", {"a": 1, "b": 2}))
+        self.assertNotEqual(key, item_key("test_cases", "model", {"a": 1, "b": 3}))
+
+    def test_memory_store_keeps_recent_items(self):
+        """Test the least recently used item is dropped first"""
+        store = MemoryStore(max_items=2)
+        store.set("a", b"1")
+        store.set("b", b"2")
+        store.get("a")
+        store.set("c", b"3")
+        self.assertEqual((store.get("a"), store.get("b"), store.get("c")), (b"1", None, b"3"))
+
+    def test_memory_store_expires_items(self):
+        """Test an item is gone once its ttl has passed and kept without one"""
+        store = MemoryStore()
+        with patch('time.monotonic', return_value=100.0):
+            store.set("a", b"1", ttl=10)
+            store.set("b", b"2")
+        with patch('time.monotonic', return_value=109.0):
+            self.assertEqual(store.get("a"), b"1")
+        with patch('time.monotonic', return_value=110.0):
+            self.assertEqual((store.get("a"), store.get("b")), (None, b"2"))
+
+    def test_checkpointed(self):
+        """Test work runs once per key and its output is reused afterwards"""
+        checkpoints = Checkpoints()
+        work = MagicMock(return_value={"done": True})
+        self.assertEqual(checkpointed(checkpoints, "key", work, 1), {"done": True})
+        self.assertEqual(checkpointed(checkpoints, "key", work, 1), {"done": True})
+        self.assertEqual(work.call_count, 1)
+        self.assertEqual(checkpointed(None, "key", work, 1), {"done": True})
+        self.assertEqual(work.call_count, 2)
+
+    @patch('google.genai.Client')
+    def test_test_cases_resume(self, mock_client):
+        """Test a failed objective is reported, the others kept, and a second run only redoes the failed one"""
+        models = FlakyModels(["Objective 2"])
+        mock_client.return_value.models = models
+        checkpoints = Checkpoints()
+
+        errors = {}
+        result = generate_test_case(TEST_PLAN, "key", checkpoints, errors)
+        self.assertEqual(list(result), ["Feature 1", "Feature 3"])
+        self.assertEqual(errors, {"Feature 2": "bad answer for Objective 2"})
+
+        models.failing.clear()
+        models.prompts.clear()
+        errors = {}
+        result = generate_test_case(TEST_PLAN, "key", checkpoints, errors)
+        self.assertEqual(list(result), ["Feature 1", "Feature 2", "Feature 3"])
+        self.assertEqual(errors, {})
+        self.assertEqual(len(models.prompts), 1)
+        self.assertIn("Objective 2", models.prompts[0])
+
+    @patch('google.genai.Client')
+    def test_errors_raise_without_an_errors_dict(self, mock_client):
+        """Test callers that do not ask for per-item errors still get the exception"""
+        mock_client.return_value.models = FlakyModels(["Objective 2"])
+        with self.assertRaises(ValueError):
+            generate_test_case(TEST_PLAN, "key", Checkpoints())
+
+    @patch('google.genai.Client')
+    def test_budget_ends_the_run(self, mock_client):
+        """Test an exhausted budget is not reported per item, finished items are still kept"""
+        models = FlakyModels([])
+        calls = []
+
+        def generate_content(model, contents, config=None):
+            calls.append(model)
+            if len(calls) == 2:
+                raise BudgetExceeded("test_cases")
+            return FlakyModels.generate_content(models, model, contents, config)
+        mock_client.return_value.models.generate_content = generate_content
+        checkpoints = Checkpoints()
+
+        with self.assertRaises(BudgetExceeded):
+            generate_test_case(TEST_PLAN, "key", checkpoints, {})
+        self.assertEqual(len(checkpoints.store._items), 1)
+
+    @patch('google.genai.Client')
+    def test_code_resume(self, mock_client):
+        """Test failed code files are reported by file name and generated on the next run"""
+        models = FlakyModels(["Login 2"])
+        mock_client.return_value.models = models
+        feature_text = {f"{n}. Login {n}": f"Feature: Login {n}\n  Scenario: step {n}\n" for n in (1, 2, 3)}
+        checkpoints = Checkpoints()
+
+        errors = {}
+        result = generate_E2E_code(feature_text, "key", checkpoints=checkpoints, errors=errors)
+        self.assertEqual(list(result), ["test_code_for_case_1.py", "test_code_for_case_3.py"])
+        self.assertEqual(errors, {"test_code_for_case_2.py": "bad answer for Login 2"})
+
+        models.failing.clear()
+        models.prompts.clear()
+        result = generate_E2E_code(feature_text, "key", checkpoints=checkpoints, errors={})
+        self.assertEqual(result["test_code_for_case_2.py"], "# code for Login 2")
+        self.assertEqual(len(models.prompts), 1)
+
+if __name__ == '__main__':
+    unittest.main()
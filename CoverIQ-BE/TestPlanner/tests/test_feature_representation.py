@@ -1,5 +1,21 @@
 import unittest
-from ..feature_representation import filter_component
+from concurrent.futures import ThreadPoolExecutor
+from ..feature_representation import filter_component, document_shards
+
+def button(node_id: str) -> dict:
+    return {"id": node_id, "name": "Button", "type": "INSTANCE", "interactions": [{"type": "CLICK"}],
+            "absoluteBoundingBox": {"x": 0, "y": 0, "width": 10, "height": 10}}
+
+def frame(node_id: str) -> dict:
+    return {"id": node_id, "type": "FRAME", "interactions": [{"type": "CLICK"}],
+            "children": [button(f"{node_id}:b{n}") for n in range(3)]}
+
+def document(pages: int, frames: int) -> dict:
+    return {"figma_data": {"document": {"id": "0:0", "styleOverrideTable": {"1": {}}, "children": [
+        {"id": f"p{p}", "type": "CANVAS", "interactions": [{"type": "CLICK"}],
+         "children": [frame(f"p{p}:f{f}") for f in range(frames)]}
+        for p in range(pages)
+    ]}}}
 
 class TestFeatureRepresentation(unittest.TestCase):
     def test_filter_component_empty_data(self):
@@ -53,5 +69,22 @@ class TestFeatureRepresentation(unittest.TestCase):
         result = filter_component(input_data, feature_desc)
         self.assertEqual(result["feature_description"], feature_desc)
 
+    def test_filter_component_with_executor(self):
+        """Test filtering shards through an executor keeps document order and parent ids"""
+        for pages, frames in ((3, 2), (1, 4), (0, 0)):
+            input_data = document(pages, frames)
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                self.assertEqual(filter_component(input_data, "desc", executor=executor), filter_component(input_data, "desc"))
+
+    def test_document_shards(self):
+        """Test pages are the shards, or the frames of a single-page file"""
+        pieces = document_shards(document(3, 2)["figma_data"]["document"])
+        self.assertEqual([component["id"] for component in pieces[0]], ["0:0"])
+        self.assertEqual([(node["id"], parent_id) for node, parent_id in pieces[1:]], [("p0", "0:0"), ("p1", "0:0"), ("p2", "0:0")])
+
+        pieces = document_shards(document(1, 2)["figma_data"]["document"])
+        self.assertEqual([piece[0]["parent_id"] for piece in pieces[:2]], [None, "0:0"])
+        self.assertEqual([(node["id"], parent_id) for node, parent_id in pieces[2:]], [("p0:f0", "p0"), ("p0:f1", "p0")])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from ..figma_frame_parser import parse_figma_url, get_figma_file_data
+from ..figma_frame_parser import parse_figma_url, get_figma_file_data, get_figma_file_response, parse_figma_node_ids, get_figma_nodes_data
+from ..feature_representation import filter_component
 
 class TestFigmaFrameParser(unittest.TestCase):
     def test_parse_figma_url_valid_file(self):
@@ -37,6 +38,18 @@ class TestFigmaFrameParser(unittest.TestCase):
             headers={'X-Figma-Token': 'test_token'}
         )
 
+    @patch('requests.get')
+    def test_get_figma_file_response(self, mock_get):
+        """Test get_figma_file_response returns the parsed data and the untouched body"""
+        mock_response = MagicMock()
+        mock_response.content = b'{"name": "Test File"}'
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        data, body = get_figma_file_response("abc123", "test_token")
+        self.assertEqual(data, {"name": "Test File"})
+        self.assertEqual(body, b'{"name": "Test File"}')
+
     @patch('requests.get')
     def test_get_figma_file_data_error(self, mock_get):
         """Test get_figma_file_data with API error"""
@@ -48,5 +61,51 @@ class TestFigmaFrameParser(unittest.TestCase):
         with self.assertRaises(Exception):
             get_figma_file_data("abc123", "test_token")
 
+    def test_parse_figma_node_ids(self):
+        """Test node ids are read from the url in API form"""
+        url = "https://www.figma.com/design/xyz789/design?node-id=12-34&t=abc"
+        self.assertEqual(parse_figma_node_ids(url), ["12:34"])
+        self.assertEqual(parse_figma_node_ids("https://www.figma.com/file/abc123/design?node-id=1-2,3:4,1-2"), ["1:2", "3:4"])
+        self.assertEqual(parse_figma_node_ids("https://www.figma.com/file/abc123/design"), [])
+
+    @patch('requests.get')
+    def test_get_figma_nodes_data(self, mock_get):
+        """Test node-scoped fetches are merged into a document filter_component accepts"""
+        def node_response(url, headers, params):
+            node_id = params["ids"]
+            response = MagicMock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = {
+                "name": "Test File",
+                "nodes": {node_id: {
+                    "document": {"id": node_id, "type": "FRAME", "children": [
+                        {"id": node_id + "1", "name": "Button", "interactions": [{"trigger": "ON_CLICK"}]}
+                    ]},
+                    "components": {"c" + node_id: {}},
+                }},
+            }
+            return response
+        mock_get.side_effect = node_response
+
+        result = get_figma_nodes_data("abc123", "test_token", ["1:2", "3:4"], depth=2)
+
+        self.assertEqual(result["name"], "Test File")
+        self.assertEqual([child["id"] for child in result["document"]["children"]], ["1:2", "3:4"])
+        self.assertEqual(set(result["components"]), {"c1:2", "c3:4"})
+        mock_get.assert_any_call("https://api.figma.com/v1/files/abc123/nodes",
+                                 headers={'X-Figma-Token': 'test_token'}, params={"ids": "3:4", "depth": 2})
+        components = filter_component({"figma_data": result})["figma_data"]
+        self.assertEqual([(c["parent_id"], c["id"]) for c in components], [("1:2", "1:21"), ("3:4", "3:41")])
+
+    @patch('requests.get')
+    def test_get_figma_nodes_data_missing(self, mock_get):
+        """Test a node id the file does not have raises"""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"name": "Test File", "nodes": {"1:2": None}}
+        mock_get.return_value = mock_response
+
+        with self.assertRaises(ValueError):
+            get_figma_nodes_data("abc123", "test_token", ["1:2"])
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
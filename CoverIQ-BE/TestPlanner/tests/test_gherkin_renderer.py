@@ -0,0 +1,108 @@
+import unittest
+from ..gherkin_renderer import (render_feature_texts, render_feature_file, feature_file_name,
+                                render_test_cases_markdown, render_test_plan_markdown, iter_test_cases_markdown)
+from ..test_code_generator import generate_feature_text
+
+LOGIN = {
+    "Scenario": "Successful login",
+    "Given": "the user is on the login page",
+    "And": "the user has a registered account",
+    "When": "the user enters valid credentials",
+    "Then": "the user is redirected to the dashboard page",
+}
+LOGOUT = {
+    "Scenario": "Logout",
+    "Given": "the user is logged in",
+    "And": "the menu is open",
+    "When": "the user clicks {Logout}",
+    "Then": "the login page is shown",
+}
+TEST_CASES = {
+    "Objective 1": {"feature": "Login", "bdd_style_descriptions": [LOGIN, LOGOUT]},
+    "Objective 2": {"feature": "Session", "bdd_style_descriptions": [LOGOUT]},
+}
+
+
+class TestGherkinRenderer(unittest.TestCase):
+    def test_feature_texts(self):
+        """Test one feature text per scenario, numbered across objectives"""
+        texts = render_feature_texts(TEST_CASES)
+        self.assertEqual(list(texts), ["text1", "text2", "text3"])
+        self.assertEqual(texts["text3"], (
+            "Feature: 3. Session\n\n"
+            "  Scenario: 1. Logout\n"
+            "    Given the user is logged in\n"
+            "    And the menu is open\n"
+            "    When the user clicks {Logout}\n"
+            "    Then the login page is shown\n\n"
+        ))
+        self.assertEqual(generate_feature_text(TEST_CASES), texts)
+
+    def test_feature_file(self):
+        """Test the .feature file layout used by the zip export"""
+        self.assertEqual(feature_file_name("Objective 1"), "objective_1.feature")
+        content = render_feature_file(TEST_CASES["Objective 2"])
+        self.assertEqual(content, (
+            "Feature:  1. Session\n\n"
+            "  Scenario: 1. Logout\n"
+            "    Given the user is logged in\n"
+            "    And the menu is open\n"
+            "    When the user clicks {Logout}\n"
+            "    Then the login page is shown\n\n"
+            "# Generated by CoverIQ Test Planner\n"
+        ))
+
+    def test_test_cases_markdown(self):
+        """Test the test cases markdown export, rendered in one chunk per feature"""
+        markdown = render_test_cases_markdown({"Objective 2": TEST_CASES["Objective 2"]})
+        self.assertEqual(markdown, (
+            "# Test Cases\n\n"
+            "## Objective 2\n\n"
+            "### Feature\nSession\n\n"
+            "### Scenario 1\n\n"
+            "**Scenario:** Logout\n\n"
+            "```gherkin\n"
+            "Given the user is logged in\n"
+            "And the menu is open\n"
+            "When the user clicks {Logout}\n"
+            "Then the login page is shown\n"
+            "```\n\n"
+            "---\n\n"
+            "> Generated by CoverIQ Test Planner\n\n"
+        ))
+        self.assertEqual(len(list(iter_test_cases_markdown(TEST_CASES))), 3)
+
+    def test_test_plan_markdown(self):
+        """Test the test plan markdown export"""
+        test_plan = {"test_plan": [{
+            "Objective": "Verify login",
+            "Scope": "Login page",
+            "Test_Items": {
+                "Types_of_Testing": "Functional",
+                "Test_Approach": "Manual",
+                "Acceptance_Criteria": ["Valid users log in", "Invalid users see an error"],
+            },
+        }]}
+        self.assertEqual(render_test_plan_markdown(test_plan), (
+            "# Test Plan\n\n"
+            "## Objective 1\n\n"
+            "### Overview\nVerify login\n\n"
+            "### Scope\nLogin page\n\n"
+            "### Test Items\n\n"
+            "#### Types of Testing\nFunctional\n\n"
+            "#### Test Approach\nManual\n\n"
+            "#### Acceptance Criteria\n\n"
+            "1. Valid users log in\n"
+            "2. Invalid users see an error\n"
+            "\n---\n\n"
+            "> Generated by CoverIQ Test Planner\n\n"
+        ))
+
+    def test_unhashable_step(self):
+        """Test that step values the cache cannot key on are still rendered"""
+        objective = {"feature": "Odd", "bdd_style_descriptions": [dict(LOGIN, Then=["a", "b"])]}
+        self.assertIn("    Then ['a', 'b']\n", render_feature_file(objective))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import json
+import unittest
+from ..json_stream import iter_array_objects
+
+ITEMS = [
+    {"Objective": "Login {with} [brackets]", "Scope": "a \"quoted\" \\ value", "Test_Items": {"Acceptance_Criteria": ["x", "y"]}},
+    {"Objective": "Logout", "Scope": "}{][", "Test_Items": {"Acceptance_Criteria": []}},
+]
+TEXT = json.dumps({"test_plan": ITEMS}, indent=2)
+
+class TestJsonStream(unittest.TestCase):
+    def test_every_split(self):
+        """Test objects are found wherever the chunk boundaries fall"""
+        for split in range(1, len(TEXT)):
+            chunks = [TEXT[:split], TEXT[split:]]
+            self.assertEqual([json.loads(item) for item in iter_array_objects(chunks)], ITEMS, split)
+
+    def test_character_chunks(self):
+        """Test one character per chunk, with empty chunks in between"""
+        chunks = [c for char in TEXT for c in (char, "")]
+        self.assertEqual([json.loads(item) for item in iter_array_objects(chunks)], ITEMS)
+
+    def test_yields_before_the_end(self):
+        """Test an object is handed out before the rest of the stream is read"""
+        consumed = []
+
+        def chunks():
+            for line in TEXT.splitlines(keepends=True):
+                consumed.append(line)
+                yield line
+
+        first = next(iter_array_objects(chunks()))
+        self.assertEqual(json.loads(first), ITEMS[0])
+        self.assertLess(len(consumed), len(TEXT.splitlines()))
+
+    def test_incomplete(self):
+        """Test a stream that stops early raises"""
+        with self.assertRaises(ValueError):
+            list(iter_array_objects([TEXT[:-3]]))
+
+if __name__ == '__main__':
+    unittest.main()
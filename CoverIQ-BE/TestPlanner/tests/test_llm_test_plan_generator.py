@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
-from ..llm_test_plan_generator import generate_test_plan, response_scheme
+import json
+from ..llm_test_plan_generator import generate_test_plan, generate_test_plan_stream, response_scheme
 
 class TestLLMTestPlanGenerator(unittest.TestCase):
     @patch('google.genai.Client')
@@ -60,5 +61,37 @@ class TestLLMTestPlanGenerator(unittest.TestCase):
         # This should not raise any validation errors
         response_scheme(**valid_data)
 
+    @patch('google.genai.Client')
+    def test_generate_test_plan_stream(self, mock_client):
+        """Test objectives are yielded while the model is still streaming"""
+        objectives = [{
+            "Objective": f"Objective {n}",
+            "Scope": "Test Scope",
+            "Test_Items": {"Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["C"]}
+        } for n in (1, 2)]
+        text = json.dumps({"test_plan": objectives})
+        sent = []
+
+        def stream(**kwargs):
+            # small chunks like the real stream, the last one carries no text
+            for start in range(0, len(text), 7):
+                sent.append(start)
+                yield MagicMock(text=text[start:start + 7])
+            yield MagicMock(text=None)
+        mock_client.return_value.models.generate_content_stream.side_effect = stream
+
+        result = generate_test_plan_stream({"figma_data": {}}, "test_api_key")
+        self.assertEqual(next(result), objectives[0])
+        self.assertLess(len(sent) * 7, len(text))
+        self.assertEqual(list(result), objectives[1:])
+
+    @patch('google.genai.Client')
+    def test_generate_test_plan_stream_invalid(self, mock_client):
+        """Test an objective that does not match the schema raises"""
+        mock_client.return_value.models.generate_content_stream.return_value = iter(
+            [MagicMock(text='{"test_plan": [{"Objective": "No scope"}]}')])
+        with self.assertRaises(Exception):
+            list(generate_test_plan_stream({"figma_data": {}}, "test_api_key"))
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
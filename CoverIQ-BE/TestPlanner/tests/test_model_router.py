@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+from ..model_router import ModelRouter, Route, routes_from_env
+from ..deadlines import DeadlineExceeded, deadline_after, within
+from ..usage import metering
+from .test_prompt_cache import FakeCaches, LARGE_PREFIX
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+class Backends:
+    """
+    Models answering after a fixed number of seconds on a simulated clock. A model slower than the
+    timeout in http_options times out like the SDK's HTTP client would.
+    """
+    def __init__(self, clock: Clock, latencies: dict):
+        self.clock = clock
+        self.latencies = latencies
+        self.calls = []
+
+    def _wait(self, model, config):
+        timeout = ((config or {}).get("http_options") or {}).get("timeout")
+        latency = self.latencies[model]
+        if timeout is not None and latency * 1000 > timeout:
+            self.clock.now += timeout / 1000
+            raise TimeoutError(f"{model} timed out")
+        self.clock.now += latency
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        self._wait(model, config)
+        return MagicMock(text=f"answer of {model}", usage_metadata=MagicMock(
+            prompt_token_count=10, candidates_token_count=5, cached_content_token_count=None,
+            thoughts_token_count=None, total_token_count=15))
+
+    def generate_content_stream(self, model, contents, config=None):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        self._wait(model, config)
+        yield MagicMock(text=f"answer of {model}")
+
+class FakeClient:
+    def __init__(self, clock: Clock, latencies: dict):
+        self.caches = FakeCaches()
+        self.models = Backends(clock, latencies)
+
+class RecordingMeter:
+    def __init__(self):
+        self.charges = []
+
+    def check(self, stage):
+        pass
+
+    def charge(self, stage, model, usage):
+        self.charges.append((stage, model))
+
+ROUTES = {
+    "plan": Route("primary", fallback="backup", timeout=10),
+    "select": Route("primary", small_model="fast", small_max_tokens=100, timeout=10),
+}
+LATENCIES = {"primary": 4, "fast": 1, "backup": 2}
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.router = ModelRouter(ROUTES, clock=self.clock)
+
+    def test_small_prompts_go_to_the_small_model(self):
+        """Test prompts up to the stage's limit are answered by its small model, larger ones by the primary"""
+        client = FakeClient(self.clock, LATENCIES)
+        self.assertEqual(self.router.generate_content(client, "select", "short prompt").text, "answer of fast")
+        self.assertEqual(self.router.generate_content(client, "select", "x" * 1000).text, "answer of primary")
+
+        decisions = self.router.decisions()
+        self.assertEqual([(d["model"], d["reason"], d["seconds"]) for d in decisions],
+                         [("fast", "small_prompt", 1), ("primary", "primary", 4)])
+        self.assertEqual(client.models.calls[0]["config"], {"http_options": {"timeout": 10000}})
+
+    def test_timeout_falls_back(self):
+        """Test a call slower than the timeout is answered by the fallback and charged to it"""
+        client = FakeClient(self.clock, {**LATENCIES, "primary": 30})
+        meter = RecordingMeter()
+        with metering(meter):
+            response = self.router.generate_content(client, "plan", "prompt", {"response_mime_type": "application/json"})
+
+        self.assertEqual(response.text, "answer of backup")
+        self.assertEqual([(d["model"], d["outcome"], d["seconds"]) for d in self.router.decisions()],
+                         [("primary", "timeout", 10), ("backup", "ok", 2)])
+        self.assertEqual(meter.charges, [("plan", "backup")])
+        self.assertEqual(client.models.calls[1]["config"]["response_mime_type"], "application/json")
+        models = self.router.stats()["plan"]["models"]
+        self.assertEqual(models["primary"], {"calls": 0, "errors": 1, "p50": None, "p95": None})
+        self.assertEqual(models["backup"]["p95"], 2)
+
+    def test_other_errors_are_raised(self):
+        """Test errors a different model cannot help with are not retried"""
+        client = FakeClient(self.clock, LATENCIES)
+        client.models.generate_content = MagicMock(side_effect=ValueError("bad request"))
+        with self.assertRaises(ValueError):
+            self.router.generate_content(client, "plan", "prompt")
+        self.assertEqual(client.models.generate_content.call_count, 1)
+        self.assertEqual(self.router.decisions()[0]["outcome"], "error")
+
+    def test_stream_falls_back_before_the_first_chunk(self):
+        """Test a stream that times out before answering is streamed from the fallback"""
+        client = FakeClient(self.clock, {**LATENCIES, "primary": 30})
+        chunks = list(self.router.generate_content_stream(client, "plan", "prompt"))
+        self.assertEqual([chunk.text for chunk in chunks], ["answer of backup"])
+
+    def test_latency_quantiles(self):
+        """Test percentiles are taken over the latencies of successful calls"""
+        for seconds in range(1, 101):
+            self.router.record("plan", "primary", "primary", 10, seconds, "ok")
+        self.assertEqual(self.router.latency_quantile("plan", "primary", 0.5), 51)
+        self.assertEqual(self.router.latency_quantile("plan", "primary", 0.95), 96)
+        self.assertIsNone(self.router.latency_quantile("plan", "backup", 0.95))
+
+    def test_prompt_cache_follows_the_route(self):
+        """Test the cache is created for the routed model and fallback calls carry the prefix inline"""
+        client = FakeClient(self.clock, {**LATENCIES, "primary": 30})
+        with self.router.prompt_cache(client, "plan", LARGE_PREFIX) as cache:
+            self.assertEqual(cache.generate_content("case 1").text, "answer of backup")
+
+        self.assertEqual(client.caches.created[0][0], "primary")
+        first, second = client.models.calls
+        self.assertEqual((first["contents"], first["config"]["cached_content"]), ("case 1", "cachedContents/1"))
+        self.assertEqual(second["contents"], [LARGE_PREFIX, "case 1"])
+        self.assertNotIn("cached_content", second["config"])
+
+    def test_routes_from_env(self):
+        """Test COVERIQ_MODEL_ROUTES overrides single fields of a stage's route"""
+        with patch.dict(os.environ, {"COVERIQ_MODEL_ROUTES": '{"test_cases": {"small_model": "fast", "small_max_tokens": 500}}'}):
+            routes = routes_from_env()
+        self.assertEqual(routes["test_cases"].small_model, "fast")
+        self.assertEqual(routes["test_cases"].fallback, routes_from_env()["test_cases"].fallback)
+
+class SlowFirstBackend:
+    """
+    Really sleeps: the first request for a prompt in slow_prompts takes slow seconds, every other
+    request fast seconds. Requests give up once the timeout in http_options has passed.
+    """
+    def __init__(self, slow_prompts, slow: float, fast: float = 0.002):
+        self.slow_prompts = set(slow_prompts)
+        self.slow = slow
+        self.fast = fast
+        self.seen = set()
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            first = contents not in self.seen
+            self.seen.add(contents)
+            self.calls.append(contents)
+        latency = self.slow if first and contents in self.slow_prompts else self.fast
+        timeout = ((config or {}).get("http_options") or {}).get("timeout")
+        if timeout is not None and latency * 1000 > timeout:
+            time.sleep(timeout / 1000)
+            raise TimeoutError(f"{model} timed out")
+        time.sleep(latency)
+        return MagicMock(text=f"answer to {contents}")
+
+def warmed_up(route: Route, seconds: float = 0.02) -> ModelRouter:
+    """Router that has already seen enough fast calls of stage "cases" to hedge"""
+    router = ModelRouter({"cases": route}, min_hedge_delay=0)
+    for _ in range(20):
+        router.record("cases", route.model, "primary", 10, seconds, "ok")
+    return router
+
+class TestHedgingAndDeadlines(unittest.TestCase):
+    def test_hedge_cuts_the_tail(self):
+        """Test a call stuck in the tail is answered by its duplicate and the slow original is still charged"""
+        router = warmed_up(Route("m", timeout=5, hedge_quantile=0.95, max_hedge_rate=0.2))
+        prompts = [f"objective {n}" for n in range(30)]
+        client = MagicMock()
+        client.models = SlowFirstBackend(prompts[5::10], slow=0.5)
+        meter = RecordingMeter()
+
+        slowest = 0.0
+        with metering(meter):
+            for prompt in prompts:
+                start = time.perf_counter()
+                self.assertEqual(router.generate_content(client, "cases", prompt).text, f"answer to {prompt}")
+                slowest = max(slowest, time.perf_counter() - start)
+        router.shutdown()
+
+        self.assertLess(slowest, 0.25)
+        self.assertEqual(len(client.models.calls), 33)
+        self.assertEqual(len([d for d in router.decisions() if d["reason"] == "hedge"]), 3)
+        self.assertEqual(len(meter.charges), 33)
+        self.assertEqual(router.stats()["cases"]["hedge_rate"], 0.1)
+
+    def test_hedge_rate_is_capped(self):
+        """Test hedges stop once max_hedge_rate of the recent calls were hedged"""
+        router = warmed_up(Route("m", timeout=5, hedge_quantile=0.5, max_hedge_rate=0.1))
+        prompts = [f"objective {n}" for n in range(10)]
+        client = MagicMock()
+        client.models = SlowFirstBackend(prompts, slow=0.06)
+
+        for prompt in prompts:
+            router.generate_content(client, "cases", prompt)
+        router.shutdown()
+
+        self.assertEqual(len(client.models.calls), 11)
+        self.assertEqual(router.stats()["cases"]["hedge_rate"], 0.1)
+
+    def test_no_hedging_without_enough_samples(self):
+        """Test calls are not duplicated before there are enough latencies to pick a delay, nor before min_hedge_delay"""
+        router = ModelRouter({"cases": Route("m", hedge_quantile=0.5, max_hedge_rate=1.0)})
+        self.assertIsNone(router.hedge_delay("cases", "m"))
+        for _ in range(20):
+            router.record("cases", "m", "primary", 10, 0.02, "ok")
+        self.assertEqual(router.hedge_delay("cases", "m"), 1.0)
+        self.assertEqual(warmed_up(Route("m", hedge_quantile=0.5, max_hedge_rate=1.0)).hedge_delay("cases", "m"), 0.02)
+
+    def test_hedging_is_off_by_default(self):
+        """Test the default routes never duplicate calls and answer them in the caller's thread"""
+        router = ModelRouter()
+        for _ in range(20):
+            router.record("test_cases", router.route("test_cases").model, "primary", 10, 0.02, "ok")
+        self.assertIsNone(router.hedge_delay("test_cases", router.route("test_cases").model))
+
+        threads = []
+        client = MagicMock()
+        client.models.generate_content.side_effect = lambda **kwargs: threads.append(threading.current_thread())
+        router.generate_content(client, "test_cases", "objective")
+        self.assertEqual(threads, [threading.current_thread()])
+
+    def test_busy_hedge_pool_does_not_queue_calls(self):
+        """Test concurrent calls run in parallel with a single hedge worker, only duplicates are limited by it"""
+        router = ModelRouter({"cases": Route("m", timeout=5, hedge_quantile=0.5, max_hedge_rate=1.0)},
+                             hedge_workers=1, min_hedge_delay=0)
+        for _ in range(20):
+            router.record("cases", "m", "primary", 10, 0.01, "ok")
+        client = MagicMock()
+        client.models = SlowFirstBackend([], slow=0, fast=0.2)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda n: router.generate_content(client, "cases", f"objective {n}"), range(8)))
+        self.assertLess(time.perf_counter() - start, 0.6)
+        router.shutdown()
+        self.assertEqual(len([d for d in router.decisions() if d["reason"] == "hedge"]), 1)
+
+    def test_deadline_bounds_the_call(self):
+        """Test the remaining time of the deadline becomes the call's timeout and no fallback is tried after it"""
+        router = ModelRouter({"cases": Route("m", fallback="backup", timeout=5)})
+        client = MagicMock()
+        client.models = SlowFirstBackend(["objective"], slow=1)
+
+        start = time.perf_counter()
+        with within(deadline_after(0.05)):
+            with self.assertRaises(DeadlineExceeded):
+                router.generate_content(client, "cases", "objective")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(client.models.calls, ["objective"])
+
+    def test_passed_deadline_skips_the_call(self):
+        """Test no request is sent once the deadline has passed, nested deadlines keep the earlier one"""
+        router = ModelRouter({"cases": Route("m")})
+        client = MagicMock()
+        with within(deadline_after(-1)), within(deadline_after(60)):
+            with self.assertRaises(DeadlineExceeded):
+                router.generate_content(client, "cases", "objective")
+        client.models.generate_content.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
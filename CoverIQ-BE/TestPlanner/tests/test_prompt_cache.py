@@ -0,0 +1,75 @@
+import unittest
+from unittest.mock import MagicMock
+from ..prompt_cache import PromptCache
+
+class FakeCaches:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created = []
+        self.deleted = []
+
+    def create(self, model, config):
+        if self.fail:
+            raise Exception("caching not supported")
+        self.created.append((model, config))
+        cache = MagicMock()
+        cache.name = f"cachedContents/{len(self.created)}"
+        return cache
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+
+    def generate_content(self, model, contents, config=None):
+        self.calls.append({"model": model, "contents": contents, "config": config})
+        response = MagicMock()
+        response.text = "{}"
+        return response
+
+class FakeClient:
+    """Records what would have been sent to Gemini"""
+    def __init__(self, fail: bool = False):
+        self.caches = FakeCaches(fail)
+        self.models = FakeModels()
+
+LARGE_PREFIX = "figma data " * 1000
+
+class TestPromptCache(unittest.TestCase):
+    def test_only_suffix_sent_per_call(self):
+        """Test the prefix is cached once and every call only carries its suffix"""
+        client = FakeClient()
+        with PromptCache(client, "model", LARGE_PREFIX, system_instruction="be brief") as cache:
+            for case in ["case 1", "case 2", "case 3"]:
+                cache.generate_content(case, config={"response_mime_type": "application/json"})
+
+        self.assertEqual(len(client.caches.created), 1)
+        self.assertEqual(client.caches.created[0][1]["contents"], [LARGE_PREFIX])
+        self.assertEqual([call["contents"] for call in client.models.calls], ["case 1", "case 2", "case 3"])
+        for call in client.models.calls:
+            self.assertEqual(call["config"]["cached_content"], "cachedContents/1")
+            self.assertNotIn("system_instruction", call["config"])
+        self.assertEqual(client.caches.deleted, ["cachedContents/1"])
+
+    def test_small_prefix_sent_inline(self):
+        """Test prefixes below the caching minimum are sent inline without creating a cache"""
+        client = FakeClient()
+        with PromptCache(client, "model", "short prefix", system_instruction="be brief") as cache:
+            cache.generate_content("case 1")
+
+        self.assertEqual(client.caches.created, [])
+        self.assertEqual(client.models.calls[0]["contents"], ["short prefix", "case 1"])
+        self.assertEqual(client.models.calls[0]["config"], {"system_instruction": "be brief"})
+
+    def test_cache_failure_falls_back_inline(self):
+        """Test a failed cache creation still answers with the full prompt"""
+        client = FakeClient(fail=True)
+        with PromptCache(client, "model", LARGE_PREFIX) as cache:
+            cache.generate_content("case 1")
+        self.assertEqual(client.models.calls[0]["contents"], [LARGE_PREFIX, "case 1"])
+        self.assertEqual(client.caches.deleted, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from ..scenario_dedup import normalise_scenario, cluster_feature_texts
+from ..test_code_generator import generate_E2E_code
+
+LOGIN = '''Feature: 1. Login
+
+  Scenario: 1. Successful login
+    Given the user is on the login page
+    And the user has a registered account
+    When the user enters valid credentials and clicks the "Login" button
+    Then the user is redirected to the dashboard page
+
+'''
+
+LOGIN_COPY = '''Feature: 4. Authentication
+
+  Scenario: 2. Login works
+    Given  user is on the login page.
+    And the user has a registered account
+    When the user enters valid credentials and clicks the "Login" button
+    Then the user is redirected to the dashboard page
+
+'''
+
+LOGIN_NEAR = '''Feature: 5. Authentication
+
+  Scenario: 3. Login again
+    Given the user is on the login page
+    And the user has a registered account
+    When the user enters valid credentials and then clicks the "Login" button
+    Then the user is redirected to the dashboard page of the application
+
+'''
+
+LOGIN_INVALID = '''Feature: 2. Login
+
+  Scenario: 2. Failed login
+    Given the user is on the login page
+    And the user has a registered account
+    When the user enters invalid credentials and clicks the "Login" button
+    Then an error message is shown
+
+'''
+
+CORRECT_PASSWORD = '''Feature: 3. Login
+
+  Scenario: 1. Login with password
+    Given the user is on the login page
+    And the user has a registered account with email "user@example.com"
+    When the user enters the email "user@example.com" and the correct password
+    And the user clicks the "Login" button
+    Then the user is redirected to the dashboard page
+    And the user's name is shown in the header
+
+'''
+
+WRONG_PASSWORD = CORRECT_PASSWORD.replace("the correct password", "the wrong password")
+
+LOGIN_ZH = '''Feature: 1. 登录
+
+  Scenario: 1. 登录成功
+    Given 用户在登录页面
+    When 用户输入正确的密码并点击"登录"按钮
+    Then 用户被跳转到首页
+
+'''
+
+SEARCH_ZH = '''Feature: 2. 搜索
+
+  Scenario: 1. 搜索商品
+    Given 用户在首页
+    When 用户在搜索框输入"手机"
+    Then 显示搜索结果列表
+
+'''
+
+class TestScenarioDedup(unittest.TestCase):
+    def test_normalise_scenario_ignores_headers_and_formatting(self):
+        """Test normalise_scenario drops feature/scenario titles, articles and punctuation"""
+        self.assertEqual(normalise_scenario(LOGIN), normalise_scenario(LOGIN_COPY))
+        self.assertTrue(normalise_scenario(LOGIN).startswith("given user is on login page"))
+
+    def test_cluster_feature_texts_groups_duplicates(self):
+        """Test exact and near duplicates share a cluster while different scenarios do not"""
+        feature_text = {
+            "text1": LOGIN,
+            "text2": LOGIN_INVALID,
+            "text3": LOGIN_COPY,
+            "text4": LOGIN_NEAR,
+        }
+        clusters = cluster_feature_texts(feature_text, threshold=0.6)
+        self.assertEqual(clusters, {"text1": ["text1", "text3", "text4"], "text2": ["text2"]})
+
+    def test_cluster_feature_texts_exact_only(self):
+        """Test threshold 1.0 only merges scenarios that normalise identically"""
+        feature_text = {"text1": LOGIN, "text2": LOGIN_NEAR, "text3": LOGIN_COPY}
+        clusters = cluster_feature_texts(feature_text, threshold=1.0)
+        self.assertEqual(clusters, {"text1": ["text1", "text3"], "text2": ["text2"]})
+
+    def test_cluster_feature_texts_default_keeps_one_word_apart(self):
+        """Test the default threshold keeps scenarios that differ in a single word in separate clusters"""
+        feature_text = {"text1": CORRECT_PASSWORD, "text2": WRONG_PASSWORD}
+        self.assertEqual(cluster_feature_texts(feature_text), {"text1": ["text1"], "text2": ["text2"]})
+        # the same pair is near-identical, so it is merged when near-duplicate merging is asked for
+        self.assertEqual(cluster_feature_texts(feature_text, threshold=0.7), {"text1": ["text1", "text2"]})
+
+    def test_cluster_feature_texts_keeps_non_ascii_steps(self):
+        """Test scenarios written in Chinese are told apart by their steps, not merged on the keywords alone"""
+        feature_text = {"text1": LOGIN_ZH, "text2": SEARCH_ZH, "text3": LOGIN_ZH.replace("Feature: 1.", "Feature: 3.")}
+        self.assertEqual(cluster_feature_texts(feature_text), {"text1": ["text1", "text3"], "text2": ["text2"]})
+        self.assertIn("用户在登录页面", normalise_scenario(LOGIN_ZH))
+
+    @patch('google.genai.Client')
+    def test_generate_E2E_code_calls_once_per_cluster(self, mock_client):
+        """Test generate_E2E_code maps one generated file back to every duplicate"""
+        mock_response = MagicMock()
+        mock_response.text = "print('test')"
+        mock_client.return_value.models.generate_content.return_value = mock_response
+
+        feature_text = {"text1": LOGIN, "text2": LOGIN_INVALID, "text3": LOGIN_COPY}
+        result = generate_E2E_code(feature_text, "test_api_key")
+
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 2)
+        self.assertEqual(list(result), ["test_code_for_case_1.py", "test_code_for_case_2.py", "test_code_for_case_3.py"])
+        self.assertEqual(result["test_code_for_case_3.py"], "print('test')")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from ..test_code_generator import generate_E2E_code, _make_batches
+from ..usage import BudgetExceeded
+
+def feature(step: str) -> str:
+    return f"Feature: 1. Feature\n\n  Scenario: 1. Scenario\n    Given {step}\n    When it runs\n    Then it passes\n\n"
+
+class TestTestCodeGenerator(unittest.TestCase):
+    def test_make_batches_respects_size_and_token_cap(self):
+        """Test _make_batches splits on batch size and on the token cap"""
+        texts = {"text1": "a" * 40, "text2": "b" * 40, "text3": "c" * 40}
+        self.assertEqual([list(b) for b in _make_batches(texts, 2, 1000)], [["text1", "text2"], ["text3"]])
+        self.assertEqual([list(b) for b in _make_batches(texts, 3, 15)], [["text1"], ["text2"], ["text3"]])
+
+    @patch('google.genai.Client')
+    def test_generate_E2E_code_batched(self, mock_client):
+        """Test batching packs several feature texts into one structured call"""
+        mock_response = MagicMock()
+        mock_response.text = json.dumps({"test_code": [
+            {"file_name": "text1", "code": "code 1"},
+            {"file_name": "text2", "code": "code 2"},
+        ]})
+        mock_client.return_value.models.generate_content.return_value = mock_response
+
+        feature_text = {"text1": feature("a login page"), "text2": feature("a search page")}
+        result = generate_E2E_code(feature_text, "test_api_key", batch_size=5)
+
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 1)
+        self.assertEqual(result, {"test_code_for_case_1.py": "code 1", "test_code_for_case_2.py": "code 2"})
+
+    @patch('google.genai.Client')
+    def test_generate_E2E_code_batch_falls_back_per_item(self, mock_client):
+        """Test a failed batch is retried as one call per feature text with the same output"""
+        single_response = MagicMock()
+        single_response.text = "single code"
+        mock_client.return_value.models.generate_content.side_effect = [Exception("API Error"), single_response, single_response]
+
+        feature_text = {"text1": feature("a login page"), "text2": feature("a search page")}
+        with self.assertLogs('TestPlanner.test_code_generator', level='WARNING'):
+            result = generate_E2E_code(feature_text, "test_api_key", batch_size=5)
+
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 3)
+        self.assertEqual(result, {"test_code_for_case_1.py": "single code", "test_code_for_case_2.py": "single code"})
+
+    @patch('google.genai.Client')
+    def test_generate_E2E_code_batch_budget_is_raised(self, mock_client):
+        """Test a batch stopped by the token budget ends the run instead of falling back per item"""
+        mock_client.return_value.models.generate_content.side_effect = BudgetExceeded("Budget used up")
+
+        feature_text = {"text1": feature("a login page"), "text2": feature("a search page")}
+        with self.assertRaises(BudgetExceeded):
+            generate_E2E_code(feature_text, "test_api_key", batch_size=5, errors={})
+
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from ..usage import BudgetExceeded, metering, usage_of
+from ..llm_test_plan_generator import generate_test_plan, generate_test_plan_stream
+
+TEST_PLAN = {"test_plan": [{"Objective": "O", "Scope": "S", "Test_Items": {
+    "Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["C"]}}]}
+
+def usage_metadata(prompt: int, output: int) -> MagicMock:
+    return MagicMock(prompt_token_count=prompt, candidates_token_count=output, cached_content_token_count=None,
+                     thoughts_token_count=None, total_token_count=prompt + output)
+
+class RecordingMeter:
+    def __init__(self, allowed: bool = True):
+        self.allowed = allowed
+        self.charges = []
+
+    def check(self, stage):
+        if not self.allowed:
+            raise BudgetExceeded(stage)
+
+    def charge(self, stage, model, usage):
+        self.charges.append((stage, usage))
+
+class TestUsage(unittest.TestCase):
+    def test_usage_of(self):
+        """Test token counts are read from usage_metadata, missing ones count as 0"""
+        self.assertEqual(usage_of(usage_metadata(10, 5)), {
+            "calls": 1, "prompt_tokens": 10, "output_tokens": 5, "cached_tokens": 0, "thoughts_tokens": 0, "total_tokens": 15})
+        self.assertEqual(usage_of(None)["total_tokens"], 0)
+
+    @patch('google.genai.Client')
+    def test_calls_are_charged_to_the_meter(self, mock_client):
+        """Test a model call inside metering is charged, outside of it nothing is recorded"""
+        response = MagicMock(text=json.dumps(TEST_PLAN), usage_metadata=usage_metadata(100, 20))
+        mock_client.return_value.models.generate_content.return_value = response
+        meter = RecordingMeter()
+
+        with metering(meter):
+            generate_test_plan({}, "key")
+        generate_test_plan({}, "key")
+
+        self.assertEqual([(stage, usage["total_tokens"]) for stage, usage in meter.charges], [("test_plan", 120)])
+
+    @patch('google.genai.Client')
+    def test_stream_is_charged_once(self, mock_client):
+        """Test a streamed call is charged with the usage of its last chunk"""
+        text = json.dumps(TEST_PLAN)
+        mock_client.return_value.models.generate_content_stream.return_value = iter([
+            MagicMock(text=text[:20], usage_metadata=usage_metadata(100, 5)),
+            MagicMock(text=text[20:], usage_metadata=usage_metadata(100, 30))])
+        meter = RecordingMeter()
+
+        with metering(meter):
+            self.assertEqual(list(generate_test_plan_stream({}, "key")), TEST_PLAN["test_plan"])
+
+        self.assertEqual([(stage, usage["total_tokens"]) for stage, usage in meter.charges], [("test_plan", 130)])
+
+    @patch('google.genai.Client')
+    def test_budget_stops_the_call(self, mock_client):
+        """Test the model is not called once the meter refuses the stage"""
+        with metering(RecordingMeter(allowed=False)):
+            with self.assertRaises(BudgetExceeded):
+                generate_test_plan({}, "key")
+        mock_client.return_value.models.generate_content.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
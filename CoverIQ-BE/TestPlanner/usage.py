@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+# token usage of every model call, reported to the meter of the request that made the call.
+# The meter is looked up from a context variable so the generators keep their signatures;
+# code that fans calls out to threads has to run them in a copy of the caller's context.
+
+USAGE_FIELDS = {
+    "prompt_tokens": "prompt_token_count",
+    "output_tokens": "candidates_token_count",
+    "cached_tokens": "cached_content_token_count",
+    "thoughts_tokens": "thoughts_token_count",
+    "total_tokens": "total_token_count",
+}
+
+
+class BudgetExceeded(Exception):
+    """The token budget of the API key or the run is used up"""
+
+
+_meter: ContextVar[Optional[Any]] = ContextVar("usage_meter", default=None)
+
+
+def usage_of(usage_metadata: Any) -> Dict[str, int]:
+    """Token counts of a response's usage_metadata, missing counts are 0"""
+    usage = {"calls": 1}
+    for name, attribute in USAGE_FIELDS.items():
+        value = getattr(usage_metadata, attribute, None)
+        usage[name] = value if isinstance(value, int) else 0
+    return usage
+
+
+def check_budget(stage: str) -> None:
+    """Raise BudgetExceeded before a model call the current meter no longer allows"""
+    meter = _meter.get()
+    if meter is not None:
+        meter.check(stage)
+
+
+def record_usage(stage: str, model: str, response: Any) -> None:
+    """Charge the usage of a model response (or the last chunk of a stream) to the current meter"""
+    meter = _meter.get()
+    if meter is not None:
+        meter.charge(stage, model, usage_of(getattr(response, "usage_metadata", None)))
+
+
+@contextmanager
+def metering(meter: Any) -> Iterator[Any]:
+    """Model calls made inside the block are checked against and charged to meter"""
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
@@ -1,20 +1,15 @@
-from google import genai
-import google.generativeai as googlegenai
-from PIL import Image
-import pyautogui
 from pydantic import BaseModel
 import json
-from google.genai import types
-import time
-import pyautogui
-from PIL import Image, ImageChops
-import webbrowser
 import re
-import requests
 from typing import Dict, Any, List, Optional
-from dotenv import load_dotenv 
-import argparse
 import os 
+from .frames import Frame, FramePipeline, LatencyLog
+from .change_detection import ChangeDetector
+from .figma_locator import PrototypeViewport, candidate_box, locate_from_figma
+from .frame_index import FrameIndex
+from .sessions import DesktopSession
+from TestPlanner.prompt_cache import PromptCache
+from TestPlanner.model_router import default_router
 
 def parse_figma_url(url: str) -> dict:
     """
@@ -37,6 +32,7 @@ def parse_figma_url(url: str) -> dict:
     }
 
 def get_figma_file_data(file_key: str, token: str) -> Dict[str, Any]:
+    import requests
     headers = {
      'X-Figma-Token': token
     }
@@ -66,10 +62,10 @@ def filter_component(figma_data: Dict[str, Any],feature_description: Optional[st
                     "x": node.get("absoluteBoundingBox", {}).get("x"),
                     "y": node.get("absoluteBoundingBox", {}).get("y")
                 },
-                # "size": {
-                #     "width": node.get("absoluteBoundingBox", {}).get("width"),
-                #     "height": node.get("absoluteBoundingBox", {}).get("height")
-                # },
+                "size": {
+                    "width": node.get("absoluteBoundingBox", {}).get("width"),
+                    "height": node.get("absoluteBoundingBox", {}).get("height")
+                },
                 "interactions": node.get("interactions"),
                 "styleOverrideTable": node.get("styleOverrideTable")
             }
@@ -93,8 +89,9 @@ def filter_component(figma_data: Dict[str, Any],feature_description: Optional[st
 class id_scheme(BaseModel):
     node_id: str
 
-def find_page_id(api_key: str, case: dict, fig_data: dict , frame_list : list):
-    prompt = f'''
+def frame_selection_prefix(fig_data: dict, frame_list: list) -> str:
+    """The part of the find_page_id prompt shared by every test case of a Figma file"""
+    return f'''
     You are given:
     - A BDD-style test case (describes the UI element or feature to test)
     - Figma structured data (the hierarchical design data)
@@ -110,72 +107,79 @@ def find_page_id(api_key: str, case: dict, fig_data: dict , frame_list : list):
     - Do NOT include any explanation, comments, or extra text
 
     Inputs:
-    - Test case: {case}
     - Figma structured data: {fig_data}
 
     Output format:
 
     "node_id": "<selected node_id from frame_list>" '''
 
+def frame_selection_cache(api_key: str, fig_data: dict, frame_list: list) -> PromptCache:
+    """Prompt cache holding the Figma data, enter it once around a batch of find_page_id calls"""
+    from google import genai
     client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model='gemini-2.5-flash-preview-04-17',
-        contents=prompt,
-        config={
-            "response_mime_type": "application/json",
-            "response_schema": id_scheme
-        }
-    )
-    return json.loads(response.text)
+    return default_router.prompt_cache(client, 'frame_selection', frame_selection_prefix(fig_data, frame_list))
 
-def generate_description(api_key: str, case: dict, image_path: str, figma_data: dict):
-    googlegenai.configure(api_key=api_key)
-    model = googlegenai.GenerativeModel('gemini-2.5-flash-preview-04-17')
-    path = image_path
-    image = Image.open(path)
-    prompt = f'''{case}''' + f"Based on the above test case and figma structural data , can you determine which icon the mouse should move to? If not, please just answer 'No'. If yes, please describe the icon approximately by its position, color, text, or other features. figma structural data : {figma_data}"
-    response = model.generate_content([prompt, image])
-    return response.text
-
-def capture_screen(path='screen.png'):
-    """ Capture the screen and save it as a file """
-    screenshot = pyautogui.screenshot()
-    screenshot.save(path)
-    return Image.open(path)
-
-def images_are_equal(img):
-    """ Compare two images for equality """
-    diff = ImageChops.difference(img,pyautogui.screenshot())
-    return not diff.getbbox()
-
-class position_scheme(BaseModel):
-    x: str
-    y: str
-
-class check_scheme(BaseModel):
-    ans: str
+def find_page_id(api_key: str, case: dict, fig_data: dict , frame_list : list, prompt_cache: Optional[PromptCache] = None):
+    config = {
+        "response_mime_type": "application/json",
+        "response_schema": id_scheme
+    }
+    if prompt_cache is not None:
+        response = prompt_cache.generate_content(f"Test case: {case}", config=config)
+        return json.loads(response.text)
 
-def generate_position(api_key: str, description: str, image_path: str):
-    prompt = "Based on the following description and the full computer screen screenshot (note: the entire image is included, including black borders), assuming the top is 0, bottom is 1, left is 0, right is 1, where is the button approximately located on the screen? Description: " + description
-    with open(image_path, 'rb') as f:
-        image_bytes = f.read()
+    # a single call costs more to cache than to send, so the prefix goes inline
+    from google import genai
     client = genai.Client(api_key=api_key)
-    response = client.models.generate_content(
-        model='gemini-2.5-flash-preview-04-17',
+    response = default_router.generate_content(client, 'frame_selection',
+                                               [frame_selection_prefix(fig_data, frame_list), f"Test case: {case}"], config)
+    return json.loads(response.text)
+
+class locate_scheme(BaseModel):
+    found: bool
+    description: str
+    x: float
+    y: float
+    confidence: float
+
+def locate_element(client, case: dict, frame: Frame, figma_data: dict, candidate: Optional[dict] = None) -> dict:
+    """
+    Decide whether the element to act on is visible and where, in a single structured call.
+    x and y are fractions of the screenshot (top/left is 0, bottom/right is 1).
+    """
+    from google.genai import types
+    hint = ""
+    if candidate:
+        hint = (f"The target is probably the Figma element '{candidate['name']}', which spans "
+                f"x {candidate['x0']}-{candidate['x1']} and y {candidate['y0']}-{candidate['y1']} of its design frame "
+                "(fractions of the frame, the frame may be scaled or scrolled on screen). Look there first. ")
+    prompt = (f'''{case}''' + "Based on the above test case, figma structural data and the full computer screen screenshot "
+              "(note: the entire image is included, including black borders), determine which icon the mouse should move to. "
+              + hint +
+              "If it is not on the screen, set found to false. If it is, set found to true, describe the icon by its position, "
+              "color, text, or other features, and give its approximate location assuming the top is 0, bottom is 1, left is 0, "
+              "right is 1, together with your confidence between 0 and 1. "
+              f"figma structural data : {figma_data}")
+    response = default_router.generate_content(
+        client,
+        'locate_element',
         contents=[
             types.Part.from_bytes(
-                data=image_bytes,
-                mime_type='image/jpeg',
+                data=frame.data,
+                mime_type=frame.mime_type,
             ),
             prompt
         ],
         config={
             "response_mime_type": "application/json",
-            "response_schema": position_scheme
+            "response_schema": locate_scheme
         }
     )
     return json.loads(response.text)
 
+class check_scheme(BaseModel):
+    ans: str
+
 # def check_button(api_key: str, case: dict, image_path: str) -> str:
 #     prompt = f'''{case}''' + "Based on the above test case, can you determine if the icon to click is currently on the screen? Please answer Yes or No."
 #     with open(image_path, 'rb') as f:
@@ -197,15 +201,6 @@ def generate_position(api_key: str, description: str, image_path: str):
 #     )
 #     return json.loads(response.text)
 
-def find_and_click(position: dict):
-    x = float(position['x'])
-    y = float(position['y'])
-    screen_width, screen_height = pyautogui.size()
-    print('x:', x * screen_width)
-    print('y:', y * screen_height)
-    pyautogui.moveTo(x * screen_width, y * screen_height, duration=0.5)
-    pyautogui.click()
-
 def get_frame_list(figma_data : dict) :    
     output = []
     for page in figma_data["document"]["children"]:
@@ -222,59 +217,107 @@ def get_frame_list(figma_data : dict) :
                 # print(f"  FRAME: {node_name} → node-id: {node_id}")
     return output
 
-def agent_execute(api_key: str, project_key : str , project_name : str , case: dict, fig_data: dict,frame_list: list, image_path: str = 'screen.png', scroll_amount: int = -1500, wait_between_scrolls: int = 1.0):
+def agent_execute(api_key: str, project_key : str , project_name : str , case: dict, fig_data: dict,frame_list: list, frame_pipeline: Optional[FramePipeline] = None, change_detector: Optional[ChangeDetector] = None, scroll_amount: int = -1500, wait_between_scrolls: int = 1.0, min_confidence: float = 0.3, figma_document: Optional[dict] = None, viewport: Optional[PrototypeViewport] = None, frame_index: Optional[FrameIndex] = None, session: Optional[Any] = None, prototype_base_url: str = "https://www.figma.com/proto", prompt_cache: Optional[PromptCache] = None):
     """
     Intelligent agent workflow:
     1. Find the target page node ID, build the URL, and visit the page
     2. Continuously capture screenshots to check if there's an element to click
     3. If not, scroll the page until found or reaching the end
 
+    Returns the answer for the clicked element, or None when nothing was clicked.
+
     :param api_key: Gemini API key
     :param case: Test case dictionary
     :param fig_data: Figma structured data dictionary
-    :param image_path: Screenshot save path
+    :param frame_pipeline: Screenshot encoder, defaults to one over the session's screenshots
+    :param change_detector: Decides when two frames show the same screen
     :param scroll_amount: Scroll amount per action (negative for down, positive for up)
-    :param wait_between_scrolls: Seconds to wait after each scroll
+    :param wait_between_scrolls: Longest wait for the screen to settle after each scroll
+    :param min_confidence: Located elements below this confidence are treated as not found
+    :param figma_document: Raw Figma file data, enables locating the element from the design geometry
+    :param viewport: Where the prototype is drawn on screen, required for the geometry locator
+    :param frame_index: Local frame index for the file, the LLM is only asked when it cannot decide
+    :param session: Screen to drive (DesktopSession or a headless BrowserSession), defaults to the desktop
+    :param prototype_base_url: Prototype viewer URL prefix, overridable for local stand-in pages
+    :param prompt_cache: Entered frame_selection_cache shared by all cases of a run
     """
     # Step 1: Find page node ID
-    page_info = find_page_id(api_key, case, fig_data, frame_list)
-    page_node_id = page_info["node_id"]
+    page_node_id = frame_index.choose(case) if frame_index is not None else None
+    if page_node_id is None:
+        page_info = find_page_id(api_key, case, fig_data, frame_list, prompt_cache)
+        page_node_id = page_info["node_id"]
     if not page_node_id:
         print("Failed to retrieve page node ID.")
         return
 
     # Step 2: Build URL and visit
-    target_url = f"https://www.figma.com/proto/{project_key}/{project_name}?node-id={page_node_id}"
+    session = session or DesktopSession()
+    target_url = f"{prototype_base_url}/{project_key}/{project_name}?node-id={page_node_id}"
     print(f"Navigating to URL: {target_url}")
-    webbrowser.open(target_url)
-    time.sleep(10)  # Wait for the page to load
+    session.open(target_url)
+    if session.waits.waits:
+        print(session.waits.waits[-1])
+
+    # Step 3: Locate from the Figma geometry alone, the vision model is only a fallback
+    if figma_document is not None and viewport is not None:
+        located = locate_from_figma(figma_document, page_node_id, case, viewport, session.screen_size())
+        if located:
+            print(located["description"])
+            session.click(located)
+            print("Click completed!")
+            return located
 
-    # Step 3: Screenshot check
+    # Step 4: Screenshot check, every frame is captured and encoded once
+    from google import genai
+    client = genai.Client(api_key=api_key)
+    candidate = candidate_box(fig_data, page_node_id, case)
+    pipeline = frame_pipeline or FramePipeline(session.screenshot)
+    detector = change_detector or ChangeDetector()
+    latency = LatencyLog()
+    with latency.measure("capture"):
+        frame = pipeline.capture()
     while True:
-        previous_img = capture_screen(image_path)
-        description = generate_description(api_key, case, image_path,fig_data)
-        print(description)
-        if 'No' not in description.strip()[:3]:
+        # a screen that looks like one already searched gets the same answer
+        located = detector.known_answer(frame)
+        if located is None:
+            with latency.measure("locate"):
+                located = locate_element(client, case, frame, fig_data, candidate)
+            detector.remember(frame, located)
+        print(located["description"])
+        if located["found"] and located["confidence"] >= min_confidence:
             print("Found clickable element, preparing to click...")
-            position = generate_position(api_key, description, image_path)
-            find_and_click(position)
+            with latency.measure("click"):
+                session.click(located)
             print("Click completed!")
-            break
-
-        # Step 4: Scroll page
-        pyautogui.scroll(scroll_amount)
-        print("Scrolling, checking if the screen has changed...")
-        time.sleep(wait_between_scrolls)
-        if images_are_equal(previous_img):
+            print(latency.format_last())
+            return located
+
+        # Step 5: Scroll page
+        with latency.measure("scroll"):
+            session.scroll(scroll_amount)
+            print("Scrolling, checking if the screen has changed...")
+            # a smooth scroll may not have started rendering yet, so wait for the screen to move
+            # before waiting for it to rest. At the end of the page this runs into the timeout.
+            print(session.settle("scroll", wait_between_scrolls, wait_for_change=True))
+        with latency.measure("capture"):
+            previous, frame = frame, pipeline.capture()
+        print(latency.format_last())
+        if detector.is_same(previous, frame):
             print("Screen unchanged, reached end of scroll. Stopping task.")
             return
+        latency.new_iteration()
+
 if __name__ == "__main__" :
+    import argparse
+    from dotenv import load_dotenv
     load_dotenv()
     api_key = os.getenv("GEMENI_KEY")  
     token = os.getenv("FIGMA_ACCESS_TOKEN")
     parser = argparse.ArgumentParser(description="get figma frame form figma url")
     parser.add_argument("fig_url", help="Figma desing/file URL")
     parser.add_argument("json_path", help="json file path")
+    parser.add_argument("--viewport", help="Prototype viewport on screen as left,top,width,height in pixels", default=None)
+    parser.add_argument("--workers", type=int, help="Run every test case in parallel headless browsers with this many workers", default=None)
     args = parser.parse_args()
     with open(args.json_path, "r", encoding="utf-8") as f:
         data = json.load(f)
@@ -282,5 +325,14 @@ if __name__ == "__main__" :
     figma_data = get_figma_file_data(proj['project_key'],token)
     filtered_figma_data = filter_component(figma_data)
     frame_list = get_frame_list(figma_data)
+    frame_index = FrameIndex(figma_data, frame_list)
+    viewport = PrototypeViewport(*[float(v) for v in args.viewport.split(",")]) if args.viewport else None
+    if args.workers:
+        from .runner import run_agent_cases
+        cases = [case for feature in data.values() for case in feature['bdd_style_descriptions']]
+        reports = run_agent_cases(api_key,proj['project_key'],proj['project_name'],cases,filtered_figma_data,frame_list,max_workers=args.workers,figma_document=figma_data,viewport=viewport,frame_index=frame_index)
+        for report in reports:
+            print(report['case']['Scenario'], '->', report['error'] or report['result'], f"({report['seconds']:.1f}s)")
+        raise SystemExit(0)
     print(data['Feature 1']['bdd_style_descriptions'][4])
-    agent_execute(api_key,proj['project_key'],proj['project_name'],data['Feature 1']['bdd_style_descriptions'][4],filtered_figma_data,frame_list)
\ No newline at end of file
+    agent_execute(api_key,proj['project_key'],proj['project_name'],data['Feature 1']['bdd_style_descriptions'][4],filtered_figma_data,frame_list,figma_document=figma_data,viewport=viewport,frame_index=frame_index)
\ No newline at end of file
@@ -0,0 +1,66 @@
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+from .frames import Frame
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# cheap "has the screen changed" checks on perceptual hashes instead of full-resolution pixel diffs
+
+DEFAULT_HASH_SIZE = 16
+# differing bits out of 2 * hash_size * hash_size that still count as the same screen
+DEFAULT_TOLERANCE = 20
+
+
+def difference_hash(image: "Image.Image", hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    """
+    dHash on a tiny grayscale copy: one bit per horizontal and one per vertical
+    neighbour comparison, so both sideways and vertical scrolling move the hash.
+    """
+    from PIL import Image
+    width = hash_size + 1
+    pixels = image.convert("L").resize((width, width), Image.BILINEAR).tobytes()
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            here = pixels[row * width + col]
+            bits = (bits << 1) | (here > pixels[row * width + col + 1])
+            bits = (bits << 1) | (here > pixels[(row + 1) * width + col])
+    return bits
+
+
+def hamming_distance(left: int, right: int) -> int:
+    return bin(left ^ right).count("1")
+
+
+def frame_hash(frame: Frame, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    """Hash of a frame, computed once and kept on the frame"""
+    if frame.fingerprint is None:
+        frame.fingerprint = difference_hash(frame.image, hash_size)
+    return frame.fingerprint
+
+
+class ChangeDetector:
+    """
+    Decides whether two frames show the same screen, and remembers the model's answer
+    for frames already searched so identical-looking screens do not go back to the model.
+    """
+
+    def __init__(self, hash_size: int = DEFAULT_HASH_SIZE, tolerance: int = DEFAULT_TOLERANCE):
+        self.hash_size = hash_size
+        self.tolerance = tolerance
+        self._answers: List[Tuple[int, Any]] = []
+
+    def is_same(self, previous: Frame, current: Frame) -> bool:
+        distance = hamming_distance(frame_hash(previous, self.hash_size), frame_hash(current, self.hash_size))
+        return distance <= self.tolerance
+
+    def remember(self, frame: Frame, answer: Any) -> None:
+        self._answers.append((frame_hash(frame, self.hash_size), answer))
+
+    def known_answer(self, frame: Frame) -> Optional[Any]:
+        """Answer given for an already searched frame that looks the same, if any"""
+        current = frame_hash(frame, self.hash_size)
+        for fingerprint, answer in self._answers:
+            if hamming_distance(fingerprint, current) <= self.tolerance:
+                return answer
+        return None
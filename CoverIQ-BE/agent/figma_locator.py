@@ -0,0 +1,216 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# match BDD test cases against Figma nodes using only the design geometry and names
+
+STOP_WORDS = {
+    "a", "an", "and", "the", "is", "are", "be", "to", "on", "in", "of", "for", "with", "i", "user",
+    "should", "when", "then", "given", "clicks", "click", "taps", "tap", "page", "screen", "it", "its",
+}
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokens without the filler words every test case shares"""
+    return [token for token in _TOKEN_PATTERN.findall(str(text).lower()) if token not in STOP_WORDS]
+
+
+def case_weights(case: Dict[str, Any]) -> Dict[str, float]:
+    """Token weights for a BDD test case, the When step names the element to act on so it counts double"""
+    weights: Dict[str, float] = {}
+    for key, value in case.items():
+        weight = 2.0 if key == "When" else 1.0
+        for token in tokenize(value):
+            weights[token] = max(weights.get(token, 0.0), weight)
+    return weights
+
+
+def to_node_id(page_node_id: str) -> str:
+    """Frame ids in prototype URLs use '-' where the Figma API uses ':'"""
+    return page_node_id.replace("-", ":")
+
+
+def _descendants(components: List[Dict[str, Any]], root_id: str) -> List[Dict[str, Any]]:
+    children: Dict[Any, List[Dict[str, Any]]] = {}
+    for component in components:
+        children.setdefault(component.get("parent_id"), []).append(component)
+    output = []
+    stack = list(children.get(root_id, []))
+    while stack:
+        component = stack.pop()
+        output.append(component)
+        stack.extend(children.get(component.get("id"), []))
+    return output
+
+
+def candidate_box(fig_data: Dict[str, Any], page_node_id: str, case: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Best matching interactive element of the target frame as fractions of the frame
+    (0 is top/left, 1 is bottom/right), or None when nothing in the frame matches.
+
+    fig_data is the agent's filter_component output, positions and sizes are Figma absolute values.
+    """
+    components = fig_data.get("figma_data", [])
+    frame_id = to_node_id(page_node_id)
+    frame = next((c for c in components if c.get("id") == frame_id), None)
+    if not frame or not frame.get("size") or not frame["size"].get("width") or not frame["size"].get("height"):
+        return None
+
+    weights = case_weights(case)
+    best, best_score = None, 0.0
+    for component in _descendants(components, frame_id):
+        if not component.get("interactions") or not component.get("size"):
+            continue
+        score = sum(weights.get(token, 0.0) for token in set(tokenize(component.get("name", ""))))
+        if score > best_score:
+            best, best_score = component, score
+    if best is None:
+        return None
+
+    fx, fy = frame["position"]["x"], frame["position"]["y"]
+    fw, fh = frame["size"]["width"], frame["size"]["height"]
+    x, y = best["position"]["x"], best["position"]["y"]
+    w, h = best["size"]["width"], best["size"]["height"]
+    return {
+        "name": best.get("name"),
+        "x0": round((x - fx) / fw, 3),
+        "y0": round((y - fy) / fh, 3),
+        "x1": round((x + w - fx) / fw, 3),
+        "y1": round((y + h - fy) / fh, 3),
+    }
+
+
+class PrototypeViewport:
+    """
+    Screen rectangle, in pixels, where the Figma prototype viewer draws the frame.
+
+    scaling follows the prototype setting: "fit" scales the frame down to fit (never up),
+    "fit_width" scales it to the viewport width and "actual" keeps 100%.
+    """
+
+    def __init__(self, left: float, top: float, width: float, height: float, scaling: str = "fit"):
+        if scaling not in ("fit", "fit_width", "actual"):
+            raise ValueError(f"Unsupported prototype scaling: {scaling}")
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.scaling = scaling
+
+    def scale(self, frame_width: float, frame_height: float) -> float:
+        if self.scaling == "fit_width":
+            return self.width / frame_width
+        if self.scaling == "fit":
+            return min(1.0, self.width / frame_width, self.height / frame_height)
+        return 1.0
+
+    def to_screen(self, frame_box: Dict[str, float], x: float, y: float) -> Optional[Dict[str, float]]:
+        """Screen pixel of a Figma absolute point inside frame_box, None when it is outside the viewport"""
+        scale = self.scale(frame_box["width"], frame_box["height"])
+        drawn_width, drawn_height = frame_box["width"] * scale, frame_box["height"] * scale
+        origin_x = self.left + max(0.0, (self.width - drawn_width) / 2)
+        # frames taller than the viewport start at the top and scroll
+        origin_y = self.top + max(0.0, (self.height - drawn_height) / 2)
+        screen_x = origin_x + (x - frame_box["x"]) * scale
+        screen_y = origin_y + (y - frame_box["y"]) * scale
+        if not (self.left <= screen_x <= self.left + self.width and self.top <= screen_y <= self.top + self.height):
+            return None
+        return {"x": screen_x, "y": screen_y}
+
+
+def find_node(node: Dict[str, Any], node_id: str) -> Optional[Dict[str, Any]]:
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.get("id") == node_id:
+            return current
+        stack.extend(reversed(current.get("children", [])))
+    return None
+
+
+def _subtree_text(node: Dict[str, Any]) -> List[str]:
+    texts = []
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.get("type") == "TEXT" and current.get("characters"):
+            texts.append(current["characters"])
+        stack.extend(current.get("children", []))
+    return texts
+
+
+def _area(node: Dict[str, Any]) -> float:
+    box = node["absoluteBoundingBox"]
+    return box["width"] * box["height"]
+
+
+def _overlaps(left: Dict[str, Any], right: Dict[str, Any]) -> bool:
+    a, b = left["absoluteBoundingBox"], right["absoluteBoundingBox"]
+    return a["x"] < b["x"] + b["width"] and b["x"] < a["x"] + a["width"] and a["y"] < b["y"] + b["height"] and b["y"] < a["y"] + a["height"]
+
+
+def match_targets(frame: Dict[str, Any], case: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Clickable nodes of a raw Figma frame ranked by how well their name and the text
+    inside them match the test case, best first. Text nodes stand in for themselves
+    only when nothing interactive matches.
+    """
+    weights = case_weights(case)
+    interactive, text_nodes = [], []
+    stack = list(frame.get("children", []))
+    while stack:
+        node = stack.pop()
+        if node.get("absoluteBoundingBox"):
+            if node.get("interactions"):
+                interactive.append(node)
+            elif node.get("type") == "TEXT":
+                text_nodes.append(node)
+        stack.extend(node.get("children", []))
+
+    def rank(nodes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        ranked = []
+        for node in nodes:
+            label = " ".join([node.get("name", "")] + _subtree_text(node))
+            score = sum(weights.get(token, 0.0) for token in set(tokenize(label)))
+            if score > 0:
+                ranked.append({"node": node, "label": label, "score": score})
+        # equal scores favour the innermost, i.e. smallest, node
+        ranked.sort(key=lambda match: (-match["score"], _area(match["node"])))
+        return ranked
+
+    return rank(interactive) or rank(text_nodes)
+
+
+def locate_from_figma(document: Dict[str, Any], page_node_id: str, case: Dict[str, Any], viewport: PrototypeViewport,
+                      screen_size: Any, min_score: float = 2.0, min_margin: float = 1.0) -> Optional[Dict[str, Any]]:
+    """
+    Locate the element to click from the Figma geometry alone.
+
+    Returns a locate_element-shaped answer (x and y as fractions of the screen), or None when
+    the match is weak, ambiguous or off screen so the caller can fall back to the vision model.
+    """
+    frame = find_node(document, to_node_id(page_node_id))
+    if not frame or not frame.get("absoluteBoundingBox"):
+        return None
+    matches = match_targets(frame, case)
+    if not matches or matches[0]["score"] < min_score:
+        return None
+    best = matches[0]
+    # a wrapper around the best node is the same target, anything else this close is ambiguous
+    runner_up = next((match for match in matches[1:] if not _overlaps(match["node"], best["node"])), None)
+    if runner_up and best["score"] - runner_up["score"] < min_margin:
+        return None
+
+    box = best["node"]["absoluteBoundingBox"]
+    point = viewport.to_screen(frame["absoluteBoundingBox"], box["x"] + box["width"] / 2, box["y"] + box["height"] / 2)
+    if point is None:
+        return None
+    screen_width, screen_height = screen_size
+    when_weight = sum(weight for weight in case_weights(case).values() if weight > 1.0) or 1.0
+    return {
+        "found": True,
+        "description": f"Figma element '{best['node'].get('name')}' ({best['label']})",
+        "x": point["x"] / screen_width,
+        "y": point["y"] / screen_height,
+        "confidence": min(1.0, best["score"] / when_weight),
+    }
@@ -0,0 +1,68 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+from .figma_locator import case_weights, tokenize
+
+# pick the top-level frame a test case is about from a local inverted index instead of an LLM call
+
+# second best / best score above this ratio is too close to call locally
+DEFAULT_AMBIGUITY_RATIO = 0.8
+
+
+class FrameIndex:
+    """
+    Inverted index of the words under every top-level frame of a Figma file: node names
+    and text content. Build it once per file and reuse it for every test case.
+    """
+
+    def __init__(self, figma_data: Dict[str, Any], frame_list: Optional[List[str]] = None,
+                 ambiguity_ratio: float = DEFAULT_AMBIGUITY_RATIO):
+        self.ambiguity_ratio = ambiguity_ratio
+        self.frame_ids: List[str] = []
+        self._postings: Dict[str, Dict[str, int]] = {}
+        allowed = set(frame_list) if frame_list is not None else None
+
+        # same frames as get_frame_list, ids in the prototype URL form
+        for page in figma_data["document"].get("children", []):
+            for node in page.get("children", []):
+                if node.get("type") != "FRAME":
+                    continue
+                frame_id = node["id"].replace(":", "-")
+                if allowed is not None and frame_id not in allowed:
+                    continue
+                self.frame_ids.append(frame_id)
+                self._add_frame(frame_id, node)
+
+        count = len(self.frame_ids)
+        self._idf = {token: math.log(1 + count / len(postings)) for token, postings in self._postings.items()}
+
+    def _add_frame(self, frame_id: str, frame: Dict[str, Any]) -> None:
+        stack = [frame]
+        while stack:
+            node = stack.pop()
+            words = tokenize(node.get("name", ""))
+            if node.get("type") == "TEXT":
+                words += tokenize(node.get("characters", ""))
+            for token in words:
+                postings = self._postings.setdefault(token, {})
+                postings[frame_id] = postings.get(frame_id, 0) + 1
+            stack.extend(node.get("children", []))
+
+    def rank(self, case: Dict[str, Any]) -> List[Tuple[str, float]]:
+        """Frames with a non-zero score for the test case, best first"""
+        scores: Dict[str, float] = {}
+        for token, weight in case_weights(case).items():
+            for frame_id, term_frequency in self._postings.get(token, {}).items():
+                scores[frame_id] = scores.get(frame_id, 0.0) + weight * self._idf[token] * (1 + math.log(term_frequency))
+        order = {frame_id: position for position, frame_id in enumerate(self.frame_ids)}
+        return sorted(scores.items(), key=lambda item: (-item[1], order[item[0]]))
+
+    def choose(self, case: Dict[str, Any]) -> Optional[str]:
+        """Best frame id, or None when nothing matches or the top scores are too close to call"""
+        if len(self.frame_ids) == 1:
+            return self.frame_ids[0]
+        ranked = self.rank(case)
+        if not ranked:
+            return None
+        if len(ranked) > 1 and ranked[1][1] >= ranked[0][1] * self.ambiguity_ratio:
+            return None
+        return ranked[0][0]
@@ -0,0 +1,96 @@
+import io
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# in-memory screenshot pipeline: capture once, downscale and encode once, share with every consumer
+
+DEFAULT_MAX_WIDTH = 1280
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 80
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+
+class Frame:
+    """One screen capture: the downscaled image, its encoded bytes and the real screen size"""
+
+    def __init__(self, image: "Image.Image", data: bytes, mime_type: str, screen_size: Tuple[int, int]):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+        self.screen_size = screen_size
+        # perceptual hash, filled in lazily by change_detection
+        self.fingerprint: Optional[int] = None
+
+    def as_blob(self) -> Dict[str, object]:
+        """Inline image payload accepted by the Gemini SDKs"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def pyautogui_screen_source() -> "Image.Image":
+    """Grab the real desktop"""
+    import pyautogui
+    return pyautogui.screenshot()
+
+
+class FramePipeline:
+    def __init__(self, source: Callable[[], "Image.Image"] = pyautogui_screen_source, max_width: int = DEFAULT_MAX_WIDTH,
+                 image_format: str = DEFAULT_FORMAT, quality: int = DEFAULT_QUALITY):
+        if image_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        self.source = source
+        self.max_width = max_width
+        self.image_format = image_format
+        self.quality = quality
+
+    def capture(self) -> Frame:
+        """Take a screenshot and encode it, without touching the disk"""
+        from PIL import Image
+        screenshot = self.source()
+        screen_size = screenshot.size
+        image = screenshot
+        if self.max_width and image.width > self.max_width:
+            height = max(1, round(image.height * self.max_width / image.width))
+            image = image.resize((self.max_width, height), Image.BILINEAR)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, format=self.image_format, quality=self.quality)
+        return Frame(image, buffer.getvalue(), MIME_TYPES[self.image_format], screen_size)
+
+
+class LatencyLog:
+    """Per-iteration wall time of each named step of the agent loop"""
+
+    def __init__(self):
+        self.iterations: List[Dict[str, float]] = []
+
+    def new_iteration(self) -> None:
+        self.iterations.append({})
+
+    @contextmanager
+    def measure(self, step: str):
+        if not self.iterations:
+            self.new_iteration()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current = self.iterations[-1]
+            current[step] = current.get(step, 0.0) + time.perf_counter() - start
+
+    def last(self) -> Optional[Dict[str, float]]:
+        return self.iterations[-1] if self.iterations else None
+
+    def format_last(self) -> str:
+        last = self.last() or {}
+        steps = ", ".join(f"{step}={seconds * 1000:.0f}ms" for step, seconds in last.items())
+        return f"iteration {len(self.iterations)}: total={sum(last.values()) * 1000:.0f}ms ({steps})"
@@ -0,0 +1,74 @@
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from .sessions import headless_browser_sessions
+
+# run many BDD cases at once, every worker thread owns a headless browser and every case its own context
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def run_cases(cases: List[Dict[str, Any]], execute: Callable[[Any, Dict[str, Any]], Any],
+              max_workers: Optional[int] = None, worker_sessions: Callable = headless_browser_sessions) -> List[Dict[str, Any]]:
+    """
+    Execute every case concurrently and return one report per case, in input order:
+    {"case", "result", "error", "seconds"}.
+
+    execute(session, case) does the work for one case. worker_sessions() is entered once
+    per worker thread and yields a factory of per-case session context managers.
+    """
+    max_workers = max(1, min(max_workers or default_workers(), len(cases) or 1))
+    reports: List[Optional[Dict[str, Any]]] = [None] * len(cases)
+    pending: "queue.Queue[int]" = queue.Queue()
+    for index in range(len(cases)):
+        pending.put(index)
+
+    def worker() -> None:
+        try:
+            with worker_sessions() as new_session:
+                while True:
+                    try:
+                        index = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    start = time.perf_counter()
+                    report = {"case": cases[index], "result": None, "error": None}
+                    try:
+                        with new_session() as session:
+                            report["result"] = execute(session, cases[index])
+                    except Exception as e:
+                        report["error"] = str(e)
+                    report["seconds"] = time.perf_counter() - start
+                    reports[index] = report
+        except Exception as e:
+            # the browser itself failed, leave what is left to the other workers
+            print(f"Agent worker stopped: {e}")
+
+    threads = [threading.Thread(target=worker, name=f"agent-worker-{n}") for n in range(max_workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for index, report in enumerate(reports):
+        if report is None:
+            reports[index] = {"case": cases[index], "result": None, "error": "No agent worker available", "seconds": 0.0}
+    return reports
+
+
+def run_agent_cases(api_key: str, project_key: str, project_name: str, cases: List[Dict[str, Any]], fig_data: dict,
+                    frame_list: list, max_workers: Optional[int] = None, **agent_options) -> List[Dict[str, Any]]:
+    """agent_execute for every case, each in an isolated headless browser context"""
+    from .agent import agent_execute, frame_selection_cache
+
+    # the Figma data goes to the model once per run, not once per case
+    with frame_selection_cache(api_key, fig_data, frame_list) as prompt_cache:
+        def execute(session, case):
+            return agent_execute(api_key, project_key, project_name, case, fig_data, frame_list, session=session,
+                                 prompt_cache=prompt_cache, **agent_options)
+
+        return run_cases(cases, execute, max_workers)
@@ -0,0 +1,121 @@
+import io
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, Tuple
+from .waits import WaitLog, WaitResult, wait_until_stable
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# where the agent looks and clicks: the real desktop, or an isolated headless browser page
+
+DEFAULT_VIEWPORT = (1440, 900)
+DEFAULT_PAGE_TIMEOUT = 30.0
+# consecutive identical samples before a freshly opened page counts as rendered
+PAGE_STABLE_SAMPLES = 5
+
+
+class DesktopSession:
+    """Drives the local desktop with the default browser, one test case at a time"""
+
+    def __init__(self, page_load_wait: float = 10.0):
+        # upper bound only, the wait ends as soon as the screen settles
+        self.page_load_wait = page_load_wait
+        self.waits = WaitLog()
+
+    def open(self, url: str) -> None:
+        import webbrowser
+        webbrowser.open(url)
+        wait_until_stable(self.screenshot, "page load", timeout=self.page_load_wait, stable_samples=PAGE_STABLE_SAMPLES,
+                          wait_for_change=True, log=self.waits)
+
+    def settle(self, name: str, timeout: float, wait_for_change: bool = False) -> WaitResult:
+        """Wait until the screen stops changing, at most timeout seconds. With wait_for_change it has to change first"""
+        return wait_until_stable(self.screenshot, name, timeout=timeout, wait_for_change=wait_for_change, log=self.waits)
+
+    def screenshot(self) -> "Image.Image":
+        import pyautogui
+        return pyautogui.screenshot()
+
+    def screen_size(self) -> Tuple[int, int]:
+        import pyautogui
+        return tuple(pyautogui.size())
+
+    def click(self, position: dict) -> None:
+        import pyautogui
+        screen_width, screen_height = pyautogui.size()
+        x, y = float(position['x']) * screen_width, float(position['y']) * screen_height
+        print('x:', x)
+        print('y:', y)
+        pyautogui.moveTo(x, y, duration=0.5)
+        pyautogui.click()
+
+    def scroll(self, amount: int) -> None:
+        import pyautogui
+        pyautogui.scroll(amount)
+
+
+class BrowserSession:
+    """One headless browser page with its own screenshots, clicks and scrolling"""
+
+    def __init__(self, page, timeout: float = DEFAULT_PAGE_TIMEOUT):
+        self.page = page
+        self.timeout = timeout
+        self.waits = WaitLog()
+
+    def open(self, url: str) -> None:
+        # ready once the document loaded and the network went quiet, no fixed sleep
+        self.page.goto(url, wait_until="load", timeout=self.timeout * 1000)
+        try:
+            self.page.wait_for_load_state("networkidle", timeout=self.timeout * 1000)
+        except Exception:
+            # pages that keep polling never go idle, the load event is enough for them
+            pass
+        # canvas-rendered prototypes keep drawing after the network is done
+        wait_until_stable(self.screenshot, "page load", timeout=self.timeout, stable_samples=PAGE_STABLE_SAMPLES, log=self.waits)
+
+    def settle(self, name: str, timeout: float, wait_for_change: bool = False) -> WaitResult:
+        """Wait until the page stops changing, at most timeout seconds. With wait_for_change it has to change first"""
+        return wait_until_stable(self.screenshot, name, timeout=timeout, wait_for_change=wait_for_change, log=self.waits)
+
+    def screenshot(self) -> "Image.Image":
+        from PIL import Image
+        return Image.open(io.BytesIO(self.page.screenshot(type="png")))
+
+    def screen_size(self) -> Tuple[int, int]:
+        size = self.page.viewport_size
+        return size["width"], size["height"]
+
+    def click(self, position: dict) -> None:
+        width, height = self.screen_size()
+        self.page.mouse.click(float(position['x']) * width, float(position['y']) * height)
+
+    def scroll(self, amount: int) -> None:
+        # pyautogui convention: negative scrolls down, the wheel uses positive for down
+        self.page.mouse.wheel(0, -amount)
+
+
+@contextmanager
+def headless_browser_sessions(viewport: Tuple[int, int] = DEFAULT_VIEWPORT,
+                              timeout: float = DEFAULT_PAGE_TIMEOUT) -> Iterator[Callable[[], "contextmanager"]]:
+    """
+    Start one headless Chromium for the calling thread and yield a factory of isolated
+    sessions, each in its own browser context. Playwright objects must stay on the thread
+    that created them, so every runner worker enters this once.
+    """
+    from playwright.sync_api import sync_playwright
+
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=True)
+
+        @contextmanager
+        def new_session() -> Iterator[BrowserSession]:
+            context = browser.new_context(viewport={"width": viewport[0], "height": viewport[1]})
+            try:
+                yield BrowserSession(context.new_page(), timeout)
+            finally:
+                context.close()
+
+        try:
+            yield new_session
+        finally:
+            browser.close()
@@ -0,0 +1,3 @@
+"""
+Test package for the agent module.
+""" 
\ No newline at end of file
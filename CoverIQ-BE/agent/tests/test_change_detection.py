@@ -0,0 +1,48 @@
+import unittest
+from PIL import Image, ImageDraw
+from ..frames import FramePipeline
+from ..change_detection import ChangeDetector, difference_hash, hamming_distance
+
+def page(offset: int = 0, cursor: bool = False) -> Image.Image:
+    """A fake page of coloured stripes, scrolled by offset pixels"""
+    image = Image.new("RGB", (1280, 800), "white")
+    draw = ImageDraw.Draw(image)
+    for top in range(-offset, 800, 120):
+        draw.rectangle([100, top, 1180, top + 60], fill=(40, 90, 200))
+    if cursor:
+        draw.rectangle([640, 400, 641, 418], fill="black")
+    return image
+
+def capture(image: Image.Image):
+    return FramePipeline(lambda: image).capture()
+
+class TestChangeDetection(unittest.TestCase):
+    def test_difference_hash_size(self):
+        """Test difference_hash returns two bits per sampled pixel"""
+        self.assertLess(difference_hash(page(), hash_size=8), 1 << 128)
+
+    def test_cursor_blink_is_not_a_change(self):
+        """Test a blinking cursor stays within the tolerance"""
+        detector = ChangeDetector()
+        self.assertTrue(detector.is_same(capture(page()), capture(page(cursor=True))))
+
+    def test_scroll_is_a_change(self):
+        """Test scrolled content is detected as a different screen"""
+        detector = ChangeDetector()
+        self.assertFalse(detector.is_same(capture(page()), capture(page(offset=60))))
+
+    def test_known_answer(self):
+        """Test a visually identical frame reuses the stored answer"""
+        detector = ChangeDetector()
+        first = capture(page())
+        self.assertIsNone(detector.known_answer(first))
+        detector.remember(first, "No")
+        self.assertEqual(detector.known_answer(capture(page(cursor=True))), "No")
+        self.assertIsNone(detector.known_answer(capture(page(offset=60))))
+
+    def test_hamming_distance(self):
+        """Test hamming_distance counts differing bits"""
+        self.assertEqual(hamming_distance(0b1011, 0b0010), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+from ..figma_locator import tokenize, candidate_box, PrototypeViewport, locate_from_figma
+
+def component(node_id, parent_id, name, x, y, width, height, interactions=None):
+    return {
+        "parent_id": parent_id,
+        "id": node_id,
+        "name": name,
+        "type": "FRAME",
+        "position": {"x": x, "y": y},
+        "size": {"width": width, "height": height},
+        "interactions": interactions,
+        "styleOverrideTable": None,
+    }
+
+FIG_DATA = {
+    "figma_data": [
+        component("1:1", "0:1", "Home", 1000, 0, 400, 800),
+        component("1:2", "1:1", "Header", 1000, 0, 400, 100),
+        component("1:3", "1:2", "Login Button", 1300, 20, 80, 40, [{"type": "ON_CLICK"}]),
+        component("1:4", "1:1", "Search Bar", 1020, 120, 360, 40, [{"type": "ON_CLICK"}]),
+    ],
+    "feature_description": None,
+}
+
+CASE = {
+    "Scenario": "User logs in",
+    "Given": "the user is on the home page",
+    "And": "the user is logged out",
+    "When": "the user clicks the Login button",
+    "Then": "the login form is shown",
+}
+
+def node(node_id, name, x, y, width, height, node_type="FRAME", children=None, interactions=None, characters=None):
+    output = {
+        "id": node_id,
+        "name": name,
+        "type": node_type,
+        "absoluteBoundingBox": {"x": x, "y": y, "width": width, "height": height},
+        "children": children or [],
+    }
+    if interactions:
+        output["interactions"] = interactions
+    if characters:
+        output["characters"] = characters
+    return output
+
+CLICK = [{"trigger": {"type": "ON_CLICK"}}]
+
+DOCUMENT = {
+    "id": "0:0",
+    "children": [{
+        "id": "0:1",
+        "name": "Page 1",
+        "children": [
+            node("1:1", "Home", 1000, 0, 400, 800, children=[
+                node("1:2", "Header", 1000, 0, 400, 100, node_type="GROUP", children=[
+                    node("1:3", "Button", 1300, 20, 80, 40, node_type="INSTANCE", interactions=CLICK, children=[
+                        node("1:4", "Label", 1310, 30, 60, 20, node_type="TEXT", characters="Login"),
+                    ]),
+                ]),
+                node("1:5", "Sign up", 1020, 700, 120, 40, interactions=CLICK),
+            ]),
+        ],
+    }],
+}
+
+class TestFigmaLocator(unittest.TestCase):
+    def test_tokenize_drops_filler_words(self):
+        """Test tokenize keeps the meaningful words only"""
+        self.assertEqual(tokenize("When the user clicks the Login button"), ["login", "button"])
+
+    def test_candidate_box_relative_to_frame(self):
+        """Test candidate_box returns the matching nested element as fractions of its frame"""
+        box = candidate_box(FIG_DATA, "1-1", CASE)
+        self.assertEqual(box, {"name": "Login Button", "x0": 0.75, "y0": 0.025, "x1": 0.95, "y1": 0.075})
+
+    def test_candidate_box_without_match(self):
+        """Test candidate_box returns None when no element or frame matches"""
+        case = dict(CASE, When="the user opens settings", Then="settings are shown", Scenario="Settings")
+        case["Given"] = "the app is open"
+        case["And"] = "nothing else"
+        self.assertIsNone(candidate_box(FIG_DATA, "1-1", case))
+        self.assertIsNone(candidate_box(FIG_DATA, "9-9", CASE))
+
+    def test_viewport_fit_scales_down_and_centres(self):
+        """Test the fit viewport maps design coordinates to screen pixels"""
+        viewport = PrototypeViewport(0, 100, 1000, 400)
+        frame_box = {"x": 1000, "y": 0, "width": 400, "height": 800}
+        self.assertEqual(viewport.to_screen(frame_box, 1200, 400), {"x": 500.0, "y": 300.0})
+        self.assertIsNone(PrototypeViewport(0, 0, 400, 400, scaling="actual").to_screen(frame_box, 1200, 700))
+
+    def test_locate_from_figma(self):
+        """Test the button containing the matching text is located without the vision model"""
+        located = locate_from_figma(DOCUMENT, "1-1", CASE, PrototypeViewport(0, 0, 800, 800), (1600, 1000))
+        self.assertTrue(located["found"])
+        # button centre (1340, 40) in a 400 wide frame centred in an 800 wide viewport
+        self.assertAlmostEqual(located["x"], 540 / 1600)
+        self.assertAlmostEqual(located["y"], 40 / 1000)
+        self.assertEqual(located["confidence"], 1.0)
+
+    def test_locate_from_figma_falls_back(self):
+        """Test weak matches and unknown frames return None"""
+        case = dict(CASE, When="the user opens settings")
+        self.assertIsNone(locate_from_figma(DOCUMENT, "1-1", case, PrototypeViewport(0, 0, 800, 800), (1600, 1000)))
+        self.assertIsNone(locate_from_figma(DOCUMENT, "9-9", CASE, PrototypeViewport(0, 0, 800, 800), (1600, 1000)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from ..frame_index import FrameIndex
+from ..agent import find_page_id, frame_selection_prefix
+
+def text(node_id, characters):
+    return {"id": node_id, "name": characters, "type": "TEXT", "characters": characters}
+
+FIGMA_DATA = {
+    "document": {
+        "id": "0:0",
+        "children": [
+            {"id": "0:1", "name": "Page 1", "children": [
+                {"id": "1:1", "name": "Login", "type": "FRAME", "children": [
+                    text("1:2", "Email"), text("1:3", "Password"), text("1:4", "Sign in"),
+                ]},
+                {"id": "2:1", "name": "Search results", "type": "FRAME", "children": [
+                    text("2:2", "Search"), text("2:3", "Filter by price"),
+                ]},
+                {"id": "9:1", "name": "Sticker", "type": "COMPONENT"},
+            ]},
+            {"id": "0:2", "name": "Page 2", "children": [
+                {"id": "3:1", "name": "Checkout", "type": "FRAME", "children": [
+                    text("3:2", "Pay now"), text("3:3", "Price summary"),
+                ]},
+            ]},
+        ],
+    }
+}
+
+def case(when, given="the app is open"):
+    return {"Scenario": "scenario", "Given": given, "And": "", "When": when, "Then": "it works"}
+
+class TestFrameIndex(unittest.TestCase):
+    def test_frames_follow_get_frame_list(self):
+        """Test only top-level FRAME nodes are indexed, with URL style ids"""
+        self.assertEqual(FrameIndex(FIGMA_DATA).frame_ids, ["1-1", "2-1", "3-1"])
+        self.assertEqual(FrameIndex(FIGMA_DATA, ["2-1", "3-1"]).frame_ids, ["2-1", "3-1"])
+
+    def test_choose_best_frame(self):
+        """Test a case naming a frame's content picks that frame locally"""
+        index = FrameIndex(FIGMA_DATA)
+        self.assertEqual(index.choose(case("the user enters email and password")), "1-1")
+        self.assertEqual(index.choose(case("the user filters search results")), "2-1")
+        self.assertEqual(index.rank(case("the user taps pay now"))[0][0], "3-1")
+
+    def test_choose_ambiguous_or_unknown(self):
+        """Test ambiguous or unmatched cases are left to the LLM"""
+        index = FrameIndex(FIGMA_DATA)
+        self.assertIsNone(index.choose(case("the user checks the price")))
+        self.assertIsNone(index.choose(case("the user opens settings")))
+
+    @patch('google.genai.Client')
+    def test_find_page_id_without_cache_is_one_call(self, mock_client):
+        """Test a single frame selection sends the Figma data inline instead of creating a context cache"""
+        mock_client.return_value.models.generate_content.return_value = MagicMock(text='{"node_id": "1-1"}')
+        # large enough to be worth caching across a run
+        fig_data = {"document": {"id": "0:0", "children": [text(f"5:{n}", f"Label {n}") for n in range(500)]}}
+        frame_list = ["1-1", "2-1", "3-1"]
+        self.assertEqual(find_page_id("test_api_key", case("the user signs in"), fig_data, frame_list), {"node_id": "1-1"})
+
+        mock_client.return_value.caches.create.assert_not_called()
+        mock_client.return_value.models.generate_content.assert_called_once()
+        call = mock_client.return_value.models.generate_content.call_args
+        self.assertEqual(call.kwargs["contents"][0], frame_selection_prefix(fig_data, frame_list))
+
+if __name__ == '__main__':
+    unittest.main()
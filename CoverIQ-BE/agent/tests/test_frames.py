@@ -0,0 +1,55 @@
+import io
+import unittest
+from PIL import Image
+from ..frames import FramePipeline, LatencyLog
+
+class FakeScreenSource:
+    """Returns prepared screenshots in order and counts captures"""
+    def __init__(self, images):
+        self.images = list(images)
+        self.calls = 0
+
+    def __call__(self):
+        image = self.images[min(self.calls, len(self.images) - 1)]
+        self.calls += 1
+        return image
+
+class TestFrames(unittest.TestCase):
+    def test_capture_downscales_and_encodes_once(self):
+        """Test capture keeps the screen size but encodes a downscaled JPEG in memory"""
+        source = FakeScreenSource([Image.new("RGBA", (2560, 1440), (255, 0, 0, 255))])
+        frame = FramePipeline(source, max_width=640).capture()
+
+        self.assertEqual(source.calls, 1)
+        self.assertEqual(frame.screen_size, (2560, 1440))
+        self.assertEqual(frame.image.size, (640, 360))
+        self.assertEqual(frame.mime_type, "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(frame.data)).format, "JPEG")
+        self.assertEqual(frame.as_blob(), {"mime_type": "image/jpeg", "data": frame.data})
+
+    def test_capture_webp(self):
+        """Test WebP encoding sets the matching mime type"""
+        source = FakeScreenSource([Image.new("RGB", (320, 200))])
+        frame = FramePipeline(source, image_format="WEBP").capture()
+        self.assertEqual(frame.mime_type, "image/webp")
+        self.assertEqual(frame.image.size, (320, 200))
+
+    def test_unsupported_format(self):
+        """Test an unknown image format is rejected"""
+        with self.assertRaises(ValueError):
+            FramePipeline(FakeScreenSource([]), image_format="BMP")
+
+    def test_latency_log(self):
+        """Test LatencyLog records steps per iteration"""
+        latency = LatencyLog()
+        with latency.measure("capture"):
+            pass
+        latency.new_iteration()
+        with latency.measure("describe"):
+            pass
+        self.assertEqual(len(latency.iterations), 2)
+        self.assertEqual(list(latency.last()), ["describe"])
+        self.assertTrue(latency.format_last().startswith("iteration 2: total="))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import contextmanager
+from ..runner import run_cases
+from ..sessions import headless_browser_sessions
+
+class FakeSession:
+    def __init__(self, worker):
+        self.worker = worker
+
+@contextmanager
+def fake_worker_sessions():
+    worker = threading.current_thread().name
+
+    @contextmanager
+    def new_session():
+        yield FakeSession(worker)
+
+    yield new_session
+
+def playwright_available() -> bool:
+    try:
+        with headless_browser_sessions():
+            return True
+    except Exception:
+        return False
+
+PAGE = '''<!doctype html>
+<html><body style="margin:0">
+<button id="target" style="position:absolute;left:100px;top:50px;width:200px;height:100px"
+        onclick="document.title='clicked'">Login</button>
+</body></html>'''
+
+class TestRunner(unittest.TestCase):
+    def test_run_cases_in_parallel_and_in_order(self):
+        """Test cases run concurrently on several workers and reports keep input order"""
+        cases = [{"Scenario": str(n)} for n in range(8)]
+
+        def execute(session, case):
+            time.sleep(0.05)
+            return (case["Scenario"], session.worker)
+
+        start = time.perf_counter()
+        reports = run_cases(cases, execute, max_workers=4, worker_sessions=fake_worker_sessions)
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual([report["result"][0] for report in reports], [str(n) for n in range(8)])
+        self.assertGreater(len({report["result"][1] for report in reports}), 1)
+        self.assertLess(elapsed, 8 * 0.05)
+
+    def test_run_cases_reports_errors(self):
+        """Test a failing case is reported without stopping the others"""
+        def execute(session, case):
+            if case["Scenario"] == "bad":
+                raise RuntimeError("boom")
+            return "ok"
+
+        reports = run_cases([{"Scenario": "bad"}, {"Scenario": "good"}], execute, max_workers=2, worker_sessions=fake_worker_sessions)
+        self.assertEqual(reports[0]["error"], "boom")
+        self.assertEqual(reports[1]["result"], "ok")
+
+    @unittest.skipUnless(playwright_available(), "headless Chromium is not available")
+    def test_headless_sessions_against_static_page(self):
+        """Test isolated headless sessions open, screenshot and click a local stand-in page"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "proto.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(PAGE)
+
+            def execute(session, case):
+                session.open("file://" + path)
+                width, height = session.screen_size()
+                self.assertEqual(session.screenshot().size, (width, height))
+                session.click({"x": 200 / width, "y": 100 / height})
+                return session.page.title()
+
+            reports = run_cases([{}, {}, {}], execute, max_workers=2)
+            self.assertEqual([report["result"] for report in reports], ["clicked"] * 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+from PIL import Image, ImageDraw
+from ..waits import WaitLog, wait_until_stable
+
+def screen(offset: int) -> Image.Image:
+    """Horizontal stripes scrolled by offset pixels"""
+    image = Image.new("L", (320, 200), 255)
+    draw = ImageDraw.Draw(image)
+    for top in range(-offset, 200, 40):
+        draw.rectangle([20, top, 300, top + 20], fill=0)
+    return image
+
+class FakeClock:
+    """Advances only when the wait sleeps"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+def frames(*offsets):
+    images = [screen(offset) for offset in offsets]
+    state = {"index": 0}
+
+    def screenshot():
+        image = images[min(state["index"], len(images) - 1)]
+        state["index"] += 1
+        return image
+    return screenshot
+
+class TestWaits(unittest.TestCase):
+    def test_returns_once_stable(self):
+        """Test the wait ends after the required identical samples, not at the timeout"""
+        clock = FakeClock()
+        log = WaitLog()
+        result = wait_until_stable(frames(0, 10, 20, 20, 20, 20), "scroll", timeout=10, stable_samples=3,
+                                   interval=0.1, log=log, clock=clock, sleep=clock.sleep)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.samples, 5)
+        self.assertAlmostEqual(result.seconds, 0.4)
+        self.assertAlmostEqual(log.total("scroll"), 0.4)
+
+    def test_times_out_while_animating(self):
+        """Test a screen that keeps changing stops at the timeout"""
+        clock = FakeClock()
+        shades = [0, 20] * 20
+        result = wait_until_stable(frames(*shades), timeout=1.0, interval=0.1, clock=clock, sleep=clock.sleep)
+        self.assertFalse(result.settled)
+        self.assertGreaterEqual(result.seconds, 1.0)
+
+    def test_wait_for_change(self):
+        """Test an unchanged screen is not taken as a loaded page"""
+        clock = FakeClock()
+        result = wait_until_stable(frames(0, 0, 0, 20, 20, 20), stable_samples=3, interval=0.1,
+                                   wait_for_change=True, clock=clock, sleep=clock.sleep)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.samples, 6)
+
+    def test_delayed_scroll_is_waited_for(self):
+        """Test a smooth scroll that starts rendering late is only settled once it has moved and stopped"""
+        clock = FakeClock()
+        result = wait_until_stable(frames(0, 0, 0, 0, 10, 20, 20, 20), stable_samples=3, interval=0.1,
+                                   clock=clock, sleep=clock.sleep)
+        self.assertEqual(result.samples, 3)
+        clock = FakeClock()
+        result = wait_until_stable(frames(0, 0, 0, 0, 10, 20, 20, 20), stable_samples=3, interval=0.1,
+                                   wait_for_change=True, clock=clock, sleep=clock.sleep)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.samples, 8)
+
+if __name__ == '__main__':
+    unittest.main()
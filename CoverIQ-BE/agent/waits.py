@@ -0,0 +1,75 @@
+import time
+from typing import TYPE_CHECKING, Callable, List, Optional
+from .change_detection import DEFAULT_TOLERANCE, difference_hash, hamming_distance
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# adaptive waits: poll cheap frame hashes until the screen settles instead of sleeping a fixed time
+
+DEFAULT_INTERVAL = 0.1
+DEFAULT_STABLE_SAMPLES = 3
+
+
+class WaitResult:
+    def __init__(self, name: str, seconds: float, samples: int, settled: bool):
+        self.name = name
+        self.seconds = seconds
+        self.samples = samples
+        self.settled = settled
+
+    def __repr__(self) -> str:
+        state = "settled" if self.settled else "timed out"
+        return f"{self.name}: {state} after {self.seconds:.2f}s ({self.samples} samples)"
+
+
+class WaitLog:
+    """How long every wait actually took"""
+
+    def __init__(self):
+        self.waits: List[WaitResult] = []
+
+    def add(self, result: WaitResult) -> None:
+        self.waits.append(result)
+
+    def total(self, name: Optional[str] = None) -> float:
+        return sum(wait.seconds for wait in self.waits if name is None or wait.name == name)
+
+
+def wait_until_stable(screenshot: Callable[[], "Image.Image"], name: str = "wait", timeout: float = 10.0,
+                      stable_samples: int = DEFAULT_STABLE_SAMPLES, interval: float = DEFAULT_INTERVAL,
+                      tolerance: int = DEFAULT_TOLERANCE, wait_for_change: bool = False,
+                      log: Optional[WaitLog] = None, clock: Callable[[], float] = time.monotonic,
+                      sleep: Callable[[float], None] = time.sleep) -> WaitResult:
+    """
+    Return as soon as stable_samples consecutive screenshots hash the same, or at timeout.
+
+    With wait_for_change the screen first has to move away from how it looked when the
+    wait started, so a page that has not begun loading yet is not mistaken for a ready one.
+    """
+    start = clock()
+    samples = 1
+    first = last = difference_hash(screenshot())
+    changed = not wait_for_change
+    stable = 1
+    settled = False
+    while clock() - start < timeout:
+        sleep(interval)
+        current = difference_hash(screenshot())
+        samples += 1
+        if not changed:
+            changed = hamming_distance(first, current) > tolerance
+            last = current
+            continue
+        if hamming_distance(last, current) <= tolerance:
+            stable += 1
+        else:
+            stable = 1
+        last = current
+        if stable >= stable_samples:
+            settled = True
+            break
+    result = WaitResult(name, clock() - start, samples, settled)
+    if log is not None:
+        log.add(result)
+    return result
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Optional
+from pydantic_core import to_json
+
+# cache tier shared by every API replica: Figma documents, feature lists and LLM outputs,
+# stored under content hashes of their inputs in SQLite on a shared volume or in Redis
+
+DEFAULT_MAX_BYTES = 1 << 30
+# values below this are stored uncompressed
+COMPRESS_MIN_SIZE = 512
+COMPRESS_LEVEL = 6
+_RAW = b"r"
+_ZLIB = b"z"
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(namespace: str, *parts: Any) -> str:
+    """
+    Cache key from the JSON form of everything the cached value depends on, bytes parts are
+    JSON already and hashed as they are
+    """
+    body = b",".join(part if isinstance(part, bytes) else to_json(part) for part in parts)
+    return f"{namespace}:{hashlib.sha256(b'[' + body + b']').hexdigest()}"
+
+
+class SQLiteCacheBackend:
+    """Least recently used entries are evicted once the stored values exceed max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        with self._connection() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                       "size INTEGER NOT NULL, expires REAL, accessed REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread, other processes on the same file are serialized by SQLite's
+        # file locks (the default rollback journal, WAL does not work on network volumes)
+        if getattr(self._local, "db", None) is None:
+            self._local.db = sqlite3.connect(self.path, timeout=30)
+        return self._local.db
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._connection() as db:
+            row = db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return None
+            db.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+            return bytes(row[0])
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                       (key, value, len(value), now + ttl if ttl else None, now))
+            db.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for old_key, size in db.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM cache WHERE key = ?", (old_key,))
+                total -= size
+
+    def delete(self, key: str) -> None:
+        with self._connection() as db:
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+class RedisCacheBackend:
+    """
+    Any Redis-protocol server through a redis-py compatible client.
+
+    The server evicts: it has to run with maxmemory set and an allkeys eviction policy
+    (allkeys-lru), otherwise writes fail once it is full and are only reported. Size
+    accounting kept next to the values could not see keys expiring by TTL, and would
+    drift across replicas writing at the same time.
+    """
+
+    def __init__(self, url: Optional[str] = None, client=None, prefix: str = "coveriq:"):
+        if client is None:
+            # optional dependency, only needed when a Redis cache is configured
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self._check_eviction_policy()
+
+    def _check_eviction_policy(self) -> None:
+        try:
+            policy = self.client.config_get("maxmemory-policy").get("maxmemory-policy")
+        except Exception:
+            # managed servers often refuse CONFIG, their policy is set by the provider
+            return
+        if isinstance(policy, bytes):
+            policy = policy.decode()
+        if policy and not policy.startswith("allkeys-"):
+            logger.warning("Redis cache runs with maxmemory-policy %s, entries without a TTL are never evicted. "
+                           "Configure maxmemory and allkeys-lru", policy)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+
+class SharedCache:
+    """
+    Compressed values in a shared backend. The cache is an optimization only: backend
+    errors are reported and treated as misses so requests never fail because of it.
+    """
+
+    def __init__(self, backend, compress_min_size: int = COMPRESS_MIN_SIZE, level: int = COMPRESS_LEVEL):
+        self.backend = backend
+        self.compress_min_size = compress_min_size
+        self.level = level
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            stored = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Shared cache read failed: %s", e)
+            return None
+        if not stored:
+            return None
+        if stored[:1] == _ZLIB:
+            return zlib.decompress(stored[1:])
+        return stored[1:]
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if len(value) >= self.compress_min_size:
+            stored = _ZLIB + zlib.compress(value, self.level)
+        else:
+            stored = _RAW + value
+        try:
+            self.backend.set(key, stored, ttl)
+        except Exception as e:
+            logger.warning("Shared cache write failed: %s", e)
+
+
+def shared_cache_from_env() -> Optional[SharedCache]:
+    """
+    COVERIQ_CACHE_URL selects the backend: sqlite:///path/to/cache.db or redis://host:6379/0.
+    Without it every replica only has its own in-memory storage.
+    """
+    url = os.getenv("COVERIQ_CACHE_URL")
+    if not url:
+        return None
+    max_bytes = int(os.getenv("COVERIQ_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    if url.startswith("sqlite:///"):
+        return SharedCache(SQLiteCacheBackend(url[len("sqlite:///"):], max_bytes))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        # bounded by the server's maxmemory instead, see RedisCacheBackend
+        return SharedCache(RedisCacheBackend(url))
+    raise ValueError(f"Unsupported cache url: {url}")
@@ -0,0 +1,65 @@
+import gzip
+from typing import List, Optional
+
+# content negotiation for the large JSON bodies, brotli is used when the optional package is installed
+
+# small bodies are not worth the CPU
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+IDENTITY = "identity"
+
+
+def brotli_available() -> bool:
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def supported_encodings() -> List[str]:
+    """Encodings we can produce, most preferred first"""
+    return (["br"] if brotli_available() else []) + ["gzip"]
+
+
+def _accepted(accept_encoding: str) -> dict:
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: Optional[str], size: int) -> str:
+    """Content-Encoding for a body of size bytes given the request's Accept-Encoding header"""
+    if not accept_encoding or size < MIN_COMPRESS_SIZE:
+        return IDENTITY
+    accepted = _accepted(accept_encoding)
+    best, best_quality = IDENTITY, 0.0
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # fixed mtime so the same body always compresses to the same bytes
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        import brotli
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return data
@@ -0,0 +1,162 @@
+import io
+import json
+import multiprocessing
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from TestPlanner.feature_representation import filter_component
+from TestPlanner.gherkin_renderer import feature_file_name, render_feature_file, render_test_cases_markdown, render_test_plan_markdown
+
+# CPU-bound work on large documents (feature filtering, markdown and zip exports) runs in worker
+# processes so it neither holds the GIL nor stalls the event loop. Inputs travel as the compact
+# JSON bytes the service already keeps for every stored result instead of pickled object trees.
+
+# JSON inputs below this many bytes are handled inline, a round trip to a worker costs more
+DEFAULT_CPU_THRESHOLD = 1 << 20
+# worker processes, 0 runs everything inline
+DEFAULT_CPU_WORKERS = min(4, os.cpu_count() or 1)
+# forked workers filtering the pages of one large document, 0 sends it to the spawned pool instead.
+# Off by default: forking a threaded server can deadlock, and on the measured machine the forks cost
+# more than they saved (see benchmarks/bench_parallel_traversal.py)
+DEFAULT_SHARD_WORKERS = 0
+
+
+def zip_files(files: Iterable[Tuple[str, str]]) -> bytes:
+    """Deflated zip archive of (file name, text) pairs"""
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for filename, content in files:
+            zip_file.writestr(filename, content)
+    return zip_buffer.getvalue()
+
+
+# the worker entry points take JSON bytes and must stay importable module level functions
+
+def filter_component_json(raw_json: bytes, feature_description: Optional[str] = None) -> Dict[str, Any]:
+    return filter_component(json.loads(raw_json), feature_description)
+
+
+def test_plan_markdown_json(raw_json: bytes) -> str:
+    return render_test_plan_markdown(json.loads(raw_json))
+
+
+def test_cases_markdown_json(raw_json: bytes) -> str:
+    return render_test_cases_markdown(json.loads(raw_json))
+
+
+def feature_files_zip_json(raw_json: bytes) -> bytes:
+    test_cases = json.loads(raw_json)
+    return zip_files((feature_file_name(key), render_feature_file(objective)) for key, objective in test_cases.items())
+
+
+def code_files_zip_json(raw_json: bytes) -> bytes:
+    return zip_files(json.loads(raw_json).items())
+
+
+# map calls in flight -> (function, argument tuples), read by the forked workers of InheritedInputPool
+_inherited: Dict[str, Tuple[Callable[..., Any], List[Tuple[Any, ...]]]] = {}
+
+
+def _call_inherited(token: str, index: int) -> Any:
+    work, arguments = _inherited[token]
+    return work(*arguments[index])
+
+
+def fork_available() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+class InheritedInputPool:
+    """
+    Executor.map over inputs that forked workers inherit from this process instead of receiving
+    them pickled, for read-only work on a document that is already in memory (pages of a Figma
+    file): pickling a subtree costs more than filtering it. Workers are forked per map call.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+
+    def map(self, work: Callable[..., Any], *iterables: Iterable[Any]) -> List[Any]:
+        arguments = list(zip(*iterables))
+        if self.max_workers <= 1 or len(arguments) <= 1:
+            return [work(*args) for args in arguments]
+        token = uuid.uuid4().hex
+        _inherited[token] = (work, arguments)
+        try:
+            # the workers only walk the inherited objects and send back their results, they never
+            # touch locks other server threads could have held at fork time
+            workers = min(self.max_workers, len(arguments))
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+                # a few chunks per worker, files with thousands of frames are not sent one frame at a time
+                return list(pool.map(_call_inherited, [token] * len(arguments), range(len(arguments)),
+                                     chunksize=max(1, len(arguments) // (workers * 4))))
+        finally:
+            del _inherited[token]
+
+
+class CPUExecutor:
+    """Runs work(raw_json, *args) in a process pool once raw_json reaches threshold bytes"""
+
+    def __init__(self, max_workers: int = DEFAULT_CPU_WORKERS, threshold: int = DEFAULT_CPU_THRESHOLD,
+                 shard_workers: int = DEFAULT_SHARD_WORKERS):
+        self.max_workers = max_workers
+        self.threshold = threshold
+        self.shard_workers = shard_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawned workers, forking a server process that already runs threads can deadlock
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def inline(self, raw_json: bytes) -> bool:
+        """Whether work on raw_json stays in the calling thread"""
+        return self.max_workers <= 0 or len(raw_json) < self.threshold
+
+    def shard_executor(self, raw_json: bytes) -> Optional[InheritedInputPool]:
+        """Executor for the shards of a large document already in memory, None unless enabled and forking is possible"""
+        if self.inline(raw_json) or self.shard_workers <= 1 or not fork_available():
+            return None
+        return InheritedInputPool(self.shard_workers)
+
+    def submit(self, work: Callable[..., Any], raw_json: bytes, *args: Any) -> Future:
+        if self.inline(raw_json):
+            future: Future = Future()
+            try:
+                future.set_result(work(raw_json, *args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_pool().submit(work, raw_json, *args)
+
+    def run(self, work: Callable[..., Any], raw_json: bytes, *args: Any) -> Any:
+        """Result of work(raw_json, *args), blocks the calling thread but not the interpreter"""
+        try:
+            return self.submit(work, raw_json, *args).result()
+        except BrokenProcessPool:
+            # a worker died (out of memory, killed), start a fresh pool for the next call
+            self.shutdown(wait=False)
+            return work(raw_json, *args)
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+def cpu_executor_from_env() -> CPUExecutor:
+    """
+    COVERIQ_CPU_WORKERS sets the pool size (0 keeps all work inline), COVERIQ_CPU_THRESHOLD the inline
+    limit in bytes and COVERIQ_CPU_SHARD_WORKERS the forked workers per large document (0 disables them)
+    """
+    return CPUExecutor(int(os.getenv("COVERIQ_CPU_WORKERS", DEFAULT_CPU_WORKERS)),
+                       int(os.getenv("COVERIQ_CPU_THRESHOLD", DEFAULT_CPU_THRESHOLD)),
+                       int(os.getenv("COVERIQ_CPU_SHARD_WORKERS", DEFAULT_SHARD_WORKERS)))
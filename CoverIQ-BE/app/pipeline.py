@@ -0,0 +1,146 @@
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from TestPlanner.bdd_style_test_case_generator import generate_objective_test_case, objective_key, test_case_prompt_cache
+from TestPlanner.test_code_generator import generate_feature_code, feature_code_key, code_prompt_cache, code_file_name
+from TestPlanner.checkpoints import Checkpoints, checkpointed
+from TestPlanner.gherkin_renderer import iter_objective_feature_texts
+from TestPlanner.scenario_dedup import scenario_key
+from TestPlanner.usage import BudgetExceeded
+from TestPlanner.deadlines import DeadlineExceeded
+
+# test cases, feature texts and test code generated with overlapping stages: every objective
+# of the plan goes to the model as soon as it exists and every scenario goes on to code generation
+# as soon as its objective is done, so wall time follows the slowest chain instead of the sum of stages
+
+# concurrent model calls
+DEFAULT_PIPELINE_WORKERS = 8
+
+
+def _submit_all(objectives: Iterable[Dict[str, Any]], submit, pending: "queue.Queue", test_plan: List[Dict[str, Any]],
+                stop: threading.Event) -> None:
+    # objectives may be a model stream, each one is handed to the pool the moment it arrives
+    try:
+        for objective in objectives:
+            if stop.is_set():
+                # a model stream closes its response instead of reading the rest of the plan
+                close = getattr(objectives, "close", None)
+                if close is not None:
+                    close()
+                break
+            test_plan.append(objective)
+            pending.put(submit(objective))
+    except Exception as e:
+        pending.put(e)
+    finally:
+        pending.put(None)
+
+
+def _in_context(submit):
+    # every task runs in a copy of the submitting thread's context, so model calls are charged to its usage meter
+    return lambda work, *args: submit(contextvars.copy_context().run, work, *args)
+
+
+def stream_cases_and_code(objectives: Iterable[Dict[str, Any]], api_key: str, max_workers: int = DEFAULT_PIPELINE_WORKERS,
+                          dedup: bool = True, skip_code_over_budget: bool = False,
+                          checkpoints: Optional[Checkpoints] = None, errors: Optional[Dict[str, str]] = None
+                          ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, str], Dict[str, str]]:
+    """
+    (test_plan, test_cases, feature_text, test_code) for test plan objectives that may still be
+    arriving, shaped exactly like the results of generate_test_plan, generate_test_case,
+    generate_feature_text and generate_E2E_code. With dedup, scenarios with the same
+    scenario_key share one code generation call, as they do in generate_E2E_code. With
+    skip_code_over_budget, files whose code generation was refused by the token budget are
+    left out instead of failing the run.
+    With checkpoints, test cases and code of an earlier run with the same inputs are reused
+    and every new one is stored as soon as it is done. With errors, a failed objective or code
+    file is left out and its error recorded there under its feature or file name, as
+    generate_test_case and generate_E2E_code do.
+    """
+    from google import genai
+    client = genai.Client(api_key=api_key)
+    test_plan: List[Dict[str, Any]] = []
+    test_cases: Dict[str, Any] = {}
+    feature_text: Dict[str, str] = {}
+    code_futures: Dict[str, Future] = {}
+    by_scenario: Dict[str, Future] = {}
+    pending: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+
+    # the executor is shut down before the prompt caches are deleted
+    with test_case_prompt_cache(client) as case_cache, code_prompt_cache(client) as code_cache, \
+            ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        submit = _in_context(executor.submit)
+        # a daemon, so a failed run does not have to wait for the plan stream it is blocked in
+        producer = threading.Thread(target=contextvars.copy_context().run, name="pipeline-objectives", args=(
+            _submit_all, objectives, lambda objective: submit(
+                checkpointed, checkpoints, objective_key(objective), generate_objective_test_case, case_cache, objective),
+            pending, test_plan, stop), daemon=True)
+        producer.start()
+        try:
+            number = 1
+            count = 0
+            while True:
+                future = pending.get()
+                if future is None:
+                    break
+                if isinstance(future, Exception):
+                    raise future
+                # feature numbers run across objectives, so texts are released in objective order
+                # while the later objectives keep generating
+                count += 1
+                feature = "Feature " + str(count)
+                try:
+                    test_case = future.result()
+                except (BudgetExceeded, DeadlineExceeded):
+                    raise
+                except Exception as e:
+                    if errors is None:
+                        raise
+                    errors[feature] = str(e)
+                    continue
+                test_cases[feature] = test_case
+                for name, text in iter_objective_feature_texts(test_case, number):
+                    feature_text[name] = text
+                    key = scenario_key(text) if dedup else name
+                    if key not in by_scenario:
+                        by_scenario[key] = submit(checkpointed, checkpoints, feature_code_key(text),
+                                                  generate_feature_code, code_cache, text)
+                    code_futures[name] = by_scenario[key]
+                number += len(test_case['bdd_style_descriptions'])
+
+            test_code = {}
+            for n, name in enumerate(feature_text, 1):
+                try:
+                    test_code[code_file_name(n)] = code_futures[name].result()
+                except BudgetExceeded:
+                    if not skip_code_over_budget:
+                        raise
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    if errors is None:
+                        raise
+                    errors[code_file_name(n)] = str(e)
+        except BaseException:
+            # nothing new is submitted and queued calls are dropped, what is already running finishes
+            # with the executor. The producer stops at the next objective of the plan stream, which is
+            # not waited for
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        # the producer has handed over every objective
+        producer.join()
+    return {"test_plan": test_plan}, test_cases, feature_text, test_code
+
+
+def generate_cases_and_code(test_plan: Dict[str, Any], api_key: str, max_workers: int = DEFAULT_PIPELINE_WORKERS,
+                            dedup: bool = True, skip_code_over_budget: bool = False,
+                            checkpoints: Optional[Checkpoints] = None, errors: Optional[Dict[str, str]] = None
+                            ) -> Tuple[Dict[str, Any], Dict[str, str], Dict[str, str]]:
+    """(test_cases, feature_text, test_code) for a complete test plan"""
+    _, test_cases, feature_text, test_code = stream_cases_and_code(test_plan['test_plan'], api_key, max_workers, dedup,
+                                                                   skip_code_over_budget, checkpoints, errors)
+    return test_cases, feature_text, test_code
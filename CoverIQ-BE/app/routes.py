@@ -1,84 +1,271 @@
-from fastapi import APIRouter, HTTPException, Response,UploadFile,File
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Header, Response,UploadFile,File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from pydantic_core import to_json
 from typing import Dict, Any, Optional,List
-from .services import feature2_service, update_env_file, document_generator
+from typing_extensions import TypedDict
+from .services import feature2_service, update_env_file
+from .compression import IDENTITY, negotiate_encoding
+from .pipeline import DEFAULT_PIPELINE_WORKERS
+from TestPlanner.usage import BudgetExceeded
+from TestPlanner.deadlines import DeadlineExceeded, deadline_after
+from TestPlanner.checkpoints import IncompleteResult
+from TestPlanner.model_router import default_router
+from TestPlanner.llm_test_plan_generator import TestPlan
+from TestPlanner.bdd_style_test_case_generator import TestCases
 import os
+import uuid
 
 router = APIRouter()
 
+# seconds a request may spend waiting for the model when it sends no X-Request-Timeout, unlimited when unset
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("COVERIQ_REQUEST_TIMEOUT")) if os.getenv("COVERIQ_REQUEST_TIMEOUT") else None
+# most concurrent model calls a /pipeline request may ask for
+MAX_PIPELINE_WORKERS = int(os.getenv("COVERIQ_PIPELINE_MAX_WORKERS", 16))
+
+class IncompleteTestCases(TypedDict):
+    test_cases : TestCases
+    errors : Dict[str, str]
+
+class IncompleteTestCode(TypedDict):
+    test_code : Dict[str, str]
+    errors : Dict[str, str]
+
+# documented body of the 207 returned when some items of a stage failed, see incomplete_response
+INCOMPLETE_DESCRIPTION = "Some items failed: the finished items and an error per failed one"
+
+def request_deadline(timeout: Optional[float]) -> Optional[float]:
+    # counted from the arrival of the request, every model call it makes has to be answered by then
+    return deadline_after(timeout if timeout is not None else DEFAULT_REQUEST_TIMEOUT)
+
+def stored_json_response(key: str, accept_encoding: Optional[str], run_id: Optional[str] = None) -> Response:
+    # serialized by pydantic-core and compressed once per stored result, skips FastAPI's response model validation and encoding
+    encoding = negotiate_encoding(accept_encoding, len(feature2_service.get_json(key)))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding != IDENTITY:
+        headers["Content-Encoding"] = encoding
+    # later stages can pass this id back instead of the whole body
+    headers["X-Artifact-Id"] = feature2_service.artifact_id(key)
+    if run_id is not None:
+        # later stages can send it back as run_id to be accounted as one run
+        headers["X-Run-Id"] = run_id
+    return Response(content=feature2_service.get_json(key, encoding), media_type="application/json", headers=headers)
+
+def incomplete_response(key: str, error: IncompleteResult, run_id: str) -> Response:
+    # the finished items and an error per failed one, nothing is stored as the stage result.
+    # Submitting the same input again only generates the failed items
+    return Response(content=to_json({key: error.result, "errors": error.errors}), status_code=207,
+                    media_type="application/json", headers={"X-Run-Id": run_id})
+
+def resolve_input(inline: Optional[Dict[str, Any]], ref: Optional[str], key: str) -> Dict[str, Any]:
+    # the inline body wins, otherwise the reference is looked up in server-side storage
+    if inline is not None:
+        return inline
+    if ref is None:
+        raise HTTPException(status_code=422, detail=f"Either the {key} body or a reference to it is required")
+    try:
+        return feature2_service.resolve_artifact(ref, key)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 class FigmaURLRequest(BaseModel):
     figma_url: str
     figma_token: str
+    # how many levels below the file, or below each node-id of the url, to fetch
+    depth: Optional[int] = None
 
+# every stage input can be sent inline or as *_ref, an artifact id or data type name of a stored result
 class FeatureDescriptionRequest(BaseModel):
-    figma_data: Dict[str, Any]
+    figma_data: Optional[Dict[str, Any]] = None
+    figma_data_ref: Optional[str] = None
     feature_description: Optional[str] = None
 
+# run_id groups stage calls into one run for usage accounting and the run budget, new run when missing
 class TestPlanRequest(BaseModel):
-    feature_list: Dict[str, Any]
+    feature_list: Optional[Dict[str, Any]] = None
+    feature_list_ref: Optional[str] = None
     gemini_key: str
+    run_id: Optional[str] = None
 
 class TestCasesRequest(BaseModel):
-    test_plan: Dict[str, Any]
+    test_plan: Optional[Dict[str, Any]] = None
+    test_plan_ref: Optional[str] = None
     gemini_key: str
+    run_id: Optional[str] = None
 
 class EnvUpdateRequest(BaseModel):
     figma_token: str
     gemini_key: str
 
 class TestCodeRequest(BaseModel):
-    feature_text: Dict[str, Any]
+    feature_text: Optional[Dict[str, Any]] = None
+    feature_text_ref: Optional[str] = None
+    gemini_key: str
+    run_id: Optional[str] = None
+
+class PipelineRequest(BaseModel):
+    figma_url: str
+    figma_token: str
+    gemini_key: str
+    feature_description: Optional[str] = None
+    depth: Optional[int] = None
+    max_workers: int = Field(default=min(DEFAULT_PIPELINE_WORKERS, MAX_PIPELINE_WORKERS), ge=1, le=MAX_PIPELINE_WORKERS)
+    stream_plan: bool = True
+    run_id: Optional[str] = None
+
+class UsageRequest(BaseModel):
     gemini_key: str
 
 class FeatureTextRequest(BaseModel):
-    test_case: Dict[str,Any]
+    test_case: Optional[Dict[str,Any]] = None
+    test_case_ref: Optional[str] = None
     
 
-@router.post("/parse-figma")
-async def parse_figma_url(request: FigmaURLRequest) -> Dict[str, Any]:
+@router.post("/parse-figma", response_model=None, responses={200: {"model": Dict[str, Any]}})
+async def parse_figma_url(request: FigmaURLRequest, accept_encoding: Optional[str] = Header(default=None)) -> Response:
     try:
-        return feature2_service.parse_figma_url_and_get_data(request.figma_url, request.figma_token)
+        feature2_service.parse_figma_url_and_get_data(request.figma_url, request.figma_token, request.depth)
+        return stored_json_response('figma_data', accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/get-feature-representation")
-async def get_feature_representation(request: FeatureDescriptionRequest) -> Dict[str, Any]:
+@router.post("/get-feature-representation", response_model=None, responses={200: {"model": Dict[str, Any]}})
+async def get_feature_representation(request: FeatureDescriptionRequest, accept_encoding: Optional[str] = Header(default=None)) -> Response:
+    figma_data = resolve_input(request.figma_data, request.figma_data_ref, 'figma_data')
     try:
-        return feature2_service.get_feature_representation(
-            request.figma_data,
+        # filtering a large document happens in a worker process, wait for it off the event loop
+        await run_in_threadpool(
+            feature2_service.get_feature_representation,
+            figma_data,
             request.feature_description
         )
+        return stored_json_response('feature_list', accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/generate-test-plan")
-async def generate_test_plan(request: TestPlanRequest) -> Dict[str, Any]:
+@router.post("/generate-test-plan", response_model=None, responses={200: {"model": TestPlan}})
+async def generate_test_plan(request: TestPlanRequest, accept_encoding: Optional[str] = Header(default=None),
+                             x_request_timeout: Optional[float] = Header(default=None)) -> Response:
+    feature_list = resolve_input(request.feature_list, request.feature_list_ref, 'feature_list')
+    run_id = request.run_id or uuid.uuid4().hex
+    deadline = request_deadline(x_request_timeout)
     try:
-        return feature2_service.generate_test_plan_from_feature(request.feature_list, request.gemini_key)
+        feature2_service.generate_test_plan_from_feature(feature_list, request.gemini_key, run_id, deadline)
+        return stored_json_response('test_plan', accept_encoding, run_id)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/generate-test-cases")
-async def generate_test_cases(request: TestCasesRequest) -> Dict[str, Any]:
+@router.post("/generate-test-plan/stream")
+async def stream_test_plan(request: TestPlanRequest, x_request_timeout: Optional[float] = Header(default=None)):
+    """One JSON test plan objective per line, sent as soon as the model has written it"""
+    feature_list = resolve_input(request.feature_list, request.feature_list_ref, 'feature_list')
+    run_id = request.run_id or uuid.uuid4().hex
+    deadline = request_deadline(x_request_timeout)
+
+    def lines():
+        try:
+            for objective in feature2_service.stream_test_plan_from_feature(feature_list, request.gemini_key, run_id, deadline):
+                yield to_json(objective) + b"\n"
+        except Exception as e:
+            # the status line is already sent, the error becomes the last line
+            yield to_json({"error": str(e)}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Run-Id": run_id})
+
+@router.post("/generate-test-cases", response_model=None, responses={
+    200: {"model": TestCases}, 207: {"model": IncompleteTestCases, "description": INCOMPLETE_DESCRIPTION}})
+async def generate_test_cases(request: TestCasesRequest, accept_encoding: Optional[str] = Header(default=None),
+                              x_request_timeout: Optional[float] = Header(default=None)) -> Response:
+    test_plan = resolve_input(request.test_plan, request.test_plan_ref, 'test_plan')
+    run_id = request.run_id or uuid.uuid4().hex
+    deadline = request_deadline(x_request_timeout)
     try:
-        return feature2_service.generate_test_cases_from_plan(request.test_plan, request.gemini_key)
+        feature2_service.generate_test_cases_from_plan(test_plan, request.gemini_key, run_id, deadline)
+        return stored_json_response('test_cases', accept_encoding, run_id)
+    except IncompleteResult as e:
+        return incomplete_response('test_cases', e, run_id)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/generate-feature-text")
-async def generate_feature_text(request: FeatureTextRequest) -> Dict[str,Any]:
+@router.post("/generate-feature-text", response_model=None, responses={200: {"model": Dict[str, str]}})
+async def generate_feature_text(request: FeatureTextRequest, accept_encoding: Optional[str] = Header(default=None)) -> Response:
+    test_case = resolve_input(request.test_case, request.test_case_ref, 'test_cases')
     try:
-        return feature2_service.generate_feature_from_case(request.test_case)
+        feature2_service.generate_feature_from_case(test_case)
+        return stored_json_response('feature_text', accept_encoding)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/generate-test-code")
-async def generate_test_code(request: TestCodeRequest) -> Dict[str,Any]:
+@router.post("/generate-test-code", response_model=None, responses={
+    200: {"model": Dict[str, str]}, 207: {"model": IncompleteTestCode, "description": INCOMPLETE_DESCRIPTION}})
+async def generate_test_code(request: TestCodeRequest, accept_encoding: Optional[str] = Header(default=None),
+                             x_request_timeout: Optional[float] = Header(default=None)) -> Response:
+    feature_text = resolve_input(request.feature_text, request.feature_text_ref, 'feature_text')
+    run_id = request.run_id or uuid.uuid4().hex
+    deadline = request_deadline(x_request_timeout)
     try:
-        return feature2_service.generate_test_code_from_feature(request.feature_text, request.gemini_key)
+        feature2_service.generate_test_code_from_feature(feature_text, request.gemini_key, run_id, deadline)
+        return stored_json_response('test_code', accept_encoding, run_id)
+    except IncompleteResult as e:
+        return incomplete_response('test_code', e, run_id)
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/pipeline", response_model=None, responses={
+    200: {"model": Dict[str, Any]}, 207: {"model": Dict[str, Any], "description": INCOMPLETE_DESCRIPTION + ", under errors"}})
+async def run_pipeline(request: PipelineRequest, x_request_timeout: Optional[float] = Header(default=None)) -> Response:
+    """Figma URL to test code in one call, the figma and feature data stay on the server (see artifacts)"""
+    deadline = request_deadline(x_request_timeout)
+    try:
+        # the model calls block, keep them off the event loop
+        result = await run_in_threadpool(
+            feature2_service.run_pipeline, request.figma_url, request.figma_token, request.gemini_key,
+            request.feature_description, request.depth, request.max_workers, request.stream_plan, request.run_id,
+            deadline
+        )
+        # failed objectives or code files make it a partial result, like the stage routes
+        return Response(content=to_json(result), status_code=207 if result["errors"] else 200,
+                        media_type="application/json", headers={"X-Run-Id": result["run_id"]})
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/usage")
+async def get_key_usage(request: UsageRequest) -> Dict[str, Any]:
+    """Tokens used with a Gemini key per stage and model, its budget and its recent runs"""
+    return feature2_service.usage.key_usage(request.gemini_key)
+
+@router.get("/usage/runs/{run_id}")
+async def get_run_usage(run_id: str) -> Dict[str, Any]:
+    """Tokens used by one run per stage and its budget"""
+    try:
+        return feature2_service.usage.run_usage(run_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/routing")
+async def get_routing(limit: int = 100) -> Dict[str, Any]:
+    """Model routes per stage with their latency percentiles, and the latest routing decisions"""
+    return {"stages": default_router.stats(), "decisions": default_router.decisions(limit)}
+
 @router.post("/update-env")
 async def update_env(request: EnvUpdateRequest) -> Dict[str, str]:
     try:
@@ -90,11 +277,12 @@ async def update_env(request: EnvUpdateRequest) -> Dict[str, str]:
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/data/{data_type}")
-async def get_saved_data(data_type: str) -> Dict[str, Any]:
+@router.get("/data/{data_type}", response_model=None, responses={200: {"model": Dict[str, Any]}})
+async def get_saved_data(data_type: str, accept_encoding: Optional[str] = Header(default=None)) -> Response:
     """Get saved data by type (figma, feature, plan, cases, code, cucumber)"""
     try:
-        return feature2_service.get_saved_data(data_type)
+        feature2_service.get_saved_data(data_type)
+        return stored_json_response(feature2_service.DATA_TYPES[data_type], accept_encoding)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
@@ -105,8 +293,7 @@ async def get_saved_data(data_type: str) -> Dict[str, Any]:
 @router.get("/data/plan/markdown")
 async def get_test_plan_markdown():
     try:
-        test_plan = feature2_service.get_saved_data('plan')
-        markdown = document_generator.generate_test_plan_markdown(test_plan)
+        markdown = await run_in_threadpool(feature2_service.export, 'plan_markdown')
         
         return Response(
             content=markdown,
@@ -121,8 +308,7 @@ async def get_test_plan_markdown():
 @router.get("/data/cases/markdown")
 async def get_test_cases_markdown():
     try:
-        test_cases = feature2_service.get_saved_data('cases')
-        markdown = document_generator.generate_test_cases_markdown(test_cases)
+        markdown = await run_in_threadpool(feature2_service.export, 'cases_markdown')
         
         return Response(
             content=markdown,
@@ -137,8 +323,7 @@ async def get_test_cases_markdown():
 @router.get("/data/cases/feature")
 async def get_test_cases_feature():
     try:
-        test_cases = feature2_service.get_saved_data('cases')
-        zip_bytes = document_generator.generate_feature_files(test_cases)
+        zip_bytes = await run_in_threadpool(feature2_service.export, 'feature_zip')
         
         return Response(
             content=zip_bytes,
@@ -175,8 +360,7 @@ async def upload_feature_files(files: List[UploadFile] = File(...)) -> Dict[str,
 @router.get("/data/code/py")    
 async def get_test_code():
     try:
-        test_code = feature2_service.get_saved_data('code')
-        zip_bytes = document_generator.generate_code_files(test_code)
+        zip_bytes = await run_in_threadpool(feature2_service.export, 'code_zip')
         
         return Response(
             content=zip_bytes,
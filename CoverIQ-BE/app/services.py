@@ -1,101 +1,112 @@
 import os
-import io
-import zipfile
-from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-from TestPlanner.figma_frame_parser import parse_figma_url, get_figma_file_data
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from TestPlanner.figma_frame_parser import parse_figma_url, parse_figma_node_ids, get_figma_file_response, get_figma_nodes_data
 from TestPlanner.feature_representation import filter_component
-from TestPlanner.llm_test_plan_generator import generate_test_plan
-from TestPlanner.bdd_style_test_case_generator import generate_test_case
-from TestPlanner.test_code_generator import generate_E2E_code,generate_feature_text
+from TestPlanner.llm_test_plan_generator import generate_test_plan, generate_test_plan_stream, test_plan_adapter
+from TestPlanner.bdd_style_test_case_generator import generate_test_case, test_cases_adapter
+from TestPlanner.test_code_generator import generate_E2E_code,generate_feature_text, files_adapter, code_file_name, DEFAULT_MAX_BATCH_TOKENS
+from TestPlanner.usage import BudgetExceeded, metering
+from TestPlanner.deadlines import DeadlineExceeded, within
+from TestPlanner.checkpoints import Checkpoints, IncompleteResult, item_key
+from TestPlanner.model_router import default_router
+from TestPlanner.gherkin_renderer import feature_file_name, render_feature_file, render_test_cases_markdown, render_test_plan_markdown
+from .compression import IDENTITY, compress
+from .cache import SharedCache, content_key, shared_cache_from_env
+from .usage import DEGRADE, UsageLedger, usage_ledger_from_env
+from .pipeline import DEFAULT_PIPELINE_WORKERS, generate_cases_and_code, stream_cases_and_code
+from .cpu_pool import (CPUExecutor, cpu_executor_from_env, zip_files, filter_component_json, test_plan_markdown_json,
+                       test_cases_markdown_json, feature_files_zip_json, code_files_zip_json)
+
+# seconds a fetched Figma document is shared between replicas before it is fetched again
+FIGMA_CACHE_TTL = 600
+
+def _complete(generate, *args, **kwargs) -> Dict[str, Any]:
+    # the whole result, or IncompleteResult with the finished items when some of them failed.
+    # Raising keeps a partial result out of the shared cache, its items are in the checkpoints
+    errors: Dict[str, str] = {}
+    result = generate(*args, errors=errors, **kwargs)
+    if errors:
+        raise IncompleteResult(result, errors)
+    return result
+
+def _model(stage: str) -> str:
+    # shared results are keyed by the primary model of the stage, a changed route starts afresh
+    return default_router.route(stage).model
 
 class DocumentGenerator:
     @staticmethod
     def generate_test_plan_markdown(test_plan: Dict[str, Any]) -> str:
         """Generate markdown content for test plan"""
-        markdown = "# Test Plan\n\n"
-        
-        for index, test_case in enumerate(test_plan['test_plan'], 1):
-            markdown += f"## Objective {index}\n\n"
-            markdown += f"### Overview\n{test_case['Objective']}\n\n"
-            markdown += f"### Scope\n{test_case['Scope']}\n\n"
-            markdown += "### Test Items\n\n"
-            markdown += f"#### Types of Testing\n{test_case['Test_Items']['Types_of_Testing']}\n\n"
-            markdown += f"#### Test Approach\n{test_case['Test_Items']['Test_Approach']}\n\n"
-            markdown += "#### Acceptance Criteria\n\n"
-            for idx, criteria in enumerate(test_case['Test_Items']['Acceptance_Criteria'], 1):
-                markdown += f"{idx}. {criteria}\n"
-            markdown += "\n---\n\n"
-            markdown += f'> Generated by CoverIQ Test Planner\n\n'
-        
-        return markdown
+        return render_test_plan_markdown(test_plan)
 
     @staticmethod
     def generate_test_cases_markdown(test_cases: Dict[str, Any]) -> str:
         """Generate markdown content for test cases"""
-        markdown = "# Test Cases\n\n"
-        
-        for objective_key, objective in test_cases.items():
-            markdown += f"## {objective_key}\n\n"
-            markdown += f"### Feature\n{objective['feature']}\n\n"
-            
-            for idx, description in enumerate(objective['bdd_style_descriptions'], 1):
-                markdown += f"### Scenario {idx}\n\n"
-                markdown += f"**Scenario:** {description['Scenario']}\n\n"
-                markdown += "```gherkin\n"
-                markdown += f"Given {description['Given']}\n"
-                markdown += f"And {description['And']}\n"
-                markdown += f"When {description['When']}\n"
-                markdown += f"Then {description['Then']}\n"
-                markdown += "```\n\n"
-                markdown += "---\n\n"
-            markdown += f'> Generated by CoverIQ Test Planner\n\n'
-        
-        return markdown
+        return render_test_cases_markdown(test_cases)
 
     @staticmethod
     def generate_feature_files(test_cases: Dict[str, Any]) :
         """Generate feature files and return as zip bytes"""
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            feature_count = 1
-            for objective_key, objective in test_cases.items():
-                # Create feature file content
-                feature_content = f"Feature: "
-                feature_content += f" {feature_count}. {objective['feature']}\n\n"
-                
-                # Add scenarios
-                for idx, description in enumerate(objective['bdd_style_descriptions'], 1):
-                    feature_content += f"  Scenario: {idx}. {description['Scenario']}\n"
-                    feature_content += f"    Given {description['Given']}\n"
-                    feature_content += f"    And {description['And']}\n"
-                    feature_content += f"    When {description['When']}\n"
-                    feature_content += f"    Then {description['Then']}\n\n"
-                feature_content += f"# Generated by CoverIQ Test Planner\n"
-                
-                # Add to zip file
-                feature_filename = f"{objective_key.lower().replace(' ', '_')}.feature"
-                zip_file.writestr(feature_filename, feature_content)
-
-        zip_buffer.seek(0)
-        return zip_buffer.getvalue()
+        return zip_files((feature_file_name(objective_key), render_feature_file(objective))
+                         for objective_key, objective in test_cases.items())
     
     @staticmethod
     def generate_code_files(test_code: Dict[str, Any]) :
         """Generate code files and return as zip bytes"""
-        zip_buffer = io.BytesIO()
-
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for filename, content in test_code.items():
-                zip_file.writestr(filename, content)
-        zip_buffer.seek(0)
-        return zip_buffer.getvalue()
+        return zip_files(test_code.items())
     
     
 
 class Feature2Service:
-    def __init__(self):
+    # public data type -> storage key
+    DATA_TYPES = {
+        'figma': 'figma_data',
+        'feature': 'feature_list',
+        'plan': 'test_plan',
+        'cases': 'test_cases',
+        'cucumber':'feature_text',
+        'code' : 'test_code'
+    }
+    # pydantic-core serializers per storage key, stored results are written to JSON bytes in one pass
+    JSON_ADAPTERS = {
+        'figma_data': TypeAdapter(Dict[str, Any]),
+        'feature_list': TypeAdapter(Dict[str, Any]),
+        'test_plan': test_plan_adapter,
+        'test_cases': test_cases_adapter,
+        'test_code': files_adapter,
+        'feature_text': files_adapter
+    }
+    # export name -> (storage key, worker entry point taking the stored JSON bytes)
+    EXPORTS = {
+        'plan_markdown': ('test_plan', test_plan_markdown_json),
+        'cases_markdown': ('test_cases', test_cases_markdown_json),
+        'feature_zip': ('test_cases', feature_files_zip_json),
+        'code_zip': ('test_code', code_files_zip_json)
+    }
+
+    def __init__(self, cache: Optional[SharedCache] = None, cpu: Optional[CPUExecutor] = None,
+                 usage: Optional[UsageLedger] = None, checkpoints: Optional[Checkpoints] = None,
+                 code_batch_size: int = 1, code_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS):
+        # shared with the other replicas, content addressed so any of them can reuse a result
+        self.cache = cache
+        # test case and code of every finished objective and feature file, kept with the other
+        # replicas when there is a shared cache so a failed run resumes wherever it is submitted again
+        self.checkpoints = checkpoints if checkpoints is not None else Checkpoints(cache)
+        # filtering and exports of large documents, everything runs inline without a pool
+        self.cpu = cpu if cpu is not None else CPUExecutor(max_workers=0)
+        # tokens per API key, run and stage, without budgets unless configured
+        self.usage = usage if usage is not None else UsageLedger()
+        # feature files per code generation call of /generate-test-code, 1 sends each file on its own
+        self.code_batch_size = code_batch_size
+        self.code_batch_tokens = code_batch_tokens
         # In-memory storage
         self._storage = {
             'figma_data': None,
@@ -105,10 +116,21 @@ class Feature2Service:
             'test_code' :None,
             'feature_text': None
         }
+        # serialized and compressed copies of the stored data, dropped whenever the data is replaced
+        self._json: Dict[str, bytes] = {}
+        self._encoded: Dict[Tuple[str, str], bytes] = {}
+        # storage key -> id of the artifact currently stored under it
+        self._artifact_ids: Dict[str, str] = {}
 
-    def _save_to_memory(self, data: Dict[str, Any], key: str) -> None:
-        """Save data to in-memory storage"""
+    def _save_to_memory(self, data: Dict[str, Any], key: str, raw_json: Optional[bytes] = None) -> None:
+        """Save data to in-memory storage, raw_json is its JSON form when that is already known"""
         self._storage[key] = data
+        self._artifact_ids[key] = uuid.uuid4().hex
+        self._json.pop(key, None)
+        for encoded_key in [k for k in self._encoded if k[0] == key]:
+            del self._encoded[encoded_key]
+        if raw_json is not None:
+            self._json[key] = raw_json
 
     def _read_from_memory(self, key: str) -> Dict[str, Any]:
         """Read data from in-memory storage"""
@@ -118,16 +140,108 @@ class Feature2Service:
             raise FileNotFoundError(f"No data found for: {key}")
         return self._storage[key]
 
-    def parse_figma_url_and_get_data(self, figma_url: str, figma_token: str) -> Dict[str, Any]:
-        """Parse Figma URL and get file data"""
+    def artifact_id(self, key: str) -> str:
+        """Id of the data currently stored under key"""
+        self._read_from_memory(key)
+        return self._artifact_ids[key]
+
+    def resolve_artifact(self, ref: str, key: str) -> Dict[str, Any]:
+        """
+        Stored data for a reference sent instead of an inline body: either an artifact id
+        returned by an earlier stage, or a data type name for the latest result of that type.
+        """
+        if self.DATA_TYPES.get(ref) == key or ref == key:
+            return self._read_from_memory(key)
+        if self._artifact_ids.get(key) == ref:
+            return self._storage[key]
+        if ref in self._artifact_ids.values() or ref in self.DATA_TYPES:
+            raise ValueError(f"Artifact {ref} is not {key}")
+        # only the latest artifact of every type is kept
+        raise FileNotFoundError(f"No artifact found for: {ref}")
+
+    def to_json(self, data: Any, key: str) -> bytes:
+        """Serialize data stored under key to JSON bytes without validating it again"""
+        return self.JSON_ADAPTERS[key].dump_json(data, warnings=False)
+
+    def get_json(self, key: str, encoding: str = IDENTITY) -> bytes:
+        """Stored data as JSON bytes in the given content encoding, serialized and compressed once"""
+        data = self._read_from_memory(key)
+        if key not in self._json:
+            self._json[key] = self.to_json(data, key)
+        if encoding == IDENTITY:
+            return self._json[key]
+        if (key, encoding) not in self._encoded:
+            self._encoded[(key, encoding)] = compress(self._json[key], encoding)
+        return self._encoded[(key, encoding)]
+
+    def _stored_json(self, data: Any, key: str) -> bytes:
+        """JSON bytes of data, free when data is the result stored under key"""
+        if data is not None and data is self._storage.get(key):
+            return self.get_json(key)
+        return to_json(data)
+
+    def export(self, name: str) -> Any:
+        """Markdown text or zip bytes of a stored result, rendered in a worker process when it is large"""
+        key, work = self.EXPORTS[name]
+        return self.cpu.run(work, self.get_json(key))
+
+    def _cache_lookup(self, cache_key: Optional[str], key: str) -> Optional[Tuple[Any, bytes]]:
+        raw_json = self.cache.get(cache_key) if self.cache is not None else None
+        if raw_json is None:
+            return None
+        return self.JSON_ADAPTERS[key].validate_json(raw_json), raw_json
+
+    def _cache_store(self, cache_key: Optional[str], key: str, result: Any, ttl: Optional[float] = None) -> Optional[bytes]:
+        if self.cache is None:
+            return None
+        raw_json = self.to_json(result, key)
+        self.cache.set(cache_key, raw_json, ttl)
+        return raw_json
+
+    def _content_key(self, namespace: str, data: Any, key: str, *parts: Any) -> Optional[str]:
+        """
+        Cache key of a result computed from data and parts, None without a cache. When data is the
+        result stored under key, its stored JSON bytes are hashed instead of serializing it again.
+        """
+        if self.cache is None:
+            return None
+        raw_json = self._json.get(key) if data is not None and data is self._storage.get(key) else None
+        return content_key(namespace, *parts, raw_json if raw_json is not None else data)
+
+    def _shared(self, cache_key: Optional[str], key: str, compute, ttl: Optional[float] = None) -> Tuple[Any, Optional[bytes]]:
+        """compute() unless another replica already stored the result, also returns its JSON bytes when known"""
+        cached = self._cache_lookup(cache_key, key)
+        if cached is not None:
+            return cached
+        result = compute()
+        return result, self._cache_store(cache_key, key, result, ttl)
+
+    def parse_figma_url_and_get_data(self, figma_url: str, figma_token: str, depth: Optional[int] = None) -> Dict[str, Any]:
+        """Parse Figma URL and get file data, only the selected nodes when the URL has a node-id"""
         try:
             file_key = parse_figma_url(figma_url)
-            figma_data = get_figma_file_data(file_key, figma_token)
-            result = {
-                "file_key": file_key,
-                "figma_data": figma_data
-            }
-            self._save_to_memory(result, 'figma_data')
+            node_ids = parse_figma_node_ids(figma_url)
+
+            def fetch() -> Tuple[Dict[str, Any], Optional[bytes]]:
+                if node_ids:
+                    figma_data = get_figma_nodes_data(file_key, figma_token, node_ids, depth)
+                    return {"file_key": file_key, "figma_data": figma_data}, None
+                figma_data, body = get_figma_file_response(file_key, figma_token, depth)
+                # the Figma body is reused as is instead of walking the document again
+                raw_json = b'{"file_key":' + json.dumps(file_key).encode() + b',"figma_data":' + body + b'}'
+                return {"file_key": file_key, "figma_data": figma_data}, raw_json
+
+            # the token is part of the key, a replica never hands a document to someone who could not fetch it
+            cache_key = content_key('figma_data', file_key, node_ids, depth, figma_token)
+            cached = self._cache_lookup(cache_key, 'figma_data')
+            if cached is not None:
+                result, raw_json = cached
+            else:
+                result, raw_json = fetch()
+                if self.cache is not None:
+                    raw_json = raw_json or self.to_json(result, 'figma_data')
+                    self.cache.set(cache_key, raw_json, FIGMA_CACHE_TTL)
+            self._save_to_memory(result, 'figma_data', raw_json)
             return result
         except Exception as e:
             raise Exception(f"Error parsing Figma URL: {str(e)}")
@@ -135,27 +249,94 @@ class Feature2Service:
     def get_feature_representation(self, figma_data: Dict[str, Any], feature_description: Optional[str] = None) -> Dict[str, Any]:
         """Get feature representation from Figma data"""
         try:
-            result = filter_component(figma_data, feature_description)
-            self._save_to_memory(result, 'feature_list')
+            result, raw_json = self._shared(self._content_key('feature_list', figma_data, 'figma_data', feature_description),
+                                            'feature_list',
+                                            lambda: self._filter_component(figma_data, feature_description))
+            self._save_to_memory(result, 'feature_list', raw_json)
             return result
         except Exception as e:
             raise Exception(f"Error getting feature representation: {str(e)}")
 
-    def generate_test_plan_from_feature(self, feature_list: Dict[str, Any], gemini_api_key: str) -> Dict[str, Any]:
+    def _filter_component(self, figma_data: Dict[str, Any], feature_description: Optional[str]) -> Dict[str, Any]:
+        if self.cpu.max_workers <= 0:
+            # without a pool the document is never serialized, not even to measure it
+            return filter_component(figma_data, feature_description)
+        # the stored bytes when there are any, their length decides where the work runs
+        raw_json = self._stored_json(figma_data, 'figma_data')
+        if self.cpu.inline(raw_json):
+            return filter_component(figma_data, feature_description)
+        # where enabled, pages walked in parallel by forked workers that share the parsed document with this process
+        shards = self.cpu.shard_executor(raw_json)
+        if shards is not None:
+            return filter_component(figma_data, feature_description, executor=shards)
+        return self.cpu.run(filter_component_json, raw_json, feature_description)
+
+    @contextmanager
+    def _metered(self, gemini_api_key: str, run_id: Optional[str], deadline: Optional[float] = None):
+        """
+        Model calls inside the block are checked against the budgets, charged to the key and run
+        and have to be answered by deadline (a time.monotonic() value)
+        """
+        with metering(self.usage.meter(gemini_api_key, run_id)), within(deadline):
+            yield
+
+    def generate_test_plan_from_feature(self, feature_list: Dict[str, Any], gemini_api_key: str,
+                                        run_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
         """Generate test plan from feature list"""
         try:
-            result = generate_test_plan(feature_list, gemini_api_key)
-            self._save_to_memory(result, 'test_plan')
+            with self._metered(gemini_api_key, run_id, deadline):
+                result, raw_json = self._shared(self._content_key('test_plan', feature_list, 'feature_list', _model('test_plan')),
+                                                'test_plan',
+                                                lambda: generate_test_plan(feature_list, gemini_api_key))
+            self._save_to_memory(result, 'test_plan', raw_json)
             return result
+        except (BudgetExceeded, DeadlineExceeded):
+            raise
+        except Exception as e:
+            raise Exception(f"Error generating test plan: {str(e)}")
+
+    def stream_test_plan_from_feature(self, feature_list: Dict[str, Any], gemini_api_key: str,
+                                      run_id: Optional[str] = None, deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Yield test plan objectives as the model writes them, the whole plan is stored at the end"""
+        plan_key = self._content_key('test_plan', feature_list, 'feature_list', _model('test_plan'))
+        cached = self._cache_lookup(plan_key, 'test_plan')
+        if cached is not None:
+            self._save_to_memory(cached[0], 'test_plan', cached[1])
+            yield from cached[0]['test_plan']
+            return
+        meter = self.usage.meter(gemini_api_key, run_id)
+        objectives = []
+        stream = generate_test_plan_stream(feature_list, gemini_api_key)
+        try:
+            while True:
+                # the consumer may resume this generator from another thread, so the meter is
+                # set around every step instead of once for the whole stream
+                with metering(meter), within(deadline):
+                    objective = next(stream, None)
+                if objective is None:
+                    break
+                objectives.append(objective)
+                yield objective
+        except (BudgetExceeded, DeadlineExceeded):
+            raise
         except Exception as e:
             raise Exception(f"Error generating test plan: {str(e)}")
+        test_plan = {"test_plan": objectives}
+        self._save_to_memory(test_plan, 'test_plan', self._cache_store(plan_key, 'test_plan', test_plan))
 
-    def generate_test_cases_from_plan(self, test_plan: Dict[str, Any], gemini_api_key: str) -> Dict[str, Any]:
+    def generate_test_cases_from_plan(self, test_plan: Dict[str, Any], gemini_api_key: str,
+                                      run_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str, Any]:
         """Generate test cases from test plan"""
         try:
-            result = generate_test_case(test_plan, gemini_api_key)
-            self._save_to_memory(result, 'test_cases')
+            with self._metered(gemini_api_key, run_id, deadline):
+                result, raw_json = self._shared(self._content_key('test_cases', test_plan, 'test_plan', _model('test_cases')),
+                                                'test_cases',
+                                                lambda: _complete(generate_test_case, test_plan, gemini_api_key,
+                                                                  checkpoints=self.checkpoints))
+            self._save_to_memory(result, 'test_cases', raw_json)
             return result
+        except (BudgetExceeded, DeadlineExceeded, IncompleteResult):
+            raise
         except Exception as e:
             raise Exception(f"Error generating test cases: {str(e)}")
         
@@ -168,31 +349,154 @@ class Feature2Service:
         except Exception as e:
             raise Exception(f"Error generating test cases: {str(e)}")
     
-    def generate_test_code_from_feature(self, feature_text : Dict[str,Any], gemini_api_key : str ) -> Dict[str,Any] :
+    def generate_test_code_from_feature(self, feature_text : Dict[str,Any], gemini_api_key : str,
+                                        run_id: Optional[str] = None, deadline: Optional[float] = None) -> Dict[str,Any] :
         """Generate test code from test case"""
         try:
-            result = generate_E2E_code(feature_text, gemini_api_key)
-            self._save_to_memory(result, 'test_code')
+            with self._metered(gemini_api_key, run_id, deadline):
+                result, raw_json = self._shared(self._content_key('test_code', feature_text, 'feature_text', _model('test_code')),
+                                                'test_code',
+                                                lambda: _complete(generate_E2E_code, feature_text, gemini_api_key,
+                                                                  batch_size=self.code_batch_size,
+                                                                  max_batch_tokens=self.code_batch_tokens,
+                                                                  checkpoints=self.checkpoints))
+            self._save_to_memory(result, 'test_code', raw_json)
             return result
+        except (BudgetExceeded, DeadlineExceeded, IncompleteResult):
+            raise
         except Exception as e:
             raise Exception(f"Error generating test cases: {str(e)}")
         
+    def run_pipeline(self, figma_url: str, figma_token: str, gemini_api_key: str, feature_description: Optional[str] = None,
+                     depth: Optional[int] = None, max_workers: int = DEFAULT_PIPELINE_WORKERS,
+                     stream_plan: bool = True, run_id: Optional[str] = None,
+                     deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Every stage from a Figma URL to test code in one call, storing each intermediate result.
+        With stream_plan, test cases start for each objective while the plan is still being written.
+        Over budget in degrade mode, the code files that could not be generated are left out.
+        Test cases and code finished by an earlier run with the same inputs are not generated again.
+        Failed objectives and code files are left out too, with an error each under "errors".
+        The plan is checkpointed, so a run submitted again keeps the plan its checkpointed items belong to.
+        """
+        start = time.perf_counter()
+        meter = self.usage.meter(gemini_api_key, run_id)
+        degrade = self.usage.mode == DEGRADE
+        errors: Dict[str, str] = {}
+        figma_data = self.parse_figma_url_and_get_data(figma_url, figma_token, depth)
+        feature_list = self.get_feature_representation(figma_data, feature_description)
+
+        plan_checkpoint = item_key('test_plan', _model('test_plan'), hashlib.sha256(self.get_json('feature_list')).hexdigest())
+        test_plan = self.checkpoints.get(plan_checkpoint)
+        plan_key = self._content_key('test_plan', feature_list, 'feature_list', _model('test_plan'))
+        if test_plan is not None:
+            # an earlier run with the same feature list wrote the plan, its items are checkpointed under it
+            self._save_to_memory(test_plan, 'test_plan')
+        elif stream_plan and self._cache_lookup(plan_key, 'test_plan') is None:
+            try:
+                with metering(meter), within(deadline):
+                    objectives = self._checkpoint_plan(generate_test_plan_stream(feature_list, gemini_api_key),
+                                                       plan_checkpoint)
+                    test_plan, test_cases, feature_text, test_code = stream_cases_and_code(
+                        objectives, gemini_api_key, max_workers, skip_code_over_budget=degrade,
+                        checkpoints=self.checkpoints, errors=errors)
+            except (BudgetExceeded, DeadlineExceeded):
+                raise
+            except Exception as e:
+                raise Exception(f"Error generating test plan, test cases and code: {str(e)}")
+            self._save_to_memory(test_plan, 'test_plan', self._cache_store(plan_key, 'test_plan', test_plan))
+            cases_key = self._content_key('test_cases', test_plan, 'test_plan', _model('test_cases'))
+            self._save_generated(test_cases, feature_text, test_code, cases_key, errors)
+            return self._pipeline_result(test_plan, test_cases, feature_text, test_code, errors, start, meter.run_id)
+        else:
+            test_plan = self.generate_test_plan_from_feature(feature_list, gemini_api_key, meter.run_id, deadline)
+            self.checkpoints.put(plan_checkpoint, test_plan)
+        cases_key = self._content_key('test_cases', test_plan, 'test_plan', _model('test_cases'))
+        if self._cache_lookup(cases_key, 'test_cases') is not None:
+            # another replica already did the expensive part, the stage methods pick it up from the cache
+            try:
+                test_cases = self.generate_test_cases_from_plan(test_plan, gemini_api_key, meter.run_id, deadline)
+            except IncompleteResult as e:
+                test_cases = e.result
+                errors.update(e.errors)
+                self._save_to_memory(test_cases, 'test_cases')
+            feature_text = self.generate_feature_from_case(test_cases)
+            try:
+                test_code = self.generate_test_code_from_feature(feature_text, gemini_api_key, meter.run_id, deadline)
+            except BudgetExceeded:
+                if not degrade:
+                    raise
+                test_code = {}
+            except IncompleteResult as e:
+                test_code = e.result
+                errors.update(e.errors)
+                self._save_to_memory(test_code, 'test_code')
+        else:
+            try:
+                with metering(meter), within(deadline):
+                    test_cases, feature_text, test_code = generate_cases_and_code(
+                        test_plan, gemini_api_key, max_workers, skip_code_over_budget=degrade,
+                        checkpoints=self.checkpoints, errors=errors)
+            except (BudgetExceeded, DeadlineExceeded):
+                raise
+            except Exception as e:
+                raise Exception(f"Error generating test cases and code: {str(e)}")
+            self._save_generated(test_cases, feature_text, test_code, cases_key, errors)
+        return self._pipeline_result(test_plan, test_cases, feature_text, test_code, errors, start, meter.run_id)
+
+    def _checkpoint_plan(self, objectives: Iterator[Dict[str, Any]], key: str) -> Iterator[Dict[str, Any]]:
+        """objectives as they stream, the whole plan is checkpointed under key once the stream ends"""
+        test_plan = []
+        for objective in objectives:
+            test_plan.append(objective)
+            yield objective
+        self.checkpoints.put(key, {"test_plan": test_plan})
+
+    def _save_generated(self, test_cases: Dict[str, Any], feature_text: Dict[str, str], test_code: Dict[str, str],
+                        cases_key: Optional[str], errors: Dict[str, str]) -> None:
+        if any(name.startswith("Feature ") for name in errors):
+            # some objectives failed (code errors are under file names), other replicas must not
+            # reuse the rest as the whole result
+            self._save_to_memory(test_cases, 'test_cases')
+        else:
+            self._save_to_memory(test_cases, 'test_cases', self._cache_store(cases_key, 'test_cases', test_cases))
+        self._save_to_memory(feature_text, 'feature_text')
+        if len(test_code) < len(feature_text):
+            # code generation was cut short by the budget or failed files, other replicas must not reuse it
+            self._save_to_memory(test_code, 'test_code')
+            return
+        code_key = self._content_key('test_code', feature_text, 'feature_text', _model('test_code'))
+        self._save_to_memory(test_code, 'test_code', self._cache_store(code_key, 'test_code', test_code))
+
+    def _pipeline_result(self, test_plan: Dict[str, Any], test_cases: Dict[str, Any], feature_text: Dict[str, str],
+                         test_code: Dict[str, str], errors: Dict[str, str], start: float, run_id: str) -> Dict[str, Any]:
+        return {
+            "artifacts": {data_type: self._artifact_ids[key] for data_type, key in self.DATA_TYPES.items()
+                          if key in self._artifact_ids},
+            "test_plan": test_plan,
+            "test_cases": test_cases,
+            "feature_text": feature_text,
+            "test_code": test_code,
+            # files without code, refused by the token budget or failed (with their error in errors)
+            "skipped_code": [code_file_name(n) for n in range(1, len(feature_text) + 1) if code_file_name(n) not in test_code],
+            # an error per failed objective ("Feature n") and code file
+            "errors": errors,
+            "run_id": run_id,
+            "usage": self.usage.run_usage(run_id),
+            "seconds": time.perf_counter() - start
+        }
 
     def get_saved_data(self, data_type: str) -> Dict[str, Any]:
         """Get saved data by type"""
-        type_mapping = {
-            'figma': 'figma_data',
-            'feature': 'feature_list',
-            'plan': 'test_plan',
-            'cases': 'test_cases',
-            'cucumber':'feature_text',
-            'code' : 'test_code'
-        }
-        
-        if data_type not in type_mapping:
-            raise ValueError(f"Invalid data type. Must be one of: {', '.join(type_mapping.keys())}")
+        if data_type not in self.DATA_TYPES:
+            raise ValueError(f"Invalid data type. Must be one of: {', '.join(self.DATA_TYPES.keys())}")
             
-        return self._read_from_memory(type_mapping[data_type])
+        return self._read_from_memory(self.DATA_TYPES[data_type])
+
+    def get_saved_json(self, data_type: str, encoding: str = IDENTITY) -> bytes:
+        """Get saved data by type as JSON bytes"""
+        self.get_saved_data(data_type)
+        return self.get_json(self.DATA_TYPES[data_type], encoding)
 
 def update_env_file(figma_token: str, gemini_key: str) -> Tuple[str, str]:
     """Update environment variables in memory"""
@@ -203,7 +507,9 @@ def update_env_file(figma_token: str, gemini_key: str) -> Tuple[str, str]:
 
 
 # Create a singleton instance
-feature2_service = Feature2Service()
+feature2_service = Feature2Service(shared_cache_from_env(), cpu_executor_from_env(), usage_ledger_from_env(),
+                                   code_batch_size=int(os.getenv("COVERIQ_CODE_BATCH_SIZE", 1)),
+                                   code_batch_tokens=int(os.getenv("COVERIQ_CODE_BATCH_TOKENS", DEFAULT_MAX_BATCH_TOKENS)))
 
 # Create a singleton instance
 document_generator = DocumentGenerator()
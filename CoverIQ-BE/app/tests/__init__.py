@@ -0,0 +1,3 @@
+"""
+Test package for the API app.
+""" 
\ No newline at end of file
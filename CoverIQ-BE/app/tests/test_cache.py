@@ -0,0 +1,132 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import zlib
+from unittest.mock import patch, MagicMock
+from ..cache import SQLiteCacheBackend, RedisCacheBackend, SharedCache, content_key
+from ..services import Feature2Service
+
+TEST_PLAN = {"test_plan": [{"Objective": "O", "Scope": "S", "Test_Items": {
+    "Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["C"]}}]}
+
+class FakeRedis:
+    """The part of the redis-py client the cache uses, in memory"""
+    def __init__(self, policy="allkeys-lru"):
+        self.values = {}
+        self.expiries = {}
+        self.policy = policy
+
+    def config_get(self, pattern):
+        return {pattern: self.policy}
+
+    def get(self, name):
+        return self.values.get(name)
+
+    def set(self, name, value, ex=None):
+        self.values[name] = value
+        self.expiries[name] = ex
+
+    def delete(self, name):
+        self.values.pop(name, None)
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_content_key(self):
+        """Test keys depend on the namespace and every input"""
+        self.assertEqual(content_key("plan", {"a": 1}), content_key("plan", {"a": 1}))
+        self.assertNotEqual(content_key("plan", {"a": 1}), content_key("plan", {"a": 2}))
+        self.assertNotEqual(content_key("plan", {"a": 1}), content_key("cases", {"a": 1}))
+        self.assertEqual(content_key("plan", "m", b'{"a":1}'), content_key("plan", "m", {"a": 1}))
+
+    def test_sqlite_backend(self):
+        """Test values are shared through the file, expire and are evicted least recently used first"""
+        backend = SQLiteCacheBackend(self.path, max_bytes=10)
+        backend.set("a", b"1234")
+        backend.set("b", b"5678")
+        self.assertEqual(SQLiteCacheBackend(self.path).get("a"), b"1234")
+        time.sleep(0.01)
+        backend.get("a")
+        backend.set("c", b"9012")
+        self.assertIsNone(backend.get("b"))
+        self.assertEqual(backend.get("a"), b"1234")
+        backend.set("d", b"x", ttl=-1)
+        self.assertIsNone(backend.get("d"))
+
+    def test_redis_backend(self):
+        """Test the Redis backend stores prefixed values with their TTL and leaves eviction to the server"""
+        client = FakeRedis()
+        backend = RedisCacheBackend(client=client)
+        backend.set("a", b"1234")
+        backend.set("b", b"5678", ttl=60)
+        self.assertEqual(backend.get("a"), b"1234")
+        self.assertEqual(client.expiries, {"coveriq:a": None, "coveriq:b": 60})
+        backend.delete("a")
+        self.assertIsNone(backend.get("a"))
+
+    def test_redis_eviction_policy(self):
+        """Test a server that would never evict entries without a TTL is reported"""
+        with self.assertLogs("app.cache", level="WARNING"):
+            RedisCacheBackend(client=FakeRedis(policy="noeviction"))
+        refusing = FakeRedis()
+        refusing.config_get = MagicMock(side_effect=PermissionError("CONFIG is disabled"))
+        RedisCacheBackend(client=refusing)
+
+    def test_shared_cache_compression(self):
+        """Test large values are stored zlib compressed and read back as written"""
+        backend = SQLiteCacheBackend(self.path)
+        cache = SharedCache(backend, compress_min_size=16)
+        value = b'{"node": "frame"}' * 100
+        cache.set("big", value)
+        cache.set("small", b"{}")
+        self.assertEqual(zlib.decompress(backend.get("big")[1:]), value)
+        self.assertEqual(cache.get("big"), value)
+        self.assertEqual(cache.get("small"), b"{}")
+        self.assertIsNone(cache.get("missing"))
+
+    def test_shared_cache_errors(self):
+        """Test a failing backend is treated as a miss"""
+        backend = MagicMock()
+        backend.get.side_effect = ConnectionError("down")
+        backend.set.side_effect = ConnectionError("down")
+        cache = SharedCache(backend)
+        cache.set("a", b"1")
+        self.assertIsNone(cache.get("a"))
+
+    @patch('google.genai.Client')
+    def test_replicas_share_results(self, mock_client):
+        """Test a second replica reuses the test plan generated by the first"""
+        mock_response = MagicMock()
+        mock_response.text = json.dumps(TEST_PLAN)
+        mock_client.return_value.models.generate_content.return_value = mock_response
+        first = Feature2Service(SharedCache(SQLiteCacheBackend(self.path)))
+        second = Feature2Service(SharedCache(SQLiteCacheBackend(self.path)))
+
+        feature_list = {"figma_data": [], "feature_description": None}
+        self.assertEqual(first.generate_test_plan_from_feature(feature_list, "key"), TEST_PLAN)
+        self.assertEqual(second.generate_test_plan_from_feature(feature_list, "key"), TEST_PLAN)
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 1)
+        self.assertEqual(second.get_saved_json('plan'), first.get_saved_json('plan'))
+
+    def test_content_key_only_with_cache(self):
+        """Test cache keys are skipped without a cache and hash the stored JSON bytes of stored inputs"""
+        feature_list = {"figma_data": [], "feature_description": None}
+        self.assertIsNone(Feature2Service()._content_key('test_plan', feature_list, 'feature_list', 'model'))
+
+        service = Feature2Service(SharedCache(SQLiteCacheBackend(self.path)))
+        raw_json = b'{"figma_data": [], "feature_description": null}'
+        service._save_to_memory(feature_list, 'feature_list', raw_json)
+        self.assertEqual(service._content_key('test_plan', feature_list, 'feature_list', 'model'),
+                         content_key('test_plan', 'model', raw_json))
+        self.assertEqual(service._content_key('test_plan', dict(feature_list), 'feature_list', 'model'),
+                         content_key('test_plan', 'model', feature_list))
+
+if __name__ == '__main__':
+    unittest.main()
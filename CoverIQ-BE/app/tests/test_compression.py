@@ -0,0 +1,43 @@
+import gzip
+import unittest
+from unittest.mock import patch
+from ..compression import negotiate_encoding, compress, brotli_available, MIN_COMPRESS_SIZE
+
+LARGE = MIN_COMPRESS_SIZE * 4
+
+class TestCompression(unittest.TestCase):
+    @patch('app.compression.brotli_available', return_value=False)
+    def test_negotiate_gzip(self, _):
+        """Test gzip is chosen when accepted and brotli is not installed"""
+        self.assertEqual(negotiate_encoding("gzip, deflate, br", LARGE), "gzip")
+        self.assertEqual(negotiate_encoding("*", LARGE), "gzip")
+        self.assertEqual(negotiate_encoding("br", LARGE), "identity")
+
+    @patch('app.compression.brotli_available', return_value=True)
+    def test_negotiate_quality(self, _):
+        """Test q-values decide between encodings and q=0 refuses one"""
+        self.assertEqual(negotiate_encoding("gzip, br", LARGE), "br")
+        self.assertEqual(negotiate_encoding("gzip;q=1.0, br;q=0.5", LARGE), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0, br;q=0", LARGE), "identity")
+
+    def test_small_or_missing(self):
+        """Test small bodies and requests without Accept-Encoding are sent as is"""
+        self.assertEqual(negotiate_encoding("gzip", MIN_COMPRESS_SIZE - 1), "identity")
+        self.assertEqual(negotiate_encoding(None, LARGE), "identity")
+
+    def test_compress(self):
+        """Test compressed bodies round trip and are deterministic"""
+        data = b'{"a": 1}' * 1000
+        self.assertEqual(gzip.decompress(compress(data, "gzip")), data)
+        self.assertEqual(compress(data, "gzip"), compress(data, "gzip"))
+        self.assertIs(compress(data, "identity"), data)
+
+    @unittest.skipUnless(brotli_available(), "brotli is not installed")
+    def test_compress_brotli(self):
+        """Test brotli bodies round trip"""
+        import brotli
+        data = b'{"a": 1}' * 1000
+        self.assertEqual(brotli.decompress(compress(data, "br")), data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import io
+import json
+import os
+import unittest
+import zipfile
+from ..cpu_pool import CPUExecutor, InheritedInputPool, filter_component_json, fork_available
+from ..services import DocumentGenerator, Feature2Service
+from TestPlanner.feature_representation import filter_component
+
+FIGMA_DATA = {"file_key": "abc", "figma_data": {"document": {"id": "0:0", "children": [
+    {"id": f"1:{n}", "name": f"Button {n}", "type": "INSTANCE", "interactions": [{"trigger": "ON_CLICK"}],
+     "absoluteBoundingBox": {"x": n, "y": 0, "width": 10, "height": 10}}
+    for n in range(50)
+]}}}
+TEST_PLAN = {"test_plan": [{"Objective": "O", "Scope": "S", "Test_Items": {
+    "Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["C"]}}]}
+TEST_CASES = {"Feature 1": {"feature": "Login", "bdd_style_descriptions": [
+    {"Scenario": "Login", "Given": "the login page", "And": "a user", "When": "the user logs in", "Then": "the home page"}]}}
+
+def process_id(raw_json: bytes) -> int:
+    return os.getpid()
+
+def fail(raw_json: bytes) -> None:
+    raise ValueError("bad input")
+
+class TestCPUPool(unittest.TestCase):
+    def setUp(self):
+        self.executor = CPUExecutor(max_workers=1, threshold=100)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_threshold(self):
+        """Test small inputs run in the calling process and large ones in a worker"""
+        self.assertEqual(self.executor.run(process_id, b"{}"), os.getpid())
+        self.assertNotEqual(self.executor.run(process_id, b" " * 100), os.getpid())
+        self.assertEqual(CPUExecutor(max_workers=0, threshold=0).run(process_id, b" " * 100), os.getpid())
+
+    def test_errors(self):
+        """Test exceptions of the work reach the caller inline and from a worker"""
+        for raw_json in (b"{}", b" " * 100):
+            with self.assertRaises(ValueError):
+                self.executor.run(fail, raw_json)
+
+    def test_filter_component(self):
+        """Test filtering in a worker matches filtering inline"""
+        raw_json = json.dumps(FIGMA_DATA).encode()
+        self.assertEqual(self.executor.run(filter_component_json, raw_json, "Login"), filter_component(FIGMA_DATA, "Login"))
+
+    def test_service_exports(self):
+        """Test exports rendered in a worker match DocumentGenerator and reuse stored data"""
+        service = Feature2Service(cpu=CPUExecutor(max_workers=1, threshold=0))
+        self.addCleanup(service.cpu.shutdown)
+        service._save_to_memory(FIGMA_DATA, 'figma_data')
+        service._save_to_memory(TEST_PLAN, 'test_plan')
+        service._save_to_memory(TEST_CASES, 'test_cases')
+        service._save_to_memory({"test_code_for_case_1.py": "print(1)"}, 'test_code')
+
+        self.assertEqual(service.get_feature_representation(FIGMA_DATA), filter_component(FIGMA_DATA))
+        self.assertEqual(service.export('plan_markdown'), DocumentGenerator.generate_test_plan_markdown(TEST_PLAN))
+        self.assertEqual(service.export('cases_markdown'), DocumentGenerator.generate_test_cases_markdown(TEST_CASES))
+        with zipfile.ZipFile(io.BytesIO(service.export('feature_zip'))) as archive:
+            self.assertEqual(archive.namelist(), ["feature_1.feature"])
+        with zipfile.ZipFile(io.BytesIO(service.export('code_zip'))) as archive:
+            self.assertEqual(archive.read("test_code_for_case_1.py"), b"print(1)")
+
+    @unittest.skipUnless(fork_available(), "needs the fork start method")
+    def test_inherited_input_pool(self):
+        """Test forked workers map over inherited inputs in order"""
+        pages = [{"children": list(range(n))} for n in range(5)]
+        results = InheritedInputPool(max_workers=2).map(lambda page, n: (len(page["children"]), n, os.getpid()), pages, range(5))
+        self.assertEqual([result[:2] for result in results], [(n, n) for n in range(5)])
+        self.assertNotIn(os.getpid(), [result[2] for result in results])
+
+    @unittest.skipUnless(fork_available(), "needs the fork start method")
+    def test_service_filters_pages_in_parallel(self):
+        """Test a large stored document is filtered page by page with the same result"""
+        figma_data = {"file_key": "abc", "figma_data": {"document": {"id": "0:0", "children": [
+            {"id": f"0:{p}", "type": "CANVAS", "children": FIGMA_DATA["figma_data"]["document"]["children"]} for p in range(3)]}}}
+        service = Feature2Service(cpu=CPUExecutor(max_workers=2, threshold=0, shard_workers=2))
+        service._save_to_memory(figma_data, 'figma_data')
+        self.assertIsNotNone(service.cpu.shard_executor(service.get_json('figma_data')))
+        # only when asked for, large documents go to the spawned pool by default
+        self.assertIsNone(CPUExecutor(max_workers=2, threshold=0).shard_executor(service.get_json('figma_data')))
+        self.assertEqual(service.get_feature_representation(figma_data), filter_component(figma_data))
+
+    def test_service_without_pool_skips_serializing(self):
+        """Test filtering without a pool does not serialize the stored document"""
+        service = Feature2Service()
+        service._save_to_memory(FIGMA_DATA, 'figma_data')
+        self.assertEqual(service.get_feature_representation(FIGMA_DATA), filter_component(FIGMA_DATA))
+        self.assertNotIn('figma_data', service._json)
+
+    def test_export_missing_data(self):
+        """Test exporting a result that was never generated is reported as missing"""
+        with self.assertRaises(FileNotFoundError):
+            Feature2Service().export('code_zip')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..pipeline import generate_cases_and_code, stream_cases_and_code
+from ..routes import router, MAX_PIPELINE_WORKERS
+from ..services import feature2_service, Feature2Service
+from ..cache import SharedCache, SQLiteCacheBackend
+from TestPlanner.bdd_style_test_case_generator import generate_test_case
+from TestPlanner.llm_test_plan_generator import generate_test_plan_stream
+from TestPlanner.test_code_generator import generate_feature_text, generate_E2E_code
+from TestPlanner.usage import BudgetExceeded
+from TestPlanner.checkpoints import Checkpoints
+
+TEST_PLAN = {"test_plan": [
+    {"Objective": f"Objective {n}", "Scope": "Scope", "Test_Items": {
+        "Types_of_Testing": "Functional", "Test_Approach": "Manual", "Acceptance_Criteria": ["Criteria"]}}
+    for n in (1, 2)
+]}
+
+def make_test_case(objective: str) -> dict:
+    return {"feature": objective, "bdd_style_descriptions": [
+        {"Scenario": f"{objective} scenario {n}", "Given": f"{objective} page", "And": "a user",
+         "When": f"the user clicks button {n}", "Then": f"{objective} result {n}"}
+        for n in (1, 2)
+    ]}
+
+class FakeModels:
+    """
+    Streams TEST_PLAN for plan calls, answers case calls with make_test_case(objective) and code
+    calls with code naming the feature
+    """
+    def __init__(self, before_case=None, between_objectives=None):
+        self.before_case = before_case or (lambda objective: None)
+        self.between_objectives = between_objectives or (lambda: None)
+        self.code_calls = []
+
+    def generate_content_stream(self, model, contents, config=None):
+        first, second = (json.dumps(item) for item in TEST_PLAN["test_plan"])
+        yield MagicMock(text='{"test_plan": [' + first[:10])
+        yield MagicMock(text=first[10:] + ", ")
+        self.between_objectives()
+        yield MagicMock(text=second + "]}")
+
+    def generate_content(self, model, contents, config=None):
+        prompt = contents if isinstance(contents, str) else "".join(contents)
+        response = MagicMock()
+        if "UI design" in prompt:
+            response.text = json.dumps(TEST_PLAN)
+        elif "test plan :" in prompt:
+            objective = "Objective 2" if "Objective 2" in prompt else "Objective 1"
+            self.before_case(objective)
+            response.text = json.dumps(make_test_case(objective))
+        else:
+            self.code_calls.append(prompt)
+            first_line = prompt.split("Feature: ")[1].splitlines()[0]
+            response.text = f"# code for {first_line}"
+        return response
+
+class TestPipeline(unittest.TestCase):
+    @patch('google.genai.Client')
+    def test_matches_stage_by_stage_results(self, mock_client):
+        """Test the overlapped pipeline returns what the separate stages return"""
+        mock_client.return_value.models = FakeModels()
+
+        test_cases, feature_text, test_code = generate_cases_and_code(TEST_PLAN, "key")
+
+        self.assertEqual(test_cases, generate_test_case(TEST_PLAN, "key"))
+        self.assertEqual(feature_text, generate_feature_text(test_cases))
+        self.assertEqual(test_code, generate_E2E_code(feature_text, "key"))
+        self.assertEqual(list(test_code), [f"test_code_for_case_{n}.py" for n in range(1, 5)])
+
+    @patch('google.genai.Client')
+    def test_code_starts_before_all_cases_finish(self, mock_client):
+        """Test code generation for the first objective runs while the second is still generating"""
+        first_code_started = threading.Event()
+
+        def before_case(objective):
+            # the second objective only finishes once code for the first one is being generated
+            if objective == "Objective 2":
+                self.assertTrue(first_code_started.wait(timeout=5), "stages did not overlap")
+
+        models = FakeModels(before_case)
+        original = models.generate_content
+
+        def generate_content(model, contents, config=None):
+            response = original(model, contents, config)
+            if "1. Objective 1" in "".join(contents if isinstance(contents, list) else [contents]):
+                first_code_started.set()
+            return response
+        models.generate_content = generate_content
+        mock_client.return_value.models = models
+
+        test_cases, _, test_code = generate_cases_and_code(TEST_PLAN, "key", max_workers=4)
+        self.assertEqual(list(test_cases), ["Feature 1", "Feature 2"])
+        self.assertEqual(len(test_code), 4)
+
+    @patch('google.genai.Client')
+    def test_duplicate_scenarios_share_code(self, mock_client):
+        """Test scenarios with the same steps are generated once"""
+        models = FakeModels()
+        mock_client.return_value.models = models
+        plan = {"test_plan": [TEST_PLAN["test_plan"][0], TEST_PLAN["test_plan"][0]]}
+
+        _, feature_text, test_code = generate_cases_and_code(plan, "key")
+
+        self.assertEqual(len(feature_text), 4)
+        self.assertEqual(len(models.code_calls), 2)
+        self.assertEqual(test_code["test_code_for_case_1.py"], test_code["test_code_for_case_3.py"])
+
+        # /generate-test-code groups the same texts the same way
+        models.code_calls = []
+        self.assertEqual(generate_E2E_code(feature_text, "key"), test_code)
+        self.assertEqual(len(models.code_calls), 2)
+
+    @patch('requests.get')
+    @patch('google.genai.Client')
+    def test_run_pipeline_stores_every_stage(self, mock_client, mock_get):
+        """Test the /pipeline endpoint runs every stage and stores each artifact"""
+        mock_response = MagicMock()
+        mock_response.content = json.dumps({"name": "File", "document": {"children": []}}).encode()
+        mock_get.return_value = mock_response
+        mock_client.return_value.models = FakeModels()
+        app = FastAPI()
+        app.include_router(router)
+
+        for stream_plan in (True, False):
+            response = TestClient(app).post("/pipeline", json={
+                "figma_url": "https://www.figma.com/file/abc123/design", "figma_token": "t", "gemini_key": "k",
+                "stream_plan": stream_plan})
+
+            self.assertEqual(response.status_code, 200)
+            result = response.json()
+            self.assertEqual(set(result["artifacts"]), {"figma", "feature", "plan", "cases", "cucumber", "code"})
+            self.assertEqual(result["test_plan"], TEST_PLAN)
+            self.assertEqual(feature2_service.get_saved_data('plan'), TEST_PLAN)
+            self.assertEqual(feature2_service.get_saved_data('code'), result["test_code"])
+            self.assertEqual(feature2_service.get_saved_data('cucumber'), result["feature_text"])
+
+    def test_pipeline_max_workers_is_capped(self):
+        """Test /pipeline rejects more concurrent model calls than the server allows"""
+        app = FastAPI()
+        app.include_router(router)
+        request = {"figma_url": "https://www.figma.com/file/abc123/design", "figma_token": "t", "gemini_key": "k"}
+        for max_workers in (0, MAX_PIPELINE_WORKERS + 1):
+            response = TestClient(app).post("/pipeline", json={**request, "max_workers": max_workers})
+            self.assertEqual(response.status_code, 422)
+
+    @patch('requests.get')
+    @patch('google.genai.Client')
+    def test_run_pipeline_reports_failed_items(self, mock_client, mock_get):
+        """Test /pipeline returns 207 with the other items when an objective and a code file fail"""
+        mock_response = MagicMock()
+        mock_response.content = json.dumps({"name": "File", "document": {"children": []}}).encode()
+        mock_get.return_value = mock_response
+
+        def before_case(objective):
+            if objective == "Objective 2":
+                raise ValueError("model answered with invalid JSON")
+        models = FakeModels(before_case)
+        original = models.generate_content
+
+        def generate_content(model, contents, config=None):
+            if "Objective 1 scenario 2" in "".join(contents if isinstance(contents, list) else [contents]):
+                raise ValueError("code call failed")
+            return original(model, contents, config)
+        models.generate_content = generate_content
+        mock_client.return_value.models = models
+        app = FastAPI()
+        app.include_router(router)
+
+        for stream_plan in (True, False):
+            with patch.object(feature2_service, 'checkpoints', Checkpoints()):
+                response = TestClient(app).post("/pipeline", json={
+                    "figma_url": "https://www.figma.com/file/abc123/other", "figma_token": "t", "gemini_key": "k",
+                    "stream_plan": stream_plan})
+
+            self.assertEqual(response.status_code, 207)
+            result = response.json()
+            self.assertEqual(list(result["test_cases"]), ["Feature 1"])
+            self.assertEqual(list(result["test_code"]), ["test_code_for_case_1.py"])
+            self.assertEqual(result["skipped_code"], ["test_code_for_case_2.py"])
+            self.assertEqual(set(result["errors"]), {"Feature 2", "test_code_for_case_2.py"})
+            self.assertIn("invalid JSON", result["errors"]["Feature 2"])
+
+    @patch('requests.get')
+    @patch('google.genai.Client')
+    def test_resubmitted_pipeline_keeps_its_plan(self, mock_client, mock_get):
+        """Test a failed /pipeline run submitted again reuses its plan and only makes the failed calls"""
+        mock_response = MagicMock()
+        mock_response.content = json.dumps({"name": "File", "document": {"children": []}}).encode()
+        mock_get.return_value = mock_response
+        failing = set()
+        replanned = {"test_plan": [dict(objective, Scope="Another scope") for objective in TEST_PLAN["test_plan"]]}
+
+        def before_case(objective):
+            if objective in failing:
+                raise ValueError("model answered with invalid JSON")
+        models = FakeModels(before_case)
+        original = models.generate_content
+        case_calls = []
+
+        def generate_content(model, contents, config=None):
+            prompt = "".join(contents if isinstance(contents, list) else [contents])
+            if "UI design" in prompt and not failing:
+                return MagicMock(text=json.dumps(replanned))
+            if "Objective 1 scenario 2" in prompt and failing:
+                raise ValueError("code call failed")
+            if "test plan :" in prompt:
+                case_calls.append(prompt)
+            return original(model, contents, config)
+        models.generate_content = generate_content
+        mock_client.return_value.models = models
+        app = FastAPI()
+        app.include_router(router)
+        request = {"figma_url": "https://www.figma.com/file/abc123/resubmitted", "figma_token": "t", "gemini_key": "k"}
+
+        for stream_plan in (True, False):
+            with patch.object(feature2_service, 'checkpoints', Checkpoints()):
+                failing.add("Objective 2")
+                models.generate_content_stream = FakeModels.generate_content_stream.__get__(models)
+                response = TestClient(app).post("/pipeline", json={**request, "stream_plan": stream_plan})
+                self.assertEqual(response.status_code, 207)
+
+                # regenerating the plan now gives another one, the resubmitted run must not ask for it
+                failing.clear()
+                models.generate_content_stream = lambda model, contents, config=None: iter(
+                    [MagicMock(text=json.dumps(replanned))])
+                case_calls.clear()
+                models.code_calls = []
+                response = TestClient(app).post("/pipeline", json={**request, "stream_plan": stream_plan})
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["test_plan"], TEST_PLAN)
+            self.assertEqual(len(case_calls), 1)
+            self.assertEqual(len(models.code_calls), 3)
+
+    @patch('requests.get')
+    @patch('google.genai.Client')
+    def test_pipeline_from_shared_cases_reports_failed_code(self, mock_client, mock_get):
+        """Test a replica reusing shared test cases still returns the errors of the code it could not generate"""
+        mock_response = MagicMock()
+        mock_response.content = json.dumps({"name": "File", "document": {"children": []}}).encode()
+        mock_get.return_value = mock_response
+        models = FakeModels()
+        original = models.generate_content
+
+        def generate_content(model, contents, config=None):
+            if "Objective 1 scenario 2" in "".join(contents if isinstance(contents, list) else [contents]):
+                raise ValueError("code call failed")
+            return original(model, contents, config)
+        models.generate_content = generate_content
+        mock_client.return_value.models = models
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.db")
+            for replica in (Feature2Service(SharedCache(SQLiteCacheBackend(path))),
+                            Feature2Service(SharedCache(SQLiteCacheBackend(path)))):
+                result = replica.run_pipeline("https://www.figma.com/file/abc123/design", "t", "k", stream_plan=False)
+                self.assertEqual(list(result["errors"]), ["test_code_for_case_2.py"])
+                self.assertEqual(len(result["test_code"]), 3)
+
+    @patch('google.genai.Client')
+    def test_cases_start_while_plan_streams(self, mock_client):
+        """Test the first objective's test cases are generated before the plan stream is finished"""
+        first_case_started = threading.Event()
+
+        def before_case(objective):
+            if objective == "Objective 1":
+                first_case_started.set()
+
+        def between_objectives():
+            self.assertTrue(first_case_started.wait(timeout=5), "cases waited for the whole plan")
+
+        mock_client.return_value.models = FakeModels(before_case, between_objectives)
+        objectives = generate_test_plan_stream({"figma_data": []}, "key")
+
+        test_plan, test_cases, _, test_code = stream_cases_and_code(objectives, "key")
+        self.assertEqual(test_plan, TEST_PLAN)
+        self.assertEqual(list(test_cases), ["Feature 1", "Feature 2"])
+        self.assertEqual(len(test_code), 4)
+
+    @patch('google.genai.Client')
+    def test_failed_case_does_not_wait_for_the_plan(self, mock_client):
+        """Test a run that fails on the first objective ends while the rest of the plan is still streaming"""
+        rest_of_plan = threading.Event()
+
+        def before_case(objective):
+            raise BudgetExceeded("Budget used up")
+
+        mock_client.return_value.models = FakeModels(before_case, lambda: rest_of_plan.wait(timeout=5))
+        objectives = generate_test_plan_stream({"figma_data": []}, "key")
+
+        start = time.perf_counter()
+        with self.assertRaises(BudgetExceeded):
+            stream_cases_and_code(objectives, "key")
+        self.assertLess(time.perf_counter() - start, 2)
+        rest_of_plan.set()
+
+    @patch('google.genai.Client')
+    def test_stream_test_plan_route(self, mock_client):
+        """Test the plan route streams one objective per line and stores the whole plan"""
+        mock_client.return_value.models = FakeModels()
+        app = FastAPI()
+        app.include_router(router)
+
+        response = TestClient(app).post("/generate-test-plan/stream", json={"feature_list": {"figma_data": []}, "gemini_key": "k"})
+
+        self.assertEqual([json.loads(line) for line in response.text.splitlines()], TEST_PLAN["test_plan"])
+        self.assertEqual(feature2_service.get_saved_data('plan'), TEST_PLAN)
+
+if __name__ == '__main__':
+    unittest.main()
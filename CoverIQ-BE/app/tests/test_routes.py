@@ -0,0 +1,200 @@
+import json
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..routes import router
+from ..services import feature2_service, Feature2Service
+from TestPlanner.checkpoints import Checkpoints
+
+TEST_PLAN = {
+    "test_plan": [
+        {
+            "Objective": "Test Objective",
+            "Scope": "Test Scope",
+            "Test_Items": {
+                "Types_of_Testing": "Functional",
+                "Test_Approach": "Manual",
+                "Acceptance_Criteria": ["Criteria 1"]
+            }
+        }
+    ]
+}
+
+class TestRoutes(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+
+    @patch('google.genai.Client')
+    def test_generate_test_plan(self, mock_client):
+        """Test the generated test plan is validated once and returned as JSON"""
+        mock_response = MagicMock()
+        mock_response.text = json.dumps(TEST_PLAN)
+        mock_client.return_value.models.generate_content.return_value = mock_response
+
+        response = self.client.post("/generate-test-plan", json={"feature_list": {}, "gemini_key": "test_api_key"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.json(), TEST_PLAN)
+        self.assertEqual(self.client.get("/data/plan").json(), TEST_PLAN)
+
+    def test_openapi_documents_stage_bodies(self):
+        """Test the stage routes document the stored body and the 207 body of a partial result"""
+        paths = self.client.get("/openapi.json").json()["paths"]
+        plan = paths["/generate-test-plan"]["post"]["responses"]
+        self.assertEqual(plan["200"]["content"]["application/json"]["schema"], {"$ref": "#/components/schemas/TestPlan"})
+        cases = paths["/generate-test-cases"]["post"]["responses"]
+        self.assertEqual(cases["207"]["content"]["application/json"]["schema"], {"$ref": "#/components/schemas/IncompleteTestCases"})
+        self.assertIn("207", paths["/generate-test-code"]["post"]["responses"])
+        cucumber = paths["/generate-feature-text"]["post"]["responses"]["200"]["content"]["application/json"]["schema"]
+        self.assertEqual(cucumber["additionalProperties"], {"type": "string"})
+
+    @patch('google.genai.Client')
+    def test_code_batch_size(self, mock_client):
+        """Test the service's code batch size packs the feature files of /generate-test-code into one call"""
+        mock_client.return_value.models.generate_content.return_value = MagicMock(text=json.dumps({"test_code": [
+            {"file_name": "text1", "code": "code 1"}, {"file_name": "text2", "code": "code 2"}]}))
+        service = Feature2Service(code_batch_size=5)
+
+        result = service.generate_test_code_from_feature({"text1": "Given a login page", "text2": "Given a search page"}, "k")
+
+        self.assertEqual(result, {"test_code_for_case_1.py": "code 1", "test_code_for_case_2.py": "code 2"})
+        self.assertEqual(mock_client.return_value.models.generate_content.call_count, 1)
+
+    @patch('google.genai.Client')
+    def test_generate_test_plan_invalid_output(self, mock_client):
+        """Test a model answer that does not match the schema is rejected"""
+        mock_response = MagicMock()
+        mock_response.text = '{"test_plan": [{"Objective": "Missing scope"}]}'
+        mock_client.return_value.models.generate_content.return_value = mock_response
+
+        response = self.client.post("/generate-test-plan", json={"feature_list": {}, "gemini_key": "test_api_key"})
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch('requests.get')
+    def test_parse_figma_reuses_response_body(self, mock_get):
+        """Test the Figma body is served as received, gzip compressed when accepted"""
+        body = json.dumps({"name": "Test File", "document": {"children": [{"id": str(n)} for n in range(200)]}}).encode()
+        mock_response = MagicMock()
+        mock_response.content = body
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value = mock_response
+
+        response = self.client.post("/parse-figma", json={"figma_url": "https://www.figma.com/file/abc123/design", "figma_token": "t"},
+                                    headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.json(), {"file_key": "abc123", "figma_data": json.loads(body)})
+        self.assertEqual(feature2_service.get_saved_json('figma'), b'{"file_key":"abc123","figma_data":' + body + b'}')
+
+        response = self.client.get("/data/figma", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", response.headers)
+        self.assertEqual(response.json()["figma_data"]["name"], "Test File")
+
+    def test_feature_text(self):
+        """Test feature text generation returns the rendered texts"""
+        test_case = {"Feature 1": {"feature": "Login", "bdd_style_descriptions": [
+            {"Scenario": "Login", "Given": "a user", "And": "an account", "When": "logging in", "Then": "it works"}
+        ]}}
+        response = self.client.post("/generate-feature-text", json={"test_case": test_case})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ["text1"])
+        self.assertEqual(feature2_service.get_saved_json('cucumber'), response.content)
+
+    @patch('google.genai.Client')
+    def test_stage_inputs_by_reference(self, mock_client):
+        """Test stages resolve artifact ids and data type names instead of inline bodies"""
+        mock_response = MagicMock()
+        mock_response.text = json.dumps(TEST_PLAN)
+        mock_client.return_value.models.generate_content.return_value = mock_response
+        feature2_service._save_to_memory({"figma_data": [], "feature_description": None}, 'feature_list')
+        feature_list_id = feature2_service.artifact_id('feature_list')
+
+        response = self.client.post("/generate-test-plan", json={"feature_list_ref": feature_list_id, "gemini_key": "k"})
+        self.assertEqual(response.status_code, 200)
+        plan_id = response.headers["x-artifact-id"]
+        self.assertEqual(plan_id, feature2_service.artifact_id('test_plan'))
+        self.assertIn(str({"figma_data": [], "feature_description": None}), str(mock_client.return_value.models.generate_content.call_args))
+
+        mock_response.text = json.dumps({"feature": "Login", "bdd_style_descriptions": []})
+        response = self.client.post("/generate-test-cases", json={"test_plan_ref": plan_id, "gemini_key": "k"})
+        self.assertEqual(response.json(), {"Feature 1": {"feature": "Login", "bdd_style_descriptions": []}})
+
+        response = self.client.post("/generate-feature-text", json={"test_case_ref": "cases"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bad_references(self):
+        """Test unknown, replaced and mistyped references are rejected"""
+        feature2_service._save_to_memory({"figma_data": [], "feature_description": None}, 'feature_list')
+        old_id = feature2_service.artifact_id('feature_list')
+        feature2_service._save_to_memory({"figma_data": [], "feature_description": "new"}, 'feature_list')
+
+        response = self.client.post("/generate-test-plan", json={"feature_list_ref": old_id, "gemini_key": "k"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post("/generate-test-plan", json={"feature_list_ref": "plan", "gemini_key": "k"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/generate-test-plan", json={"gemini_key": "k"})
+        self.assertEqual(response.status_code, 422)
+
+    @patch('google.genai.Client')
+    def test_routing(self, mock_client):
+        """Test /routing reports the model that answered a stage"""
+        mock_client.return_value.models.generate_content.return_value = MagicMock(text=json.dumps(TEST_PLAN))
+        self.client.post("/generate-test-plan", json={"feature_list": {"routing": 1}, "gemini_key": "test_api_key"})
+
+        routing = self.client.get("/routing", params={"limit": 1}).json()
+        self.assertEqual([(d["stage"], d["outcome"]) for d in routing["decisions"]], [("test_plan", "ok")])
+        model = routing["decisions"][0]["model"]
+        self.assertGreaterEqual(routing["stages"]["test_plan"]["models"][model]["calls"], 1)
+
+    @patch('google.genai.Client')
+    def test_request_timeout(self, mock_client):
+        """Test X-Request-Timeout bounds every model call of the request and ends it with 504"""
+        timeouts = []
+
+        def slow_model(model, contents, config=None):
+            timeouts.append(config["http_options"]["timeout"])
+            time.sleep(config["http_options"]["timeout"] / 1000)
+            raise TimeoutError("model did not answer")
+        mock_client.return_value.models.generate_content.side_effect = slow_model
+
+        response = self.client.post("/generate-test-cases", json={"test_plan": TEST_PLAN, "gemini_key": "k"},
+                                    headers={"X-Request-Timeout": "0.05"})
+
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(len(timeouts), 1)
+        self.assertLessEqual(timeouts[0], 50)
+
+    @patch('google.genai.Client')
+    def test_failed_objectives_resume(self, mock_client):
+        """Test a failed objective gives 207 with the finished test cases, and resubmitting only redoes it"""
+        plan = {"test_plan": [dict(TEST_PLAN["test_plan"][0], Objective=f"Objective {n}") for n in (1, 2)]}
+        prompts = []
+
+        def generate_content(model, contents, config=None):
+            prompts.append("".join(contents))
+            if "Objective 2" in prompts[-1] and len(prompts) == 2:
+                raise ValueError("model answered with invalid JSON")
+            return MagicMock(text=json.dumps({"feature": "F", "bdd_style_descriptions": []}))
+        mock_client.return_value.models.generate_content.side_effect = generate_content
+
+        with patch.object(feature2_service, 'checkpoints', Checkpoints()):
+            response = self.client.post("/generate-test-cases", json={"test_plan": plan, "gemini_key": "k"})
+            self.assertEqual(response.status_code, 207)
+            self.assertEqual(list(response.json()["test_cases"]), ["Feature 1"])
+            self.assertIn("invalid JSON", response.json()["errors"]["Feature 2"])
+
+            response = self.client.post("/generate-test-cases", json={"test_plan": plan, "gemini_key": "k"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()), ["Feature 1", "Feature 2"])
+        self.assertEqual(len(prompts), 3)
+
+if __name__ == '__main__':
+    unittest.main()
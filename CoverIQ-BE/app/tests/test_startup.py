@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# modules that must only load on first use
+HEAVY_MODULES = ["google.genai", "google.generativeai", "requests", "pyautogui", "PIL", "playwright"]
+# cumulative import time budget for main in microseconds, generous enough for slow CI machines
+MAIN_IMPORT_BUDGET_US = 2_000_000
+
+def import_times(module: str) -> dict:
+    """Cumulative import time in microseconds of every module loaded by `import module`"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+class TestStartup(unittest.TestCase):
+    def assert_lazy(self, times: dict):
+        loaded = [name for name in HEAVY_MODULES if name in times]
+        self.assertEqual(loaded, [], f"imported at startup: {loaded}")
+
+    def test_api_startup_is_lazy(self):
+        """Test importing the API app does not load the SDKs or HTTP clients"""
+        times = import_times("main")
+        self.assert_lazy(times)
+        self.assertLess(times["main"], MAIN_IMPORT_BUDGET_US)
+
+    def test_agent_import_needs_no_display(self):
+        """Test importing the agent does not load GUI modules or SDKs"""
+        self.assert_lazy(import_times("agent.agent"))
+
+if __name__ == '__main__':
+    unittest.main()
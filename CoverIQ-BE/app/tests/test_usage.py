@@ -0,0 +1,131 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from ..routes import router
+from ..services import feature2_service
+from ..usage import DEGRADE, UsageLedger, key_fingerprint
+from .test_pipeline import FakeModels, TEST_PLAN
+from TestPlanner.usage import BudgetExceeded
+from TestPlanner.checkpoints import Checkpoints
+
+USAGE = {"calls": 1, "prompt_tokens": 90, "output_tokens": 10, "total_tokens": 100}
+
+class MeteredModels(FakeModels):
+    """FakeModels whose every answer used 100 tokens"""
+    def generate_content(self, model, contents, config=None):
+        response = super().generate_content(model, contents, config)
+        response.usage_metadata = MagicMock(prompt_token_count=90, candidates_token_count=10, total_token_count=100,
+                                            cached_content_token_count=None, thoughts_token_count=None)
+        return response
+
+class TestUsage(unittest.TestCase):
+    def setUp(self):
+        app = FastAPI()
+        app.include_router(router)
+        self.client = TestClient(app)
+        # every test pays for its own model calls instead of resuming an earlier test's items
+        checkpoints = patch.object(feature2_service, 'checkpoints', Checkpoints())
+        checkpoints.start()
+        self.addCleanup(checkpoints.stop)
+
+    def test_totals_per_key_run_and_stage(self):
+        """Test charges add up per key, run, stage and model without keeping the key"""
+        ledger = UsageLedger()
+        first = ledger.meter("key")
+        second = ledger.meter("key")
+        first.charge("test_plan", "model", USAGE)
+        first.charge("test_cases", "model", USAGE)
+        second.charge("test_cases", "other", USAGE)
+
+        usage = ledger.key_usage("key")
+        self.assertEqual(usage["key"], key_fingerprint("key"))
+        self.assertEqual(usage["total"]["total_tokens"], 300)
+        self.assertEqual(usage["stages"]["test_cases"]["calls"], 2)
+        self.assertEqual(usage["models"]["other"]["prompt_tokens"], 90)
+        self.assertEqual(usage["runs"], [first.run_id, second.run_id])
+        self.assertEqual(ledger.run_usage(first.run_id)["total"]["total_tokens"], 200)
+        self.assertEqual(ledger.key_usage("another key")["total"], {})
+        with self.assertRaises(ValueError):
+            ledger.meter("another key", first.run_id)
+
+    def test_key_budget_window(self):
+        """Test a key is refused once its budget is used and allowed again in the next window"""
+        now = [1000.0]
+        ledger = UsageLedger(key_budget=200, window=100, clock=lambda: now[0])
+        meter = ledger.meter("key")
+        meter.check("test_plan")
+        meter.charge("test_plan", "model", USAGE)
+        meter.charge("test_cases", "model", USAGE)
+        with self.assertRaises(BudgetExceeded):
+            ledger.meter("key").check("test_code")
+        self.assertEqual(ledger.key_usage("key")["budget"]["remaining"], 0)
+        now[0] += 100
+        ledger.meter("key").check("test_code")
+
+    def test_run_budget(self):
+        """Test a run is refused once its own budget is used, other runs of the key are not"""
+        ledger = UsageLedger(run_budget=100)
+        meter = ledger.meter("key")
+        meter.charge("test_plan", "model", USAGE)
+        with self.assertRaises(BudgetExceeded):
+            meter.check("test_cases")
+        ledger.meter("key").check("test_cases")
+
+    def test_old_runs_are_forgotten(self):
+        """Test only the latest runs are kept"""
+        ledger = UsageLedger(max_runs=2)
+        run_ids = [ledger.meter("key").run_id for _ in range(3)]
+        with self.assertRaises(FileNotFoundError):
+            ledger.run_usage(run_ids[0])
+        self.assertEqual(ledger.key_usage("key")["runs"], run_ids[1:])
+
+    @patch('google.genai.Client')
+    def test_usage_routes(self, mock_client):
+        """Test stage calls of one run are reported by /usage and /usage/runs"""
+        mock_client.return_value.models = MeteredModels()
+        with patch.object(feature2_service, 'usage', UsageLedger()):
+            response = self.client.post("/generate-test-plan", json={"feature_list": {}, "gemini_key": "k"})
+            run_id = response.headers["X-Run-Id"]
+            self.client.post("/generate-test-cases", json={"test_plan_ref": "plan", "gemini_key": "k", "run_id": run_id})
+
+            run = self.client.get(f"/usage/runs/{run_id}").json()
+            self.assertEqual(run["total"]["total_tokens"], 300)
+            self.assertEqual(run["stages"]["test_cases"]["calls"], 2)
+            usage = self.client.post("/usage", json={"gemini_key": "k"}).json()
+            self.assertEqual(usage["runs"], [run_id])
+            self.assertEqual(self.client.get("/usage/runs/unknown").status_code, 404)
+
+    @patch('google.genai.Client')
+    def test_reject_over_budget(self, mock_client):
+        """Test a stage is rejected with 429 once the key has used its budget"""
+        mock_client.return_value.models = MeteredModels()
+        with patch.object(feature2_service, 'usage', UsageLedger(key_budget=100)):
+            self.assertEqual(self.client.post("/generate-test-plan", json={"feature_list": {}, "gemini_key": "k"}).status_code, 200)
+            response = self.client.post("/generate-test-plan", json={"feature_list": {"a": 1}, "gemini_key": "k"})
+            self.assertEqual(response.status_code, 429)
+
+    @patch('requests.get')
+    @patch('google.genai.Client')
+    def test_degrade_skips_code(self, mock_client, mock_get):
+        """Test a pipeline run over its budget in degrade mode returns its test cases without code"""
+        mock_get.return_value = MagicMock(content=json.dumps({"name": "File", "document": {"children": []}}).encode())
+        models = MeteredModels()
+        mock_client.return_value.models = models
+        with patch.object(feature2_service, 'usage', UsageLedger(run_budget=250, mode=DEGRADE)):
+            response = self.client.post("/pipeline", json={
+                "figma_url": "https://www.figma.com/file/abc123/design", "figma_token": "t", "gemini_key": "k",
+                "stream_plan": False, "max_workers": 1})
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result["test_plan"], TEST_PLAN)
+        self.assertEqual(list(result["test_cases"]), ["Feature 1", "Feature 2"])
+        self.assertEqual(result["test_code"], {})
+        self.assertEqual(len(result["skipped_code"]), 4)
+        self.assertEqual(models.code_calls, [])
+        self.assertEqual(result["usage"]["total"]["total_tokens"], 300)
+
+if __name__ == '__main__':
+    unittest.main()
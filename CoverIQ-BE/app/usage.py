@@ -0,0 +1,174 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from TestPlanner.usage import BudgetExceeded
+
+# token accounting per API key, run and stage, with budgets that stop the fan-out of huge designs.
+# Keys are only kept as fingerprints. Every replica accounts for the calls it made itself.
+
+REJECT = "reject"
+# over budget, a pipeline run still returns its plan and test cases but skips the remaining code generation
+DEGRADE = "degrade"
+BUDGET_MODES = (REJECT, DEGRADE)
+# seconds after which the token budget of a key starts over
+DEFAULT_BUDGET_WINDOW = 86400
+# runs kept for /usage/runs, the oldest are forgotten first
+MAX_RUNS = 1000
+
+
+def key_fingerprint(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _add(total: Dict[str, int], usage: Dict[str, int]) -> None:
+    for name, value in usage.items():
+        total[name] = total.get(name, 0) + value
+
+
+class RunMeter:
+    """The meter TestPlanner.usage charges model calls of one run to"""
+
+    def __init__(self, ledger: "UsageLedger", key: str, run_id: str):
+        self.ledger = ledger
+        self.key = key
+        self.run_id = run_id
+
+    def check(self, stage: str) -> None:
+        self.ledger.check(self.key, self.run_id, stage)
+
+    def charge(self, stage: str, model: str, usage: Dict[str, int]) -> None:
+        self.ledger.charge(self.key, self.run_id, stage, model, usage)
+
+
+class UsageLedger:
+    """
+    Totals per key, run, stage and model. key_budget caps the total tokens of a key per window,
+    run_budget those of a single run. Calls already in flight when a budget runs out are still
+    charged, so a run can end slightly above it.
+    """
+
+    def __init__(self, key_budget: Optional[int] = None, run_budget: Optional[int] = None, mode: str = REJECT,
+                 window: float = DEFAULT_BUDGET_WINDOW, max_runs: int = MAX_RUNS, clock=time.time):
+        if mode not in BUDGET_MODES:
+            raise ValueError(f"Invalid budget mode: {mode}")
+        self.key_budget = key_budget
+        self.run_budget = run_budget
+        self.mode = mode
+        self.window = window
+        self.max_runs = max_runs
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._runs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def meter(self, api_key: str, run_id: Optional[str] = None) -> RunMeter:
+        """Meter for a new run, or for more calls of an earlier run of the same key"""
+        key = key_fingerprint(api_key)
+        run_id = run_id or uuid.uuid4().hex
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None and run["key"] != key:
+                raise ValueError(f"Run {run_id} belongs to another key")
+            self._run(key, run_id)
+        return RunMeter(self, key, run_id)
+
+    def _key(self, key: str) -> Dict[str, Any]:
+        entry = self._keys.setdefault(key, {"total": {}, "stages": {}, "models": {}, "window": None, "window_tokens": 0})
+        # fixed windows counted from the epoch, the budget starts over at every boundary
+        window = int(self.clock() // self.window)
+        if entry["window"] != window:
+            entry["window"] = window
+            entry["window_tokens"] = 0
+        return entry
+
+    def _run(self, key: str, run_id: str) -> Dict[str, Any]:
+        run = self._runs.get(run_id)
+        if run is None:
+            run = self._runs[run_id] = {"key": key, "started": self.clock(), "total": {}, "stages": {}}
+            while len(self._runs) > self.max_runs:
+                self._runs.popitem(last=False)
+        return run
+
+    def check(self, key: str, run_id: str, stage: str) -> None:
+        """Raise BudgetExceeded when the key or the run has no tokens left for a stage call"""
+        with self._lock:
+            entry = self._key(key)
+            run = self._run(key, run_id)
+            if self.key_budget is not None and entry["window_tokens"] >= self.key_budget:
+                raise BudgetExceeded(f"Token budget of this API key is used up ({entry['window_tokens']} of {self.key_budget}), "
+                                     f"{stage} was not started")
+            run_tokens = run["total"].get("total_tokens", 0)
+            if self.run_budget is not None and run_tokens >= self.run_budget:
+                raise BudgetExceeded(f"Token budget of run {run_id} is used up ({run_tokens} of {self.run_budget}), "
+                                     f"{stage} was not started")
+
+    def charge(self, key: str, run_id: str, stage: str, model: str, usage: Dict[str, int]) -> None:
+        with self._lock:
+            entry = self._key(key)
+            run = self._run(key, run_id)
+            entry["window_tokens"] += usage.get("total_tokens", 0)
+            _add(entry["total"], usage)
+            _add(entry["stages"].setdefault(stage, {}), usage)
+            _add(entry["models"].setdefault(model, {}), usage)
+            _add(run["total"], usage)
+            _add(run["stages"].setdefault(stage, {}), usage)
+
+    def key_usage(self, api_key: str) -> Dict[str, Any]:
+        """Totals of a key with its budget and its runs that are still kept, oldest first"""
+        key = key_fingerprint(api_key)
+        with self._lock:
+            entry = self._key(key)
+            used = entry["window_tokens"]
+            return {
+                "key": key,
+                "total": dict(entry["total"]),
+                "stages": {stage: dict(usage) for stage, usage in entry["stages"].items()},
+                "models": {model: dict(usage) for model, usage in entry["models"].items()},
+                "budget": {
+                    "tokens": self.key_budget,
+                    "used": used,
+                    "remaining": None if self.key_budget is None else max(0, self.key_budget - used),
+                    "window_seconds": self.window,
+                    "mode": self.mode
+                },
+                "runs": [run_id for run_id, run in self._runs.items() if run["key"] == key]
+            }
+
+    def run_usage(self, run_id: str) -> Dict[str, Any]:
+        """Totals of one run, FileNotFoundError once it is no longer kept"""
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None:
+                raise FileNotFoundError(f"No usage found for run: {run_id}")
+            used = run["total"].get("total_tokens", 0)
+            return {
+                "run_id": run_id,
+                "key": run["key"],
+                "started": run["started"],
+                "total": dict(run["total"]),
+                "stages": {stage: dict(usage) for stage, usage in run["stages"].items()},
+                "budget": {
+                    "tokens": self.run_budget,
+                    "used": used,
+                    "remaining": None if self.run_budget is None else max(0, self.run_budget - used),
+                    "mode": self.mode
+                }
+            }
+
+
+def usage_ledger_from_env() -> UsageLedger:
+    """
+    COVERIQ_KEY_TOKEN_BUDGET caps the tokens of an API key per COVERIQ_BUDGET_WINDOW seconds,
+    COVERIQ_RUN_TOKEN_BUDGET those of one run; COVERIQ_BUDGET_MODE is reject or degrade.
+    """
+    def optional_int(name: str) -> Optional[int]:
+        value = os.getenv(name)
+        return int(value) if value else None
+
+    return UsageLedger(optional_int("COVERIQ_KEY_TOKEN_BUDGET"), optional_int("COVERIQ_RUN_TOKEN_BUDGET"),
+                       os.getenv("COVERIQ_BUDGET_MODE", REJECT),
+                       float(os.getenv("COVERIQ_BUDGET_WINDOW", DEFAULT_BUDGET_WINDOW)))
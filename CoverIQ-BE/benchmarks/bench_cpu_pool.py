@@ -0,0 +1,100 @@
+"""
+Event loop latency of small requests while large feature filtering and zip exports run, with the
+large work in the event loop (the old routes), in the thread pool (still holding the GIL) and in
+the CPU process pool.
+
+Run from CoverIQ-BE: python -m benchmarks.bench_cpu_pool [--nodes N] [--files N] [--workers N]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List
+from app.cpu_pool import CPUExecutor
+from app.services import Feature2Service
+
+# small requests arrive every INTERVAL seconds, their latency is how late they are served
+INTERVAL = 0.005
+
+
+def make_figma_data(nodes: int) -> Dict[str, Any]:
+    frames = [{"id": f"2:{f}", "name": f"Frame {f}", "type": "FRAME", "children": [
+        {"id": f"3:{f}:{n}", "name": f"Button {n}", "type": "INSTANCE",
+         "absoluteBoundingBox": {"x": n, "y": f, "width": 80, "height": 24},
+         "interactions": [{"trigger": {"type": "ON_CLICK"}}] if n % 3 == 0 else []}
+        for n in range(100)
+    ]} for f in range(max(1, nodes // 100))]
+    return {"file_key": "bench", "figma_data": {"document": {"id": "0:0", "children": [
+        {"id": "1:0", "name": "Page", "type": "CANVAS", "children": frames}]}}}
+
+
+async def small_requests(service: Feature2Service, done: asyncio.Event) -> List[float]:
+    latencies = []
+    while not done.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(INTERVAL)
+        service.get_saved_json('plan')
+        latencies.append(time.perf_counter() - start - INTERVAL)
+    return latencies
+
+
+async def large_jobs(service: Feature2Service, mode: str, jobs: int, done: asyncio.Event) -> float:
+    figma_data = service.get_saved_data('figma')
+    start = time.perf_counter()
+    for n in range(jobs):
+        if n % 2 == 0:
+            work, args = service.get_feature_representation, (figma_data, None)
+        else:
+            work, args = service.export, ('code_zip',)
+        if mode == "event loop":
+            work(*args)
+            await asyncio.sleep(0)
+        else:
+            await asyncio.to_thread(work, *args)
+    done.set()
+    return time.perf_counter() - start
+
+
+async def measure(service: Feature2Service, mode: str, jobs: int):
+    done = asyncio.Event()
+    latencies, seconds = await asyncio.gather(small_requests(service, done), large_jobs(service, mode, jobs, done))
+    return latencies, seconds
+
+
+def make_service(cpu: CPUExecutor, figma_data: Dict[str, Any], files: int) -> Feature2Service:
+    service = Feature2Service(cpu=cpu)
+    service._save_to_memory(figma_data, 'figma_data')
+    service._save_to_memory({"test_plan": []}, 'test_plan')
+    service._save_to_memory({f"test_code_for_case_{n}.py": f"def test_case_{n}():\n    assert True\n" * 20
+                             for n in range(files)}, 'test_code')
+    return service
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=300_000)
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--jobs", type=int, default=6)
+    args = parser.parse_args()
+
+    figma_data = make_figma_data(args.nodes)
+    pool = CPUExecutor(max_workers=args.workers, threshold=0)
+    # start the workers before timing
+    pool.run(len, b"{}")
+    modes = [("event loop", CPUExecutor(max_workers=0)), ("thread pool", CPUExecutor(max_workers=0)), ("process pool", pool)]
+    print(f"{args.nodes} nodes, {args.files} files, {args.jobs} large jobs, a small request every {INTERVAL * 1000:.0f} ms")
+    try:
+        for mode, cpu in modes:
+            service = make_service(cpu, figma_data, args.files)
+            latencies, seconds = asyncio.run(measure(service, mode, args.jobs))
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{mode:<14} small requests {len(latencies):5}   p50 {statistics.median(latencies) * 1000:7.1f} ms   "
+                  f"p99 {p99 * 1000:7.1f} ms   max {latencies[-1] * 1000:7.1f} ms   large jobs {seconds:5.2f} s")
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Render 100k scenarios through the Gherkin renderer and report time and peak memory.
+
+Run from CoverIQ-BE: python -m benchmarks.bench_gherkin_renderer [--scenarios N] [--distinct N]
+"""
+import argparse
+import time
+import tracemalloc
+from TestPlanner import gherkin_renderer
+from TestPlanner.gherkin_renderer import (iter_feature_texts, iter_test_cases_markdown, render_feature_file,
+                                          render_test_plan_markdown)
+
+
+def make_test_cases(scenarios: int, distinct: int, per_feature: int = 10):
+    # generated plans repeat a lot of scenarios, distinct controls how many unique ones there are
+    test_cases = {}
+    for start in range(0, scenarios, per_feature):
+        descriptions = []
+        for n in range(start, min(start + per_feature, scenarios)):
+            k = n % distinct
+            descriptions.append({
+                "Scenario": f"Scenario {k}",
+                "Given": f"the user is on page {k}",
+                "And": f"the user has account {k % 97}",
+                "When": f"the user clicks button {k % 13}",
+                "Then": f"the user sees result {k}",
+            })
+        test_cases[f"Objective {start // per_feature + 1}"] = {"feature": f"Feature {start}", "bdd_style_descriptions": descriptions}
+    return test_cases
+
+
+def make_test_plan(objectives: int):
+    return {"test_plan": [{
+        "Objective": f"Objective {n}",
+        "Scope": f"Scope {n}",
+        "Test_Items": {"Types_of_Testing": "Functional", "Test_Approach": "Automated",
+                       "Acceptance_Criteria": [f"Criterion {c}" for c in range(5)]},
+    } for n in range(objectives)]}
+
+
+def measure(name, work):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = work()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<24} {seconds * 1000:9.1f} ms  peak {peak / 2**20:7.1f} MiB  output {size / 2**20:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", type=int, default=100_000)
+    parser.add_argument("--distinct", type=int, default=5_000)
+    args = parser.parse_args()
+
+    test_cases = make_test_cases(args.scenarios, args.distinct)
+    test_plan = make_test_plan(args.scenarios // 10)
+    print(f"{args.scenarios} scenarios, {args.distinct} distinct, {len(test_cases)} features")
+
+    # streamed: only one feature is held at a time
+    measure("feature texts", lambda: sum(len(text) for _, text in iter_feature_texts(test_cases)))
+    measure("feature files", lambda: sum(len(render_feature_file(o)) for o in test_cases.values()))
+    measure("test cases markdown", lambda: sum(len(chunk) for chunk in iter_test_cases_markdown(test_cases)))
+    measure("test plan markdown", lambda: len(render_test_plan_markdown(test_plan)))
+    print(gherkin_renderer._format_cached.cache_info())
+
+
+if __name__ == "__main__":
+    main()
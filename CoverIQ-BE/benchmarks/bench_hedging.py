@@ -0,0 +1,69 @@
+"""
+Fan out the test case calls of simulated /generate-test-cases requests to a fake model whose
+latency is Pareto distributed, with and without hedging, and report the request latencies
+(a request waits for its slowest call) and the share of calls that got a duplicate.
+
+Run from CoverIQ-BE: python -m benchmarks.bench_hedging [--requests N] [--objectives N] [--alpha A]
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from unittest.mock import MagicMock
+from TestPlanner.model_router import ModelRouter, Route
+
+
+class HeavyTailModel:
+    """Sleeps scale * Pareto(alpha) seconds per call, capped at cap"""
+
+    def __init__(self, alpha: float, scale: float, cap: float, seed: int = 0):
+        self.alpha = alpha
+        self.scale = scale
+        self.cap = cap
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def generate_content(self, model, contents, config=None):
+        with self.lock:
+            latency = min(self.cap, self.scale * self.random.paretovariate(self.alpha))
+        time.sleep(latency)
+        return MagicMock(text="{}")
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(quantile * len(values)))]
+
+
+def run(name: str, route: Route, requests: int, objectives: int, alpha: float) -> None:
+    # the simulated calls take milliseconds, so hedging may start right after the percentile
+    router = ModelRouter({"test_cases": route}, min_hedge_delay=0)
+    client = MagicMock()
+    client.models = HeavyTailModel(alpha, scale=0.01, cap=2.0)
+    latencies = []
+    with ThreadPoolExecutor(max_workers=objectives) as pool:
+        for number in range(requests):
+            start = time.perf_counter()
+            list(pool.map(lambda n: router.generate_content(client, "test_cases", f"objective {n}"), range(objectives)))
+            latencies.append(time.perf_counter() - start)
+    stats = router.stats()["test_cases"]
+    print(f"{name:>16}: request p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p99 {percentile(latencies, 0.99) * 1000:7.1f} ms"
+          f"  max {max(latencies) * 1000:7.1f} ms  hedged {stats.get('hedge_rate', 0) * 100:4.1f}% of calls")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--objectives", type=int, default=20)
+    parser.add_argument("--alpha", type=float, default=1.3)
+    args = parser.parse_args()
+    run("no hedging", Route("model", timeout=30), args.requests, args.objectives, args.alpha)
+    for rate in (0.05, 0.1):
+        run(f"p95, cap {rate:.0%}", Route("model", timeout=30, hedge_quantile=0.95, max_hedge_rate=rate),
+            args.requests, args.objectives, args.alpha)
+
+
+if __name__ == "__main__":
+    main()
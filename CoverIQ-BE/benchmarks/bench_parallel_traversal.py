@@ -0,0 +1,80 @@
+"""
+Filter a large Figma document in one pass, in one spawned worker that gets the document as JSON
+bytes, and page by page (frame by frame for a single-page file) across forked workers that
+inherit the parsed document, checking all of them give the same components.
+
+Run from CoverIQ-BE: python -m benchmarks.bench_parallel_traversal [--pages N] [--nodes N] [--workers N ...]
+"""
+import argparse
+import os
+import time
+from typing import Any, Dict, List
+from pydantic_core import to_json
+from app.cpu_pool import CPUExecutor, InheritedInputPool, filter_component_json
+from TestPlanner.feature_representation import filter_component
+
+
+def make_document(pages: int, nodes: int, interactive: int) -> Dict[str, Any]:
+    frames_per_page = max(1, nodes // pages // 200)
+
+    def frame(p: int, f: int) -> Dict[str, Any]:
+        # two levels of groups below every frame, one leaf in `interactive` has interactions
+        return {"id": f"{p}:{f}", "name": f"Frame {f}", "type": "FRAME", "children": [
+            {"id": f"{p}:{f}:{g}", "name": f"Group {g}", "type": "GROUP", "children": [
+                {"id": f"{p}:{f}:{g}:{n}", "name": f"Button {n}", "type": "INSTANCE",
+                 "absoluteBoundingBox": {"x": n, "y": g, "width": 80, "height": 24},
+                 "interactions": [{"trigger": {"type": "ON_CLICK"}}] if n % interactive == 0 else []}
+                for n in range(19)
+            ]} for g in range(10)
+        ]}
+
+    return {"file_key": "bench", "figma_data": {"document": {"id": "0:0", "children": [
+        {"id": f"{p}:0", "name": f"Page {p}", "type": "CANVAS", "children": [frame(p, f) for f in range(frames_per_page)]}
+        for p in range(pages)
+    ]}}}
+
+
+def best_of(work, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(name: str, figma_data: Dict[str, Any], workers: List[int]) -> None:
+    expected = filter_component(figma_data)
+    serial = best_of(lambda: filter_component(figma_data))
+    print(f"{name}: {len(expected['figma_data'])} components, one pass {serial * 1000:8.1f} ms")
+    raw_json = to_json(figma_data)
+    spawned = CPUExecutor(max_workers=1, threshold=0)
+    try:
+        assert spawned.run(filter_component_json, raw_json) == expected
+        seconds = best_of(lambda: spawned.run(filter_component_json, raw_json))
+        print(f"  spawned worker from JSON {seconds * 1000:8.1f} ms   {serial / seconds:5.2f}x")
+    finally:
+        spawned.shutdown()
+    for count in workers:
+        pool = InheritedInputPool(count)
+        assert filter_component(figma_data, executor=pool) == expected
+        seconds = best_of(lambda: filter_component(figma_data, executor=pool))
+        print(f"  {count:2} forked workers          {seconds * 1000:8.1f} ms   {serial / seconds:5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument("--nodes", type=int, default=1_000_000)
+    # most nodes of a real design are text, vectors and groups, only a few are interactive
+    parser.add_argument("--interactive", type=int, default=20)
+    parser.add_argument("--workers", type=int, nargs="*",
+                        default=sorted({2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+    print(f"{os.cpu_count()} cores")
+    run(f"{args.pages} pages", make_document(args.pages, args.nodes, args.interactive), args.workers)
+    run("single page", make_document(1, args.nodes, args.interactive), args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Parse and serialize large test plans and test case sets, comparing the old json.loads +
+FastAPI re-validation path with the single pydantic-core pass the API uses now.
+
+Run from CoverIQ-BE: python -m benchmarks.bench_serialization [--objectives N] [--scenarios N]
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from TestPlanner.llm_test_plan_generator import test_plan_adapter
+from TestPlanner.bdd_style_test_case_generator import test_case_adapter, test_cases_adapter
+
+
+def make_test_plan(objectives: int) -> Dict[str, Any]:
+    return {"test_plan": [{
+        "Objective": f"Verify objective {n} of the checkout flow",
+        "Scope": f"Screens and components involved in objective {n}",
+        "Test_Items": {"Types_of_Testing": "Functional, UI", "Test_Approach": "Automated end to end tests",
+                       "Acceptance_Criteria": [f"Criterion {c} of objective {n} holds" for c in range(5)]},
+    } for n in range(objectives)]}
+
+
+def make_test_case(scenarios: int, n: int) -> Dict[str, Any]:
+    return {"feature": f"Feature {n}", "bdd_style_descriptions": [{
+        "Scenario": f"Scenario {s} of feature {n}",
+        "Given": "the user is on the checkout page",
+        "And": "the cart contains two items",
+        "When": f"the user clicks button {s}",
+        "Then": "the order summary is shown",
+    } for s in range(scenarios)]}
+
+
+def best_of(work, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        work()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(name: str, old: float, new: float) -> None:
+    print(f"{name:<28} old {old * 1000:8.1f} ms   new {new * 1000:8.1f} ms   {old / new:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objectives", type=int, default=2_000)
+    parser.add_argument("--scenarios", type=int, default=20)
+    args = parser.parse_args()
+
+    plan_text = json.dumps(make_test_plan(args.objectives))
+    case_texts = [json.dumps(make_test_case(args.scenarios, n)) for n in range(args.objectives)]
+    print(f"{args.objectives} objectives, {args.objectives * args.scenarios} scenarios, "
+          f"{(len(plan_text) + sum(map(len, case_texts))) / 2**20:.1f} MiB of model output")
+
+    # old: json.loads in the generator, then FastAPI validates the returned dict against
+    # Dict[str, Any] and runs jsonable_encoder before json.dumps
+    any_adapter = TypeAdapter(Dict[str, Any])
+
+    def old_response(data):
+        return json.dumps(jsonable_encoder(any_adapter.validate_python(data))).encode()
+
+    plan = test_plan_adapter.validate_json(plan_text)
+    cases = {f"Feature {n}": test_case_adapter.validate_json(text) for n, text in enumerate(case_texts, 1)}
+
+    report("parse test plan", best_of(lambda: json.loads(plan_text)),
+           best_of(lambda: test_plan_adapter.validate_json(plan_text)))
+    report("parse test cases", best_of(lambda: [json.loads(text) for text in case_texts]),
+           best_of(lambda: [test_case_adapter.validate_json(text) for text in case_texts]))
+    report("serialize test plan", best_of(lambda: old_response(plan)),
+           best_of(lambda: test_plan_adapter.dump_json(plan, warnings=False)))
+    report("serialize test cases", best_of(lambda: old_response(cases)),
+           best_of(lambda: test_cases_adapter.dump_json(cases, warnings=False)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routes import router
+from app.services import feature2_service
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # stop the worker processes of large filtering and export jobs
+    feature2_service.cpu.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
 
 app.add_middleware(
@@ -11,4 +19,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Artifact-Id", "X-Run-Id"],
 )